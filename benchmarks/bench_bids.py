@@ -0,0 +1,97 @@
+"""Benchmark: bid resolution under contention
+
+Several threads submit rising bids, either all on one hot item or spread
+over many items, through one global lock and through utils.bid_engine.
+Each accepted bid does a little CPU work and then yields the GIL, standing
+in for the index update and the I/O the server does per accepted bid;
+without the yield one thread runs at a time and batches never form.
+
+Run from the repository root:  python benchmarks/bench_bids.py [threads] [bids_per_thread]
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.bid_engine import BidEngine, best_bid
+
+ITEMS = 256
+# CPU work per accepted bid, in loop iterations
+UPDATE_COST = 200
+
+
+def update(prices, key, amount):
+    for _ in range(UPDATE_COST):
+        pass
+    time.sleep(0)
+    prices[key] = amount
+
+
+def run_global(threads, count, keys):
+    prices = dict.fromkeys(keys, 0.0)
+    lock = threading.Lock()
+    accepted = [0]
+
+    def worker(offset):
+        for i in range(count):
+            key = keys[(offset + i) % len(keys)]
+            amount = float(i * threads + offset + 1)
+            with lock:
+                if amount > prices[key]:
+                    update(prices, key, amount)
+                    accepted[0] += 1
+
+    return timed(worker, threads), accepted[0], None
+
+
+def run_engine(threads, count, keys):
+    prices = dict.fromkeys(keys, 0.0)
+    engine = BidEngine()
+    accepted = [0]
+
+    def resolve(key, bids):
+        best = best_bid(bids)
+        for bid in bids:
+            bid.result = False
+        if best.amount > prices[key]:
+            update(prices, key, best.amount)
+            best.result = True
+            accepted[0] += 1
+
+    def worker(offset):
+        for i in range(count):
+            key = keys[(offset + i) % len(keys)]
+            amount = float(i * threads + offset + 1)
+            engine.submit(key, offset, amount, lambda bids, key=key: resolve(key, bids))
+
+    elapsed = timed(worker, threads)
+    return elapsed, accepted[0], engine.resolved / max(engine.batches, 1)
+
+
+def timed(worker, threads):
+    pool = [threading.Thread(target=worker, args=(offset,)) for offset in range(threads)]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    total = threads * count
+    print(f"{threads} threads x {count} bids")
+    for label, keys in (("hot item", ["hot"]), (f"{ITEMS} items", [f"item{i}" for i in range(ITEMS)])):
+        for name, run in (("global lock", run_global), ("bid engine", run_engine)):
+            elapsed, accepted, batch = run(threads, count, keys)
+            extra = f"   avg batch {batch:5.2f}" if batch is not None else ""
+            print(f"{label:10s} {name:12s} {total / elapsed:10.0f} bids/s   "
+                  f"{accepted:7d} updates{extra}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Benchmark: browse index maintenance and query latency at scale
+
+Populates utils.indexes.AuctionIndex with synthetic active auctions, then
+times incremental updates (list, bid, close) and paginated queries.
+
+Run from the repository root:  python benchmarks/bench_browse.py [items]
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.indexes import AuctionIndex
+
+SAMPLES = 2000
+PAGE = 20
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return (samples[len(samples) // 2] * 1e6, samples[int(len(samples) * 0.99)] * 1e6)
+
+
+def timed(operation, arguments):
+    samples = []
+    for args in arguments:
+        start = time.perf_counter()
+        operation(*args)
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def report(label, result):
+    print(f"{label:34s} p50 {result[0]:8.1f} us   p99 {result[1]:8.1f} us")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(366)
+    now = datetime.now()
+    sellers = [f"seller{i}" for i in range(max(1, count // 50))]
+    index = AuctionIndex()
+    prices = {}
+
+    records = []
+    for item_id in range(1, count + 1):
+        price = float(rng.randint(1, 100000))
+        prices[item_id] = price
+        records.append((item_id, f"item{rng.getrandbits(40):010x}{item_id}",
+                        now + timedelta(seconds=rng.randint(60, 7 * 86400)), price, rng.choice(sellers)))
+    start = time.perf_counter()
+    index.load(records)
+    print(f"Loaded indexes for {count} items in {time.perf_counter() - start:.1f}s")
+
+    next_id = count + 1
+    listings = []
+    for offset in range(SAMPLES):
+        listings.append((next_id + offset, f"new{offset:08d}", now + timedelta(seconds=rng.randint(60, 86400)),
+                         float(rng.randint(1, 100000)), rng.choice(sellers)))
+    report("list (add)", timed(index.add, listings))
+
+    bids = []
+    for item_id in rng.sample(range(1, count + 1), SAMPLES):
+        prices[item_id] += rng.randint(1, 100)
+        bids.append((item_id, prices[item_id]))
+    report("bid (price update)", timed(index.update_price, bids))
+
+    closes = [(item_id,) for item_id in rng.sample(range(1, count + 1), SAMPLES)]
+    report("close (remove)", timed(index.remove, closes))
+
+    for sort in AuctionIndex.SORTS:
+        report(f"LIST_ACTIVE {sort} first page", timed(index.page, [(sort, PAGE)] * SAMPLES))
+        cursors = []
+        _, cursor = index.page(sort, PAGE)
+        for _ in range(SAMPLES):
+            cursors.append((sort, PAGE, cursor))
+            _, cursor = index.page(sort, PAGE, cursor)
+        report(f"LIST_ACTIVE {sort} next page", timed(index.page, cursors))
+
+    prefixes = [("name", f"item{rng.getrandbits(12):03x}", PAGE) for _ in range(SAMPLES)]
+    report("SEARCH name prefix", timed(index.search, prefixes))
+    seller_queries = [("seller", rng.choice(sellers), PAGE) for _ in range(SAMPLES)]
+    report("SEARCH seller", timed(index.search, seller_queries))
+
+
+if __name__ == "__main__":
+    main()
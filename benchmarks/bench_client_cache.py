@@ -0,0 +1,124 @@
+"""Benchmark: server round trips saved by the client auction cache
+
+Runs an in-process AuctionServer with CLIENTS subscribed bidders on one
+item. The bidders take turns; each applies the pushes waiting on its
+socket to its AuctionCache, then bids a random amount between 80% and
+115% of the price it last heard. It does this with the cache switched
+off (every bid goes to the server) and on (bids the cache knows are too
+low never leave the client). The report gives bids sent, server
+rejections, local rejections and the mean time per bid attempt.
+
+Run from the repository root:  python benchmarks/bench_client_cache.py [clients] [attempts]
+"""
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from udp_server import AuctionServer
+from utils.auction_cache import AuctionCache
+from utils.parser import encode_message
+from utils.rate_limit import Admission
+
+UNLIMITED = 1e9
+
+
+def client(port, name):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(5.0)
+    own = sock.getsockname()[1]
+    sock.sendto(encode_message("REGISTER", 1, name, "buyer", "127.0.0.1", own, 0).encode(), ("127.0.0.1", port))
+    sock.recv(65535)
+    return sock
+
+
+def apply_pushes(sock, cache):
+    """Feed every waiting push to the cache; returns the first non-push message, if any"""
+    sock.setblocking(False)
+    reply = None
+    try:
+        while reply is None:
+            message = sock.recv(65535).decode()
+            parts = message.split()
+            if parts[0] == "AUCTION_ANNOUNCE":
+                cache.announce(parts[2], float(parts[4]), int(parts[5]), int(parts[6]))
+            elif parts[0] == "BID_UPDATE":
+                cache.update(parts[2], float(parts[3]), parts[4], int(parts[6]), int(parts[5]))
+            else:
+                reply = message
+    except BlockingIOError:
+        pass
+    sock.settimeout(5.0)
+    return reply
+
+
+def run(clients, attempts, use_cache):
+    rng = random.Random(43)
+    with tempfile.TemporaryDirectory() as directory:
+        server = AuctionServer(host="127.0.0.1", udp_port=0, tcp_port=0,
+                               data_file=os.path.join(directory, "data.json"),
+                               admission=Admission(UNLIMITED, UNLIMITED, UNLIMITED, UNLIMITED, 1 << 30))
+        threading.Thread(target=server.run, daemon=True).start()
+        port = server.udp_socket.getsockname()[1]
+        address = ("127.0.0.1", port)
+
+        seller = client(port, "seller")
+        seller.sendto(encode_message("LIST_ITEM", 2, "clock", "grandfather_clock", 100, 60, "seller").encode(), address)
+        seller.recv(65535)
+
+        bidders = []
+        for i in range(clients):
+            sock = client(port, f"bidder{i}")
+            cache = AuctionCache()
+            sock.sendto(encode_message("SUBSCRIBE", 3, "clock", f"bidder{i}").encode(), address)
+            time.sleep(0.01)
+            apply_pushes(sock, cache)
+            bidders.append((sock, cache))
+
+        sent = rejected = 0
+        start = time.perf_counter()
+        for attempt in range(attempts):
+            sock, cache = bidders[attempt % clients]
+            apply_pushes(sock, cache)
+            amount = round(cache.items["clock"].price * rng.uniform(0.8, 1.15), 2)
+            if use_cache and cache.check_bid("clock", amount) is not None:
+                continue
+            sent += 1
+            sock.sendto(encode_message("BID", attempt, "clock", amount).encode(), address)
+            reply = None
+            while reply is None:
+                # Updates for other bids may be queued ahead of the reply
+                reply = apply_pushes(sock, cache) or None
+                if reply is None:
+                    time.sleep(0.0002)
+            parts = reply.split()
+            if parts[0] == "BID_ACCEPTED":
+                cache.update("clock", amount, f"bidder{attempt % clients}", int(parts[2]))
+            else:
+                rejected += 1
+                if use_cache:
+                    cache.bid_rejected(parts[2])
+        elapsed = time.perf_counter() - start
+        local = sum(cache.local_rejects for _, cache in bidders)
+        stale = sum(cache.stale_passes for _, cache in bidders)
+        return elapsed, sent, rejected, local, stale
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    attempts = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    print(f"{clients} subscribed bidders, {attempts} bid attempts on one item")
+    for label, use_cache in (("no cache", False), ("cache", True)):
+        elapsed, sent, rejected, local, stale = run(clients, attempts, use_cache)
+        print(f"{label:9s} sent {sent:5d}   server rejected {rejected:5d}   rejected locally {local:5d}   "
+              f"stale passes {stale:4d}   {elapsed / attempts * 1000:6.3f} ms per attempt")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Benchmark: aggregate bid throughput as cluster nodes are added
+
+Starts 1, 2 and 4 udp_server.py nodes on localhost (each with its own
+data file in a temporary directory), lists items through the hash ring,
+then runs closed-loop bidder processes that route every BID to the node
+owning its item. Reports accepted bids per second for each cluster size.
+
+Run from the repository root:  python benchmarks/bench_cluster.py [bidders] [seconds]
+"""
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.cluster import HashRing
+from utils.parser import encode_message
+
+BASE_PORT = 5200
+ITEMS = 200
+CLUSTER_SIZES = (1, 2, 4)
+
+
+def request(sock, ring, message):
+    """Send a message to every node it routes to and wait for each reply"""
+    nodes = ring.route(message)
+    for node in nodes:
+        sock.sendto(message.encode('utf-8'), node)
+    return [sock.recv(65535).decode('utf-8') for _ in nodes]
+
+
+def register(sock, ring, name, role):
+    port = sock.getsockname()[1]
+    request(sock, ring, encode_message("REGISTER", 1, name, role, "127.0.0.1", port, port))
+
+
+def bidder(nodes, index, seconds, results):
+    ring = HashRing(nodes)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(5.0)
+    register(sock, ring, f"bidder{index}", "buyer")
+
+    accepted = 0
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        count += 1
+        # Amounts keep rising and differ per bidder, so most bids are accepted
+        amount = 100 + count * 100 + index
+        reply = request(sock, ring, encode_message("BID", count, f"item{(count * 7 + index) % ITEMS}", amount))
+        accepted += reply[0].startswith("BID_ACCEPTED")
+    results.put(accepted)
+
+
+def start_nodes(count, directory):
+    nodes = [("127.0.0.1", BASE_PORT + 10 * i) for i in range(count)]
+    spec = ",".join(f"{host}:{port}" for host, port in nodes)
+    env = dict(os.environ, AUCTION_LOG_LEVEL="WARNING")
+    processes = [subprocess.Popen([sys.executable, os.path.join(ROOT, "udp_server.py"),
+                                   "--udp-port", str(port), "--tcp-port", str(port + 1),
+                                   "--data", os.path.join(directory, f"node{port}.json"),
+                                   "--cluster", spec, "--node", f"{host}:{port}",
+                                   # Load generators, not people: lift the per-client limits
+                                   "--address-rate", "100000", "--user-rate", "100000"], env=env)
+                 for host, port in nodes]
+    time.sleep(1.0)
+    return nodes, processes
+
+
+def run(count, bidders, seconds):
+    with tempfile.TemporaryDirectory() as directory:
+        nodes, processes = start_nodes(count, directory)
+        try:
+            ring = HashRing(nodes)
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(("127.0.0.1", 0))
+            sock.settimeout(5.0)
+            register(sock, ring, "seller", "seller")
+            for i in range(ITEMS):
+                request(sock, ring, encode_message("LIST_ITEM", i, f"item{i}", "bench_item", 1, 60, "seller"))
+
+            results = multiprocessing.Queue()
+            pool = [multiprocessing.Process(target=bidder, args=(nodes, index, seconds, results))
+                    for index in range(bidders)]
+            for process in pool:
+                process.start()
+            accepted = sum(results.get() for _ in pool)
+            for process in pool:
+                process.join()
+            return accepted / seconds
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait()
+
+
+def main():
+    bidders = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    print(f"{bidders} bidders, {seconds:.0f}s per run, {ITEMS} items, {os.cpu_count()} CPUs")
+    for count in CLUSTER_SIZES:
+        print(f"{count} node(s): {run(count, bidders, seconds):8.0f} accepted bids/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Microbenchmark: parse + dispatch cost per message, startswith chain vs schema codec
+
+Run from the repository root:  python benchmarks/bench_dispatch.py [count]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.workload import sample_messages
+from utils.parser import MessageError, parse_message
+
+
+# --- Old path: startswith chain, each handler splits the string again ---
+
+def legacy_register(message):
+    _, req_num, name, role, ip, udp_port, tcp_port = message.split()
+    return name
+
+
+def legacy_login(message):
+    parts = message.split()
+    return parts[2]
+
+
+def legacy_list_item(message):
+    _, req_num, item_name, item_description, start_price, duration, seller_name = message.split()
+    return float(start_price), int(duration)
+
+
+def legacy_subscribe(message):
+    _, req_num, item_name, client_name = message.split()
+    return item_name
+
+
+def legacy_bid(message):
+    _, req_num, item_name, bid_amount = message.split()
+    return float(bid_amount)
+
+
+def legacy_dispatch(message):
+    if message.startswith("REGISTER"):
+        return legacy_register(message)
+    elif message.startswith("DE-REGISTER"):
+        return None
+    elif message.startswith("LOGIN"):
+        return legacy_login(message)
+    elif message.startswith("LIST_ITEM"):
+        return legacy_list_item(message)
+    elif message.startswith("SUBSCRIBE"):
+        return legacy_subscribe(message)
+    elif message.startswith("DE-SUBSCRIBE"):
+        return legacy_subscribe(message)
+    elif message.startswith("BID"):
+        return legacy_bid(message)
+    return None
+
+
+# --- New path: one schema parse, dict lookup on the command token ---
+
+HANDLERS = {
+    'REGISTER': lambda m: m.name,
+    'DE-REGISTER': lambda m: None,
+    'LOGIN': lambda m: m.name,
+    'LIST_ITEM': lambda m: (m.start_price, m.duration),
+    'SUBSCRIBE': lambda m: m.item_name,
+    'DE-SUBSCRIBE': lambda m: m.item_name,
+    'BID': lambda m: m.bid_amount,
+}
+
+
+def schema_dispatch(message):
+    try:
+        request = parse_message(message)
+    except MessageError as e:
+        return e.reply()
+    return HANDLERS[request.command](request)
+
+
+def measure(dispatch, messages, rounds=5):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for message in messages:
+            dispatch(message)
+        best = min(best, time.perf_counter() - start)
+    return best / len(messages) * 1e9
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    messages = sample_messages(count)
+
+    legacy_ns = measure(legacy_dispatch, messages)
+    schema_ns = measure(schema_dispatch, messages)
+
+    print(f"{count} messages, best of 5 rounds")
+    print(f"startswith chain + re-split : {legacy_ns:8.0f} ns/msg")
+    print(f"schema codec + dict dispatch: {schema_ns:8.0f} ns/msg ({legacy_ns / schema_ns:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
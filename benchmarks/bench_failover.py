@@ -0,0 +1,117 @@
+"""Benchmark: replication lag and failover time for a primary/standby pair
+
+Starts a primary (serving its replication log) and a standby on the same
+UDP/TCP ports, plus an in-process follower that records the lag of every
+change. After a burst of bids the primary is killed; the time until the
+standby answers on the primary's port is the failover time, and the
+highest accepted price is checked to have survived.
+
+Run from the repository root:  python benchmarks/bench_failover.py [bids] [failover_timeout]
+"""
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.parser import encode_message
+from utils.replication import ReplicationStandby
+
+UDP_PORT = 5300
+REPLICATION_PORT = 5302
+
+
+class LagProbe(ReplicationStandby):
+    """Follower that keeps every change's lag instead of just the last and max"""
+
+    def __init__(self, primary):
+        super().__init__(primary, failover_timeout=3600)
+        self.samples = []
+
+    def apply(self, entry):
+        super().apply(entry)
+        if entry["type"] == "change":
+            self.samples.append(self.lag)
+
+
+def server(directory, name, *extra):
+    env = dict(os.environ, AUCTION_LOG_LEVEL="WARNING")
+    return subprocess.Popen([sys.executable, os.path.join(ROOT, "udp_server.py"),
+                             "--udp-port", str(UDP_PORT), "--tcp-port", str(UDP_PORT + 1),
+                             "--data", os.path.join(directory, f"{name}.json"), *extra,
+                             # Load generators, not people: lift the per-client limits
+                             "--address-rate", "100000", "--user-rate", "100000"], env=env)
+
+
+def request(sock, message):
+    sock.sendto(message.encode('utf-8'), ("127.0.0.1", UDP_PORT))
+    return sock.recv(65535).decode('utf-8')
+
+
+def main():
+    bids = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    failover_timeout = sys.argv[2] if len(sys.argv) > 2 else "1.0"
+
+    with tempfile.TemporaryDirectory() as directory:
+        primary = server(directory, "primary", "--replication-port", str(REPLICATION_PORT))
+        time.sleep(1.0)
+        standby = server(directory, "standby", "--standby", f"127.0.0.1:{REPLICATION_PORT}",
+                         "--failover-timeout", failover_timeout)
+        probe = LagProbe(("127.0.0.1", REPLICATION_PORT))
+        threading.Thread(target=probe.follow, daemon=True).start()
+        time.sleep(1.0)
+
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(("127.0.0.1", 0))
+            sock.settimeout(5.0)
+            port = sock.getsockname()[1]
+            request(sock, encode_message("REGISTER", 1, "ann", "seller", "127.0.0.1", port, port))
+            request(sock, encode_message("LIST_ITEM", 2, "lamp", "brass_lamp", 1, 60, "ann"))
+
+            start = time.perf_counter()
+            for i in range(bids):
+                request(sock, encode_message("BID", 3 + i, "lamp", 2 + i))
+            elapsed = time.perf_counter() - start
+            time.sleep(0.5)
+            last_price = 1 + bids
+
+            samples = sorted(probe.samples)
+            print(f"{bids} bids in {elapsed:.2f}s ({bids / elapsed:.0f}/s), {len(samples)} changes replicated")
+            if samples:
+                print(f"replication lag   p50 {samples[len(samples) // 2] * 1000:7.2f} ms   "
+                      f"p99 {samples[int(len(samples) * 0.99)] * 1000:7.2f} ms   max {samples[-1] * 1000:7.2f} ms")
+
+            primary.kill()
+            primary.wait()
+            killed = time.perf_counter()
+
+            # Sessions are not replicated, so log in again before bidding on the standby
+            sock.settimeout(0.05)
+            while True:
+                try:
+                    reply = request(sock, encode_message("LOGIN", 9000, "ann", port))
+                    break
+                except OSError:
+                    pass
+            failover = time.perf_counter() - killed
+            sock.settimeout(5.0)
+            low = request(sock, encode_message("BID", 9001, "lamp", last_price))
+            high = request(sock, encode_message("BID", 9002, "lamp", last_price + 1))
+            print(f"failover          {failover * 1000:7.0f} ms until the standby answered ({reply.split()[0]}), "
+                  f"timeout {float(failover_timeout) * 1000:.0f} ms")
+            print(f"state check       bid at old price -> {low.split()[0]} {low.split()[-1]}, "
+                  f"bid above it -> {high.split()[0]}")
+        finally:
+            for process in (primary, standby):
+                process.kill()
+                process.wait()
+
+
+if __name__ == "__main__":
+    main()
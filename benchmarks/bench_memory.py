@@ -0,0 +1,167 @@
+"""Benchmark: memory held per user, item, bid and subscription at scale
+
+Fills an in-process AuctionServer (on a VirtualClock, never started) with
+N users, N items, N bids and N subscriptions, one category at a time, and
+measures with tracemalloc what each category adds: the records themselves
+plus everything derived from them (sessions, name lookups, browse and
+text indexes, deadline timers, change history). Users, items and bids go
+through the request handlers; subscriptions are inserted the way
+handle_auction_subscription stores them, since its duplicate check scans
+every subscription and would make the fill quadratic.
+
+The report gives bytes per entity for each category, the source files the
+memory was allocated from, and the change against the last stored run of
+the same size. Each run is appended to benchmarks/results/memory.jsonl.
+tracemalloc slows allocation down several times; sizes in the millions
+take minutes and gigabytes.
+
+Run from the repository root:  python benchmarks/bench_memory.py [N ...]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from udp_server import AuctionServer
+from utils.clock import VirtualClock
+from utils.logger import setup_logging, shutdown_logging
+
+RESULTS = os.path.join(ROOT, "benchmarks", "results", "memory.jsonl")
+CATEGORIES = ("users", "items", "bids", "subscriptions")
+# Source files listed per category
+TOP_FILES = 4
+# Auctions stay open for the whole run
+DURATION = 60 * 24
+DESCRIPTION = "Lightly_used,_ships_from_Montreal,_see_photos"
+
+
+def address(i):
+    return f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}", 5000
+
+
+def fill(server, category, n):
+    """Add n records of one category"""
+    request = server.handle_datagram
+    if category == "users":
+        for i in range(n):
+            host, port = address(i)
+            role = "seller" if i % 10 == 0 else "buyer"
+            message = f"REGISTER {i} user{i} {role} {host} {port} {port + 1}".encode()
+            request(message, (host, port))
+    elif category == "items":
+        for i in range(n):
+            message = f"LIST_ITEM {i} item{i} {DESCRIPTION} {10 + i % 90} {DURATION} user{i - i % 10}".encode()
+            request(message, address(i - i % 10))
+    elif category == "bids":
+        # Bidder i bids on item i; every bid is accepted and raises the price
+        for i in range(n):
+            message = f"BID {i} item{i} {200 + i % 50}".encode()
+            request(message, address(i))
+    else:
+        for i in range(n):
+            server.subscriptions[len(server.subscriptions) + 1] = {'client_name': f"user{i}", 'name': f"item{i}"}
+
+
+def measure(n):
+    clock = VirtualClock()
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        server = AuctionServer(host="127.0.0.1", udp_port=0, tcp_port=0,
+                               data_file=os.path.join(directory, "data.json"), clock=clock)
+        # The state file is never written; only what the process holds counts
+        server.save_data = lambda: None
+        try:
+            tracemalloc.start()
+            for category in CATEGORIES:
+                gc.collect()
+                before = tracemalloc.take_snapshot()
+                start = time.perf_counter()
+                with server.batched():
+                    fill(server, category, n)
+                elapsed = time.perf_counter() - start
+                gc.collect()
+                after = tracemalloc.take_snapshot()
+                stats = after.compare_to(before, 'filename')
+                total = sum(stat.size_diff for stat in stats)
+                files = {os.path.basename(stat.traceback[0].filename): stat.size_diff
+                         for stat in stats[:TOP_FILES] if stat.size_diff > 0}
+                results[category] = {'bytes': total, 'per_entity': round(total / n, 1),
+                                     'seconds': round(elapsed, 2), 'files': files}
+                del before, after, stats
+            results['peak'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+            server.udp_socket.close()
+            server.tcp_socket.close()
+    return results
+
+
+def last_run(path, n):
+    """The most recent run of size n stored in path, if any"""
+    previous = None
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    run = json.loads(line)
+                    if run.get('n') == n:
+                        previous = run
+    return previous
+
+
+def revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory footprint of the server's state per entity")
+    parser.add_argument("sizes", type=int, nargs="*", default=[10000, 100000],
+                        help="records per category (default: 10000 100000)")
+    parser.add_argument("--results", default=RESULTS, help="JSON-lines file runs are appended to")
+    parser.add_argument("--no-save", action="store_true", help="report without storing the run")
+    args = parser.parse_args()
+
+    setup_logging()
+    try:
+        for n in args.sizes:
+            previous = last_run(args.results, n)
+            results = measure(n)
+            print(f"\n{n} of each: peak traced {results['peak'] / 2 ** 20:.1f} MiB")
+            print(f"  {'category':14s} {'bytes/entity':>12s} {'total MiB':>10s} {'fill s':>8s} {'vs last':>8s}")
+            for category in CATEGORIES:
+                result = results[category]
+                change = ""
+                if previous and category in previous['results']:
+                    old = previous['results'][category]['per_entity']
+                    change = f"{(result['per_entity'] - old) / old * 100:+.1f}%" if old else ""
+                print(f"  {category:14s} {result['per_entity']:12.1f} {result['bytes'] / 2 ** 20:10.1f} "
+                      f"{result['seconds']:8.2f} {change:>8s}")
+                print("      " + ", ".join(f"{name} {size / n:.0f}" for name, size in result['files'].items()))
+            if not args.no_save:
+                os.makedirs(os.path.dirname(args.results), exist_ok=True)
+                with open(args.results, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({'n': n, 'date': datetime.now().isoformat(timespec='seconds'),
+                                        'revision': revision(), 'python': platform.python_version(),
+                                        'results': results}) + "\n")
+        if not args.no_save:
+            print(f"\nstored in {os.path.relpath(args.results)}")
+    finally:
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
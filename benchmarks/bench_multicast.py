@@ -0,0 +1,168 @@
+"""Benchmark: BID_UPDATE fan-out by unicast vs one multicast send per bid
+
+Runs an in-process AuctionServer on loopback with SUBSCRIBERS subscribers
+to one item and a separate bidder. It times BIDs (round trip to
+BID_ACCEPTED) and counts how many updates reached the subscribers. This is
+done with per-subscriber unicast and with multicast mode, where every
+subscriber opens a socket on the group named in its AUCTION_ANNOUNCE.
+Sockets are drained after the bids rather than read by threads, so the
+timing is the server's alone. Finally a MulticastReceiver drops out of the group for a
+few bids, and the versions it missed are fetched with RESYNC.
+
+Run from the repository root:  python benchmarks/bench_multicast.py [subscribers] [bids]
+"""
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from udp_server import AuctionServer
+from utils.multicast import MulticastPublisher, MulticastReceiver, parse_group
+from utils.parser import encode_message
+from utils.rate_limit import Admission
+from utils.versions import VersionTracker
+
+UNLIMITED = 1e9
+
+
+def client(port, name, role):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+    sock.settimeout(5.0)
+    own = sock.getsockname()[1]
+    sock.sendto(encode_message("REGISTER", 1, name, role, "127.0.0.1", own, 0).encode(), ("127.0.0.1", port))
+    sock.recv(65535)
+    return sock
+
+
+def join(group):
+    """Open a socket that receives the group's datagrams"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+    sock.bind(group)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                    socket.inet_aton(group[0]) + socket.inet_aton("127.0.0.1"))
+    return sock
+
+
+def drain(sock, keep=None):
+    """Read every datagram waiting on a socket; returns the count, or the messages starting with keep"""
+    sock.setblocking(False)
+    count = 0
+    kept = []
+    try:
+        while True:
+            message = sock.recv(65535).decode()
+            count += 1
+            if keep and message.startswith(keep):
+                kept.append(message)
+    except BlockingIOError:
+        pass
+    sock.settimeout(5.0)
+    return kept if keep else count
+
+
+def run(subscribers, bids, multicast):
+    with tempfile.TemporaryDirectory() as directory:
+        publisher = MulticastPublisher(threshold=2) if multicast else None
+        server = AuctionServer(host="127.0.0.1", udp_port=0, tcp_port=0,
+                               data_file=os.path.join(directory, "data.json"),
+                               admission=Admission(UNLIMITED, UNLIMITED, UNLIMITED, UNLIMITED, 1 << 30),
+                               multicast=publisher)
+        threading.Thread(target=server.run, daemon=True).start()
+        port = server.udp_socket.getsockname()[1]
+        address = ("127.0.0.1", port)
+
+        seller = client(port, "seller", "seller")
+        seller.sendto(encode_message("LIST_ITEM", 2, "vase", "ming_vase", 1, 60, "seller").encode(), address)
+        seller.recv(65535)
+
+        socks = []
+        members = []
+        for i in range(subscribers):
+            sock = client(port, f"sub{i}", "buyer")
+            sock.sendto(encode_message("SUBSCRIBE", 3, "vase", f"sub{i}").encode(), address)
+            socks.append(sock)
+        for sock in socks:
+            # Replies: this subscriber's AUCTION_ANNOUNCE and SUBSCRIBED, in either order
+            for _ in range(2):
+                parts = sock.recv(65535).decode().split()
+                if parts[0] == "AUCTION_ANNOUNCE" and len(parts) == 8:
+                    members.append(join(parse_group(parts[7])))
+        for sock in socks:
+            # Re-announcements sent to early subscribers when the item turned hot
+            for message in drain(sock, keep="AUCTION_ANNOUNCE"):
+                members.append(join(parse_group(message.split()[7])))
+
+        bidder = client(port, "bidder", "buyer")
+        start = time.perf_counter()
+        for i in range(bids):
+            bidder.sendto(encode_message("BID", 10 + i, "vase", 2 + i).encode(), address)
+            bidder.recv(65535)
+        elapsed = time.perf_counter() - start
+        time.sleep(0.5)
+        delivered = sum(drain(sock) for sock in socks + members)
+
+        gap = None
+        if multicast:
+            # Leave the group so the receiver below is its only member
+            for sock in members:
+                sock.close()
+            gap = check_gap(publisher, bidder, socks[0], address, bids)
+        return elapsed, delivered, publisher.sent if multicast else bids * subscribers, gap
+
+
+def check_gap(publisher, bidder, sock, address, bids):
+    """Drop a receiver out of the group for a few bids and RESYNC from the last version it saw"""
+    gaps = []
+    tracker = VersionTracker(lambda item_name, version: gaps.append(version))
+    receiver = MulticastReceiver(lambda item_name, message: None, tracker)
+    group = publisher.group("vase")
+    receiver.join("vase", group)
+    membership = socket.inet_aton(group[0]) + socket.inet_aton(receiver.interface)
+    amount = 2 + bids
+
+    def bid():
+        nonlocal amount
+        amount += 1
+        bidder.sendto(encode_message("BID", amount, "vase", amount).encode(), address)
+        return int(bidder.recv(65535).split()[2])
+
+    bid()
+    time.sleep(0.1)
+    receiver._sockets["vase"].setsockopt(socket.IPPROTO_IP, socket.IP_DROP_MEMBERSHIP, membership)
+    for _ in range(3):
+        bid()
+    receiver._sockets["vase"].setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+    latest = bid()
+    time.sleep(0.1)
+    receiver.close()
+
+    sock.sendto(encode_message("RESYNC", 99, "vase", gaps[0] if gaps else 0).encode(), address)
+    reply = sock.recv(65535).decode().split("\n")
+    return gaps, reply, latest
+
+
+def main():
+    subscribers = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    bids = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    print(f"{subscribers} subscribers, {bids} bids on one item")
+    for label, multicast in (("unicast", False), ("multicast", True)):
+        elapsed, delivered, sent, gap = run(subscribers, bids, multicast)
+        print(f"{label:9s} {bids / elapsed:8.0f} bids/s   {elapsed / bids * 1000:7.3f} ms/bid   "
+              f"datagrams sent {sent:7d}   updates delivered {delivered}/{bids * subscribers}")
+        if gap is not None:
+            gaps, reply, latest = gap
+            print(f"          gap check: gaps after versions {gaps} (latest {latest}), RESYNC reply:")
+            for line in reply:
+                print(f"            {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Benchmark: a polite client's latency while a bot floods the server with BIDs
+
+Runs an in-process AuctionServer twice, once with admission control
+effectively disabled and once with the default limits. A bot thread
+fires about FLOOD_RATE BID datagrams per second without waiting for
+replies; a second client sends one BID every 50 ms and records its
+round-trip latency.
+
+Run from the repository root:  python benchmarks/bench_overload.py [seconds]
+"""
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from udp_server import AuctionServer
+from utils.parser import encode_message
+from utils.rate_limit import Admission
+
+UNLIMITED = 1e9
+# Bot datagrams per second, sent in bursts of FLOOD_BURST
+FLOOD_RATE = 5000
+FLOOD_BURST = 50
+
+
+def client(server_port, name):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(5.0)
+    port = sock.getsockname()[1]
+    sock.sendto(encode_message("REGISTER", 1, name, "buyer", "127.0.0.1", port, port).encode(),
+                ("127.0.0.1", server_port))
+    sock.recv(65535)
+    return sock
+
+
+def run(admission, seconds):
+    with tempfile.TemporaryDirectory() as directory:
+        server = AuctionServer(host="127.0.0.1", udp_port=0, tcp_port=0,
+                               data_file=os.path.join(directory, "data.json"), admission=admission)
+        threading.Thread(target=server.run, daemon=True).start()
+        port = server.udp_socket.getsockname()[1]
+        address = ("127.0.0.1", port)
+
+        seller = client(port, "seller")
+        for item in ("flood", "quiet"):
+            seller.sendto(encode_message("LIST_ITEM", 2, item, "bench", 1, 60, "seller").encode(), address)
+            seller.recv(65535)
+
+        bot = client(port, "bot")
+        bot.setblocking(False)
+        stop = threading.Event()
+
+        def flood():
+            amount = 1
+            while not stop.is_set():
+                for _ in range(FLOOD_BURST):
+                    amount += 1
+                    bot.sendto(encode_message("BID", amount, "flood", amount).encode(), address)
+                try:
+                    while True:
+                        bot.recv(65535)
+                except BlockingIOError:
+                    pass
+                time.sleep(FLOOD_BURST / FLOOD_RATE)
+
+        polite = client(port, "polite")
+        threading.Thread(target=flood, daemon=True).start()
+        samples = []
+        replies = {}
+        deadline = time.perf_counter() + seconds
+        amount = 1
+        while time.perf_counter() < deadline:
+            amount += 1
+            start = time.perf_counter()
+            polite.sendto(encode_message("BID", amount, "quiet", amount).encode(), address)
+            try:
+                reply = polite.recv(65535).split()[0].decode()
+            except socket.timeout:
+                reply = "timeout"
+            samples.append(time.perf_counter() - start)
+            replies[reply] = replies.get(reply, 0) + 1
+            time.sleep(0.05)
+        stop.set()
+        samples.sort()
+        return samples, replies, dict(server.admission.rejected)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    for label, admission in (("no limits", Admission(UNLIMITED, UNLIMITED, UNLIMITED, UNLIMITED, 1 << 30)),
+                             ("default limits", Admission())):
+        samples, replies, rejected = run(admission, seconds)
+        print(f"{label:15s} polite p50 {samples[len(samples) // 2] * 1000:8.2f} ms   "
+              f"p99 {samples[int(len(samples) * 0.99)] * 1000:8.2f} ms   replies {replies}   shed {rejected}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark: latency of a last-second BID stuck behind a burst of LIST_ITEMs
+
+Runs an in-process AuctionServer. A seller fires a burst of LIST_ITEM
+datagrams without waiting, and right behind them a buyer bids on an
+auction that ends within CLOSING_SOON seconds. The buyer's round trip is
+timed with plain FIFO scheduling (every request in one class) and with
+the priority classes, followed by the per-class queue-time metrics.
+
+Run from the repository root:  python benchmarks/bench_priority.py [burst] [rounds]
+"""
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from udp_server import AuctionServer
+from utils.parser import encode_message
+from utils.rate_limit import Admission
+from utils.scheduler import WRITE
+
+UNLIMITED = 1e9
+
+
+def client(port, name, role):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(30.0)
+    own = sock.getsockname()[1]
+    sock.sendto(encode_message("REGISTER", 1, name, role, "127.0.0.1", own, own).encode(), ("127.0.0.1", port))
+    sock.recv(65535)
+    return sock
+
+
+def run(fifo, burst, rounds):
+    with tempfile.TemporaryDirectory() as directory:
+        server = AuctionServer(host="127.0.0.1", udp_port=0, tcp_port=0,
+                               data_file=os.path.join(directory, "data.json"),
+                               admission=Admission(UNLIMITED, UNLIMITED, UNLIMITED, UNLIMITED, 1 << 30))
+        if fifo:
+            server.classify = lambda request: WRITE
+        threading.Thread(target=server.run, daemon=True).start()
+        port = server.udp_socket.getsockname()[1]
+        address = ("127.0.0.1", port)
+
+        seller = client(port, "seller", "seller")
+        buyer = client(port, "buyer", "buyer")
+        seller.sendto(encode_message("LIST_ITEM", 2, "clock", "last_second", 1, 60, "seller").encode(), address)
+        seller.recv(65535)
+        # Pretend the auction is in its final seconds
+        server.items[server.item_ids_by_name["clock"]]['end_time'] = datetime.now() + timedelta(seconds=5)
+
+        samples = []
+        for round_number in range(rounds):
+            for i in range(burst):
+                name = f"bulk{round_number}_{i}"
+                seller.sendto(encode_message("LIST_ITEM", i, name, "filler", 1, 60, "seller").encode(), address)
+            start = time.perf_counter()
+            buyer.sendto(encode_message("BID", round_number, "clock", 10 + round_number).encode(), address)
+            buyer.recv(65535)
+            samples.append(time.perf_counter() - start)
+            for _ in range(burst):
+                seller.recv(65535)
+        samples.sort()
+        return samples, server.requests.report()
+
+
+def main():
+    burst = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    print(f"{rounds} rounds of {burst} LIST_ITEMs followed by one closing-soon BID")
+    for label, fifo in (("fifo", True), ("priority", False)):
+        samples, report = run(fifo, burst, rounds)
+        print(f"{label:9s} bid p50 {samples[len(samples) // 2] * 1000:8.1f} ms   max {samples[-1] * 1000:8.1f} ms")
+        for name, stats in report.items():
+            if stats['served']:
+                print(f"          {name:11s} served {stats['served']:5d}   avg wait {stats['avg_wait_ms']:8.2f} ms"
+                      f"   max wait {stats['max_wait_ms']:8.2f} ms   aged {stats['aged']}")
+
+
+if __name__ == "__main__":
+    main()
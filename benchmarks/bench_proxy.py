@@ -0,0 +1,156 @@
+"""Benchmark: bid traffic on a contested item, manual outbidding vs PROXY_BID
+
+Runs an in-process AuctionServer with BUYERS subscribed buyers who each
+value one item at a different (seeded) amount. In manual mode every buyer
+behaves like a bidding bot: whenever it is outbid it sends a BID one
+increment over the price, until the price passes what it will pay. In
+proxy mode every buyer sends a single PROXY_BID with that amount and the
+server settles the rest. The report counts client requests, BID_UPDATE
+pushes delivered, state saves and item versions, and the final price and
+winner, which should agree between the two modes (proxy bidding
+settles one increment over the runner-up's maximum).
+
+Run from the repository root:  python benchmarks/bench_proxy.py [buyers]
+"""
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from udp_server import AuctionServer
+from utils.bid_engine import BID_INCREMENT
+from utils.parser import encode_message
+from utils.rate_limit import Admission
+
+UNLIMITED = 1e9
+START_PRICE = 1
+
+
+def client(port, name):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+    sock.settimeout(5.0)
+    own = sock.getsockname()[1]
+    sock.sendto(encode_message("REGISTER", 1, name, "buyer", "127.0.0.1", own, 0).encode(), ("127.0.0.1", port))
+    sock.recv(65535)
+    return sock
+
+
+class Buyer:
+    def __init__(self, name, sock, limit):
+        self.name = name
+        self.sock = sock
+        self.limit = limit
+        self.price = START_PRICE
+        self.leader = None
+        self.pushes = 0
+
+    def drain(self):
+        """Apply waiting BID_UPDATEs; returns the first other message, if any"""
+        self.sock.setblocking(False)
+        try:
+            while True:
+                message = self.sock.recv(65535).decode()
+                if not message.startswith("BID_UPDATE"):
+                    return message
+                self.pushes += 1
+                parts = message.split()
+                self.price, self.leader = float(parts[3]), parts[4]
+        except BlockingIOError:
+            return None
+        finally:
+            self.sock.settimeout(5.0)
+
+    def request(self, message, address):
+        self.sock.sendto(message.encode(), address)
+        reply = None
+        while reply is None:
+            reply = self.drain()
+            if reply is None:
+                time.sleep(0.0002)
+        return reply
+
+
+def run(buyers, proxy):
+    rng = random.Random(44)
+    limits = [float(rng.randint(100, 500)) for _ in range(buyers)]
+    with tempfile.TemporaryDirectory() as directory:
+        server = AuctionServer(host="127.0.0.1", udp_port=0, tcp_port=0,
+                               data_file=os.path.join(directory, "data.json"),
+                               admission=Admission(UNLIMITED, UNLIMITED, UNLIMITED, UNLIMITED, 1 << 30))
+        saves = [0]
+        save_data = server.save_data
+
+        def counted_save():
+            saves[0] += 1
+            save_data()
+
+        server.save_data = counted_save
+        threading.Thread(target=server.run, daemon=True).start()
+        port = server.udp_socket.getsockname()[1]
+        address = ("127.0.0.1", port)
+
+        seller = client(port, "seller")
+        seller.sendto(encode_message("LIST_ITEM", 2, "guitar", "signed_guitar", START_PRICE, 60, "seller").encode(), address)
+        seller.recv(65535)
+
+        group = []
+        for i, limit in enumerate(limits):
+            buyer = Buyer(f"buyer{i}", client(port, f"buyer{i}"), limit)
+            buyer.request(encode_message("SUBSCRIBE", 3, "guitar", buyer.name), address)
+            time.sleep(0.01)
+            buyer.drain()
+            group.append(buyer)
+        saves[0] = 0
+
+        requests = 0
+        start = time.perf_counter()
+        if proxy:
+            for buyer in group:
+                requests += 1
+                reply = buyer.request(encode_message("PROXY_BID", 10, "guitar", buyer.limit), address).split()
+                # BID_REJECTED if the price had already passed this buyer's maximum
+                if reply[0] == "PROXY_ACCEPTED":
+                    buyer.price, buyer.leader = float(reply[2]), reply[3]
+        else:
+            bidding = True
+            while bidding:
+                bidding = False
+                for buyer in group:
+                    buyer.drain()
+                    amount = buyer.price + BID_INCREMENT
+                    if buyer.leader == buyer.name or amount > buyer.limit:
+                        continue
+                    bidding = True
+                    requests += 1
+                    reply = buyer.request(encode_message("BID", requests, "guitar", amount), address)
+                    if reply.startswith("BID_ACCEPTED"):
+                        buyer.price, buyer.leader = amount, buyer.name
+        elapsed = time.perf_counter() - start
+        time.sleep(0.2)
+        for buyer in group:
+            buyer.drain()
+
+        item = server.items[server.item_ids_by_name["guitar"]]
+        return (elapsed, requests, sum(buyer.pushes for buyer in group), saves[0], item.get('version', 0),
+                item['current_price'], item['highest_bidder'], sorted(limits)[-2:])
+
+
+def main():
+    buyers = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    print(f"{buyers} buyers contesting one item, increment {BID_INCREMENT}")
+    for label, proxy in (("manual", False), ("proxy", True)):
+        elapsed, requests, pushes, saves, versions, price, winner, top = run(buyers, proxy)
+        print(f"{label:6s} requests {requests:5d}   updates pushed {pushes:6d}   saves {saves:5d}   "
+              f"versions {versions:5d}   {elapsed * 1000:8.1f} ms   final ${price} to {winner}")
+    print(f"two highest maximums: {top}")
+
+
+if __name__ == "__main__":
+    main()
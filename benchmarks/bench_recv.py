@@ -0,0 +1,91 @@
+"""Benchmark: UDP ingest, recvfrom + decode + split vs recvfrom_into + buffer parsing
+
+Sends the sample workload over loopback in bursts and measures, per request,
+the receive+parse time and the transient heap allocated (tracemalloc peak
+above the steady state).
+
+Run from the repository root:  python benchmarks/bench_recv.py [count]
+"""
+import os
+import socket
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.workload import sample_messages
+from utils.parser import MessageError, parse_datagram, parse_message
+
+MAX_DATAGRAM = 1024
+BURST = 256
+
+
+def make_pair():
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    receiver.bind(('127.0.0.1', 0))
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    return sender, receiver
+
+
+def old_path(receiver, _state):
+    data, address = receiver.recvfrom(MAX_DATAGRAM)
+    try:
+        return parse_message(data.decode('utf-8'))
+    except MessageError:
+        return None
+
+
+def new_path(receiver, state):
+    buffer, view = state
+    size, address = receiver.recvfrom_into(buffer)
+    try:
+        # One copy out of the reused buffer, as the server takes for its queue
+        return parse_datagram(view[:size].tobytes())
+    except MessageError:
+        return None
+
+
+def run(path, payloads, trace):
+    sender, receiver = make_pair()
+    target = receiver.getsockname()
+    buffer = bytearray(MAX_DATAGRAM)
+    state = (buffer, memoryview(buffer))
+    elapsed = 0.0
+    transient = 0
+    for start in range(0, len(payloads), BURST):
+        burst = payloads[start:start + BURST]
+        for payload in burst:
+            sender.sendto(payload, target)
+        for _ in burst:
+            if trace:
+                current = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                path(receiver, state)
+                transient += tracemalloc.get_traced_memory()[1] - current
+            else:
+                begin = time.perf_counter()
+                path(receiver, state)
+                elapsed += time.perf_counter() - begin
+    sender.close()
+    receiver.close()
+    return elapsed, transient
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    payloads = [message.encode('utf-8') for message in sample_messages(count)]
+
+    print(f"{count} datagrams over loopback, bursts of {BURST}")
+    for label, path in (("recvfrom + decode + split", old_path), ("recvfrom_into + buffer parse", new_path)):
+        elapsed, _ = run(path, payloads, trace=False)
+        tracemalloc.start()
+        _, transient = run(path, payloads, trace=True)
+        tracemalloc.stop()
+        print(f"{label:30s}: {elapsed / count * 1e9:7.0f} ns/request, "
+              f"{transient / count:6.0f} transient bytes/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""Sample request traffic shared by the benchmarks"""
+import random
+
+ROLES = ("buyer", "seller")
+
+
+def sample_messages(count=10000, users=200, items=500, seed=366):
+    """Return a reproducible mix of client requests, weighted towards BID like a live auction"""
+    rng = random.Random(seed)
+    messages = []
+    for req_num in range(1, count + 1):
+        user = f"user{rng.randrange(users)}"
+        item = f"item{rng.randrange(items)}"
+        roll = rng.random()
+        if roll < 0.60:
+            messages.append(f"BID {req_num} {item} {rng.randint(10, 5000)}.{rng.randrange(100):02d}")
+        elif roll < 0.75:
+            messages.append(f"SUBSCRIBE {req_num} {item} {user}")
+        elif roll < 0.85:
+            messages.append(f"LIST_ITEM {req_num} {item} a_very_nice_{item} {rng.randint(1, 500)} {rng.randint(1, 60)} {user}")
+        elif roll < 0.92:
+            messages.append(f"LOGIN {req_num} {user} {rng.randint(7001, 8000)}")
+        elif roll < 0.97:
+            messages.append(f"REGISTER {req_num} {user} {rng.choice(ROLES)} 127.0.0.1 {rng.randint(6000, 7000)} {rng.randint(7001, 8000)}")
+        else:
+            messages.append(f"DE-SUBSCRIBE {req_num} {item} {user}")
+    return messages
@@ -0,0 +1,245 @@
+"""Replay a traffic capture against a server and compare its replies
+
+Reads a capture written by `udp_server.py --capture PATH` and sends every
+request again, from one socket per original client, at the captured pace
+(--speed 1), N times faster (--speed N) or as fast as possible (--speed 0).
+Push channel lines are sent over one TCP connection per original channel.
+Replies are matched to requests by client and request number. The report
+gives reply latency and every reply that differs from the captured one.
+Tokens are random per run, so they are mapped from captured to new values
+and ignored when replies are compared. Pushes still go to the addresses
+the captured clients registered, not to the replaying sockets.
+
+Without --server a fresh in-process server with an empty state file is
+started, which makes a capture a repeatable benchmark:
+
+    python replay.py traffic.jsonl --speed 0
+"""
+import argparse
+import os
+import re
+import selectors
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from utils.capture import read_capture
+from utils.cluster import parse_nodes
+from utils.logger import setup_logging, shutdown_logging
+from utils.transport import Fragmenter, Reassembler, is_fragment
+
+# Seconds to wait for outstanding replies after the last request is sent
+DRAIN_TIMEOUT = 2.0
+# Seconds a request carrying a captured token waits for the reply that maps it
+TOKEN_WAIT = 2.0
+# Messages the server sends unasked; they are never taken as a reply
+PUSHES = ("BID_UPDATE", "AUCTION_ANNOUNCE", "WINNER", "SOLD", "NON_OFFER", "INFORM_Req")
+# Rate used for every limit with --unlimited
+UNLIMITED = 1e9
+# Divergent replies printed in full
+SHOW_DIVERGENCES = 10
+
+TOKEN = re.compile(r"token=(\S+)")
+
+
+def normalize(reply):
+    return TOKEN.sub("token=*", reply)
+
+
+class Replay:
+    def __init__(self, records, server, tcp_server, speed):
+        self.records = records
+        self.server = server
+        self.tcp_server = tcp_server
+        self.speed = speed
+        self.fragmenter = Fragmenter()
+        self.reassembler = Reassembler()
+        self.selector = selectors.DefaultSelector()
+        self.sockets = {}
+        self.channels = {}
+        # (peer, req_num) -> [send time, captured reply]
+        self.pending = {}
+        self.lock = threading.Condition()
+        self.tokens = {}
+        self.latencies = []
+        self.divergent = Counter()
+        self.examples = []
+        self.matched = 0
+        self.sent = 0
+        self.running = True
+
+        # A reply belongs to the latest request before it from the same client
+        # with the same request number (clients may reuse numbers)
+        latest = {}
+        for record in records:
+            parts = record['data'].split(None, 2)
+            key = (record['peer'], parts[1] if len(parts) > 1 else "")
+            if record['kind'] == 'udp':
+                latest[key] = record
+            elif record['kind'] == 'reply' and key in latest:
+                latest.pop(key)['reply'] = record['data']
+        self.captured_tokens = {token for record in records if 'reply' in record
+                                for token in TOKEN.findall(record['reply'])}
+
+    def socket_for(self, peer):
+        sock = self.sockets.get(peer)
+        if sock is None:
+            sock = self.sockets[peer] = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(("0.0.0.0", 0))
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+            self.selector.register(sock, selectors.EVENT_READ, peer)
+        return sock
+
+    def channel_for(self, peer):
+        conn = self.channels.get(peer)
+        if conn is None:
+            conn = self.channels[peer] = socket.create_connection(self.tcp_server, timeout=5.0)
+            # Whatever the server pushes back is read and dropped
+            threading.Thread(target=self.discard, args=(conn,), daemon=True).start()
+        return conn
+
+    @staticmethod
+    def discard(conn):
+        try:
+            while conn.recv(65536):
+                pass
+        except OSError:
+            pass
+
+    def rewrite(self, data):
+        """Swap captured tokens in data for the ones this run was issued"""
+        for token in [part for part in data.split() if part in self.captured_tokens]:
+            with self.lock:
+                self.lock.wait_for(lambda: token in self.tokens, TOKEN_WAIT)
+                data = data.replace(token, self.tokens.get(token, token))
+        return data
+
+    def receive_loop(self):
+        while self.running:
+            for key, _ in self.selector.select(timeout=0.1):
+                try:
+                    datagram, _ = key.fileobj.recvfrom(65535)
+                except OSError:
+                    continue
+                if is_fragment(datagram, len(datagram)):
+                    datagram = self.reassembler.add(datagram, key.data)
+                    if datagram is None:
+                        continue
+                self.on_reply(key.data, datagram.decode('utf-8', 'replace'), time.perf_counter())
+
+    def on_reply(self, peer, reply, now):
+        if reply.startswith(PUSHES):
+            return
+        parts = reply.split(None, 2)
+        if len(parts) < 2:
+            return
+        with self.lock:
+            entry = self.pending.pop((peer, parts[1]), None)
+            if entry is None:
+                return
+            sent_at, expected = entry
+            self.matched += 1
+            self.latencies.append(now - sent_at)
+            for old, new in zip(TOKEN.findall(expected), TOKEN.findall(reply)):
+                self.tokens[old] = new
+            self.lock.notify_all()
+            if normalize(reply.split("\n")[0]) != normalize(expected.split("\n")[0]):
+                self.divergent[f"{expected.split()[0]} -> {parts[0]}"] += 1
+                if len(self.examples) < SHOW_DIVERGENCES:
+                    self.examples.append((expected.split("\n")[0], reply.split("\n")[0]))
+
+    def run(self):
+        receiver = threading.Thread(target=self.receive_loop, daemon=True)
+        receiver.start()
+        start = time.perf_counter()
+        for record in self.records:
+            if record['kind'] == 'reply':
+                continue
+            if self.speed:
+                delay = start + record['t'] / self.speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            data = self.rewrite(record['data'])
+            if record['kind'] == 'tcp':
+                try:
+                    self.channel_for(record['peer']).sendall((data + "\n").encode('utf-8'))
+                except OSError as e:
+                    print(f"TCP line for {record['peer']} not sent: {e}")
+                continue
+            parts = data.split(None, 2)
+            key = (record['peer'], parts[1] if len(parts) > 1 else "")
+            sock = self.socket_for(record['peer'])
+            if 'reply' in record:
+                with self.lock:
+                    self.pending[key] = [time.perf_counter(), record['reply']]
+            for datagram in self.fragmenter.split(data.encode('utf-8')):
+                sock.sendto(datagram, self.server)
+            self.sent += 1
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.lock.wait_for(lambda: not self.pending, DRAIN_TIMEOUT)
+            missing = len(self.pending)
+        self.running = False
+        receiver.join()
+        for sock in self.sockets.values():
+            sock.close()
+        for conn in self.channels.values():
+            conn.close()
+        return elapsed, missing
+
+    def report(self, elapsed, missing):
+        captured = self.records[-1]['t'] if self.records else 0.0
+        print(f"replayed {self.sent} requests from {len(self.sockets)} clients "
+              f"({len(self.channels)} push channels) in {elapsed:.2f}s; captured span {captured:.2f}s")
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+            print(f"replies {self.matched}, missing {missing}; latency p50 {pick(0.5):.2f} ms  "
+                  f"p99 {pick(0.99):.2f} ms  max {latencies[-1] * 1000:.2f} ms")
+        diverged = sum(self.divergent.values())
+        print(f"divergent replies {diverged} of {self.matched}")
+        for kinds, count in self.divergent.most_common():
+            print(f"  {count:6d}  {kinds}")
+        for expected, got in self.examples:
+            print(f"  captured: {expected}\n  replayed: {got}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a traffic capture against an auction server")
+    parser.add_argument("capture", help="file written by udp_server.py --capture")
+    parser.add_argument("--speed", type=float, default=1.0, help="pace multiplier; 0 sends as fast as possible")
+    parser.add_argument("--server", help="host:port of a running server (default: start a fresh one)")
+    parser.add_argument("--tcp-port", type=int, help="the server's TCP port (default: UDP port + 1)")
+    parser.add_argument("--unlimited", action="store_true",
+                        help="turn off rate limiting in the fresh server, to measure it flat out")
+    args = parser.parse_args()
+
+    records = list(read_capture(args.capture))
+    setup_logging()
+    try:
+        if args.server:
+            server = parse_nodes(args.server)[0]
+            server = (socket.gethostbyname(server[0]), server[1])
+            tcp_server = (server[0], args.tcp_port or server[1] + 1)
+            replay = Replay(records, server, tcp_server, args.speed)
+            replay.report(*replay.run())
+        else:
+            from udp_server import AuctionServer
+            from utils.rate_limit import Admission
+            admission = Admission(UNLIMITED, UNLIMITED, UNLIMITED, UNLIMITED, 1 << 30) if args.unlimited else None
+            with tempfile.TemporaryDirectory() as directory:
+                fresh = AuctionServer(host="127.0.0.1", udp_port=0, tcp_port=0,
+                                      data_file=os.path.join(directory, "data.json"), admission=admission)
+                threading.Thread(target=fresh.run, daemon=True).start()
+                replay = Replay(records, fresh.udp_socket.getsockname(), fresh.tcp_socket.getsockname(), args.speed)
+                replay.report(*replay.run())
+    finally:
+        shutdown_logging()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""Deterministic fast-forward simulation of the auction server
+
+Drives an in-process AuctionServer on a VirtualClock from a single thread:
+users register, sellers list items over a window of virtual time, buyers
+place bids and proxy bids, and deadlines fire as the clock jumps from one
+event to the next. Hours of auctions run in seconds, and the same seed
+gives the same outcome, summarised as a digest of every item's final state.
+
+Run from the repository root:  python simulate.py [--auctions N] [--seed S] [--repeat R]
+"""
+import argparse
+import hashlib
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from datetime import timedelta
+
+from udp_server import AuctionServer
+from utils.clock import VirtualClock
+from utils.logger import setup_logging, shutdown_logging
+
+# Virtual minutes over which the auctions are listed
+LISTING_WINDOW = 24 * 60
+# Auction durations, in minutes (LIST_ITEM's unit)
+DURATIONS = (1, 5, 15, 60, 240)
+# Bids per auction are drawn from this range; some land after the deadline
+BIDS_PER_AUCTION = (0, 12)
+# Share of bids that are PROXY_BIDs rather than plain BIDs
+PROXY_SHARE = 0.2
+
+
+def plan(rng, auctions, sellers, buyers):
+    """Every request of the run as (virtual seconds, seq, user index, message), in time order"""
+    events = []
+    for n in range(auctions):
+        listed = rng.uniform(0, LISTING_WINDOW * 60)
+        duration = rng.choice(DURATIONS)
+        price = rng.randint(1, 200)
+        events.append((listed, len(events), rng.randrange(sellers),
+                       f"LIST_ITEM {n} item{n} simulated_item_{n} {price} {duration} seller"))
+        for _ in range(rng.randint(*BIDS_PER_AUCTION)):
+            # Up to 10% past the deadline, to exercise late bids
+            at = listed + rng.uniform(0, duration * 60 * 1.1)
+            amount = round(price * rng.uniform(1.0, 3.0), 2)
+            command = "PROXY_BID" if rng.random() < PROXY_SHARE else "BID"
+            events.append((at, len(events), sellers + rng.randrange(buyers), f"{command} {n} item{n} {amount}"))
+    events.sort()
+    return events
+
+
+def run(auctions, seed, sellers, buyers):
+    rng = random.Random(seed)
+    clock = VirtualClock()
+    start = clock.now()
+    with tempfile.TemporaryDirectory() as directory:
+        server = AuctionServer(host="127.0.0.1", udp_port=0, tcp_port=0,
+                               data_file=os.path.join(directory, "data.json"), clock=clock)
+        # Addresses are never sent to: every reply comes back from handle_datagram()
+        names = [f"seller{i}" for i in range(sellers)] + [f"buyer{i}" for i in range(buyers)]
+        addresses = [("10.0.0.1", 20000 + i) for i in range(len(names))]
+        replies = Counter()
+
+        def request(user, message):
+            data = message.replace(" seller", f" {names[user]}", 1) if message.startswith("LIST_ITEM") else message
+            reply = server.handle_datagram(data.encode(), addresses[user]) or ""
+            # Count replies by kind, with the reason for rejections
+            parts = reply.split()
+            replies[" ".join(parts[:1] + parts[2:3]) if parts and parts[0].endswith(("REJECTED", "DENIED")) else
+                    (parts[0] if parts else "-")] += 1
+
+        def drain():
+            """Run what the deadlines queued (closures) on this thread"""
+            while len(server.requests):
+                task, args = server.requests.get(timeout=0)[1]
+                task(*args)
+
+        started = time.perf_counter()
+        # State is saved once at the end rather than after every request
+        with server.batched():
+            for i, name in enumerate(names):
+                role = "seller" if i < sellers else "buyer"
+                request(i, f"REGISTER 0 {name} {role} 10.0.0.1 {20000 + i} 0")
+            for at, _, user, message in plan(rng, auctions, sellers, buyers):
+                clock.advance_to(start + timedelta(seconds=at))
+                drain()
+                request(user, message)
+            while clock.next_timer() is not None:
+                clock.advance_to(clock.next_timer())
+                drain()
+        elapsed = time.perf_counter() - started
+
+        digest = hashlib.sha256()
+        sold = unsold = revenue = 0
+        for item_id in sorted(server.items):
+            item = server.items[item_id]
+            digest.update(f"{item['name']} {item['current_price']} {item['highest_bidder']} "
+                          f"{len(item['bids'])} {item.get('version', 0)} {item['active']}\n".encode())
+            if item['highest_bidder']:
+                sold += 1
+                revenue += item['current_price']
+            else:
+                unsold += 1
+        open_auctions = sum(1 for item in server.items.values() if item['active'])
+        return {
+            'elapsed': elapsed,
+            'virtual': clock.now() - start,
+            'sold': sold,
+            'unsold': unsold,
+            'open': open_auctions,
+            'revenue': round(revenue, 2),
+            'replies': replies,
+            'market': server.market.summary(),
+            'digest': digest.hexdigest()[:16],
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fast-forward auction simulation on a virtual clock")
+    parser.add_argument("--auctions", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=366)
+    parser.add_argument("--sellers", type=int, default=20)
+    parser.add_argument("--buyers", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=2, help="runs with the same seed; their digests must match")
+    args = parser.parse_args()
+
+    setup_logging()
+    try:
+        digests = set()
+        for _ in range(args.repeat):
+            result = run(args.auctions, args.seed, args.sellers, args.buyers)
+            digests.add(result['digest'])
+            print(f"{args.auctions} auctions, seed {args.seed}: {result['virtual']} of virtual time "
+                  f"in {result['elapsed']:.2f}s; {result['sold']} sold, {result['unsold']} unsold, "
+                  f"{result['open']} still open, revenue ${result['revenue']}, digest {result['digest']}")
+        active, listed, sold, unsold, sell_through, mean, median = result['market']
+        print(f"market stats: {listed} listed, {sold} sold, {unsold} unsold, sell-through {sell_through:.1%}, "
+              f"final price mean ${mean} median ${median}")
+        print("replies: " + ", ".join(f"{kind} {count}" for kind, count in sorted(result['replies'].items())))
+        print("deterministic" if len(digests) == 1 else f"NOT deterministic: {sorted(digests)}")
+    finally:
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
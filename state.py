@@ -0,0 +1,50 @@
+"""Export the server state to NDJSON and import it back, streaming
+
+    python state.py export --data server_data.json -o backup.ndjson
+    python state.py import backup.ndjson --data restored.json
+
+Export reads the saved state file record by record and writes one JSON
+line per user, item, bid and subscription, after a header line. Import
+builds a state file from such lines without going through the server, so
+millions of records load with one write instead of a save per record.
+Both run in memory that does not grow with the number of records. Start
+the server on the imported file as usual; it rebuilds its indexes from it.
+"""
+import argparse
+import os
+import sys
+import time
+
+from utils.ndjson import export_state, import_state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming NDJSON export and import of the server state")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write the saved state as NDJSON")
+    export.add_argument("--data", default="server_data.json", help="state file to read")
+    export.add_argument("-o", "--output", default="-", help="NDJSON file to write (default: stdout)")
+    load = commands.add_parser("import", help="build a state file from NDJSON")
+    load.add_argument("input", help="NDJSON file written by export")
+    load.add_argument("--data", default="server_data.json", help="state file to write")
+    load.add_argument("--force", action="store_true", help="overwrite an existing state file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "export":
+        if args.output == "-":
+            counts = export_state(args.data, sys.stdout)
+        else:
+            with open(args.output, 'w', encoding='utf-8') as out:
+                counts = export_state(args.data, out)
+    else:
+        if os.path.exists(args.data) and not args.force:
+            parser.error(f"{args.data} exists; pass --force to overwrite it")
+        counts = import_state(args.input, args.data)
+    summary = ", ".join(f"{count} {kind}s" for kind, count in counts.items())
+    print(f"{args.command}ed {summary} in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
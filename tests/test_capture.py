@@ -0,0 +1,15 @@
+from utils.capture import CaptureWriter, read_capture
+
+
+def test_capture_masks_card_data(tmp_path):
+    path = tmp_path / "traffic.jsonl"
+    capture = CaptureWriter(str(path))
+    capture.record('tcp', ('127.0.0.1', 6001), "INFORM_Res 7 Jane_Doe 4111111111111111 12/29 12_Main_St")
+    capture.record('udp', ('127.0.0.1', 6001), b"BID 8 lamp 12.5")
+    capture.close()
+
+    text = path.read_text()
+    assert "4111111111111111" not in text
+    assert "12/29" not in text
+    records = [record['data'] for record in read_capture(str(path))]
+    assert records == ["INFORM_Res 7 Jane_Doe **** **/** 12_Main_St", "BID 8 lamp 12.5"]
@@ -0,0 +1,40 @@
+import socket
+
+import pytest
+
+from utils.connection_pool import ConnectionPool, PoolFullError
+
+
+@pytest.fixture
+def pairs():
+    opened = []
+
+    def pair():
+        server_side, client_side = socket.socketpair()
+        opened.extend((server_side, client_side))
+        return server_side, client_side
+
+    yield pair
+    for sock in opened:
+        sock.close()
+
+
+def test_full_pool_refuses_when_no_channel_is_idle(pairs):
+    pool = ConnectionPool(max_connections=1, idle_timeout=60)
+    pool.attach('alice', ('127.0.0.1', 1), pairs()[0])
+    with pytest.raises(PoolFullError):
+        pool.attach('bob', ('127.0.0.1', 2), pairs()[0])
+    assert 'alice' in pool
+    pool.close_all()
+
+
+def test_full_pool_closes_an_idle_channel_with_a_notice(pairs):
+    pool = ConnectionPool(max_connections=1, idle_timeout=0, idle_notice="CHANNEL_CLOSED - Idle")
+    server_side, client_side = pairs()
+    pool.attach('alice', ('127.0.0.1', 1), server_side)
+    pool.attach('bob', ('127.0.0.1', 2), pairs()[0])
+    assert 'bob' in pool and 'alice' not in pool
+    assert pool.evicted == 1
+    client_side.settimeout(2)
+    assert client_side.recv(1024) == b"CHANNEL_CLOSED - Idle\n"
+    pool.close_all()
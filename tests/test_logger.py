@@ -0,0 +1,23 @@
+import logging
+
+from utils.logger import RateLimitFilter
+
+
+class ExplodingArg:
+    def __str__(self):
+        raise AssertionError("the filter formatted the message")
+
+
+def make_record(level, msg, *args):
+    return logging.LogRecord("auction.server", level, __file__, 1, msg, args, None)
+
+
+def test_filter_keys_on_the_template_without_formatting():
+    limit = RateLimitFilter(interval=60, burst=2)
+    passed = [limit.filter(make_record(logging.INFO, "Shed request from %s", ExplodingArg())) for _ in range(4)]
+    assert passed == [True, True, False, False]
+
+
+def test_warnings_always_pass():
+    limit = RateLimitFilter(interval=60, burst=1)
+    assert all(limit.filter(make_record(logging.WARNING, "Rejected message from %s", n)) for n in range(5))
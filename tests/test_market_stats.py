@@ -0,0 +1,16 @@
+from utils.market_stats import MARKET, MarketStats
+
+
+def test_rebuild_from_items_without_seller_name():
+    items = {
+        1: {'name': 'teddy', 'current_price': 30.0, 'active': True, 'bids': []},
+        2: {'name': 'kite', 'current_price': 25.0, 'active': False, 'bids': [['zahed', 25.0]],
+            'highest_bidder': 'zahed', 'seller_name': 'james'},
+    }
+    stats = MarketStats()
+    stats.rebuild(items)
+    assert stats.summary()[:4] == (1, 2, 1, 0)
+    assert stats.summary('james')[:4] == (0, 1, 1, 0)
+    # The item without a seller is not filed under the market's own key
+    assert set(stats.sellers) == {'james'}
+    assert stats.to_dict()[MARKET]['listed'] == 2
@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from udp_server import DEFERRED_TTL, MAX_DEFERRED, AuctionServer
+from utils.clock import VirtualClock
+
+# An item as the original server saved it, before sellers were recorded by name
+LEGACY_ITEM = {
+    'name': 'teddy_bear', 'description': "it's_a_bear", 'start_price': 30.0, 'current_price': 30.0,
+    'duration': 48, 'seller_address': ['127.0.0.1', 6275], 'start_time': '2099-04-09T17:09:55.804345',
+    'end_time': '2099-04-11T17:09:55.804347', 'active': True, 'bids': [], 'highest_bidder': None,
+}
+
+
+@pytest.fixture
+def start_server(tmp_path):
+    servers = []
+
+    def start(state=None, **options):
+        data_file = tmp_path / "server_data.json"
+        if state is not None:
+            data_file.write_text(json.dumps(state))
+        server = AuctionServer(host="127.0.0.1", udp_port=0, tcp_port=0, data_file=str(data_file), **options)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.udp_socket.close()
+        server.tcp_socket.close()
+
+
+def test_loads_items_without_seller_name(start_server):
+    server = start_server({'users': {}, 'subscriptions': {}, 'items': {'1': LEGACY_ITEM}})
+    assert server.item_ids_by_name == {'teddy_bear': 1}
+    assert 1 in server.browse
+    assert server.items[1]['seller_name'] == ''
+
+
+def test_closing_an_auction_forgets_its_change_log(start_server):
+    server = start_server(clock=VirtualClock())
+    seller = ('127.0.0.1', 6001)
+    server.handle_datagram(b"REGISTER 1 sel seller 127.0.0.1 6001 6002", seller)
+    assert server.handle_datagram(b"LIST_ITEM 2 lamp old_lamp 10 5 sel", seller).startswith("ITEM_LISTED")
+    item_id = server.item_ids_by_name['lamp']
+    server.bump_version(item_id, "BID 11 bob")
+    assert server.changes.since(item_id, 0, 1) == ["1 BID 11 bob"]
+
+    server.close_auction(item_id)
+    assert server.changes.since(item_id, 0, 2) is None
+    reply = server.handle_datagram(b"RESYNC 3 lamp 1", seller)
+    assert reply.splitlines()[1].endswith(" closed")
+
+
+@pytest.mark.parametrize("batch, commands", [
+    (b"BATCH 1\nBID 2 lamp 11", 1),
+    (b"BATCH 1\nBID 2 lamp 11\nBID 3 lamp 12\nBID 4 lamp 13", 3),
+    (b"BATCH 1\nBID 2 lamp 11\nBID 3 lamp 12\n", 2),
+])
+def test_batch_costs_one_token_per_command(start_server, batch, commands):
+    server = start_server()
+    address = ('127.0.0.1', 6001)
+    assert server.admit(batch, address) is None
+    server.admission.release()
+    bucket = server.admission.addresses._buckets[address]
+    assert server.admission.addresses.burst - bucket.tokens == pytest.approx(commands, abs=0.01)
+
+
+def test_deferred_messages_are_capped_and_expire(start_server):
+    server = start_server()
+    retry = server.send_no_offer_message
+    for item_id in range(MAX_DEFERRED + 5):
+        assert server.channel_for('sel', retry, item_id) is None
+    waiting = server.deferred['sel']
+    assert len(waiting) == MAX_DEFERRED
+    assert waiting[0][2] == (5,)
+
+    with server.deferred_lock:
+        server.expire_deferred(waiting[-1][0] + DEFERRED_TTL)
+    assert 'sel' not in server.deferred
@@ -0,0 +1,8 @@
+from utils.snapshot import SnapshotStore
+
+
+def test_snapshot_of_item_without_seller_name():
+    item = {'name': 'teddy', 'description': 'bear', 'current_price': 2.0, 'active': True, 'bids': []}
+    view = SnapshotStore({2: item}).current().get(2)
+    assert view.seller_name == ''
+    assert view.name == 'teddy'
@@ -4,32 +4,63 @@ import time
 import threading
 import sys
 
+from utils.auction_cache import AuctionCache
+from utils.cluster import HashRing, parse_nodes
+from utils.multicast import MulticastReceiver, parse_group
+from utils.parser import encode_message
+from utils.sessions import HEARTBEAT_INTERVAL
+from utils.transport import RECV_BUFFER_SIZE, Fragmenter, Reassembler, is_fragment
+from utils.versions import VersionTracker
+
+# Unsolicited messages: whichever thread reads one hands it to handle_push()
+PUSHES = ("BID_UPDATE", "RESYNC_RESULT", "HEARTBEAT_ACK", "SESSION_EXPIRED")
+# Stands in for a batched command the BATCH_RESULT has no line for
+MISSING_REPLY = "NO_REPLY - missing from the batch result"
+# Seconds to wait before each attempt to reopen a push channel that dropped
+RECONNECT_DELAYS = (1, 2, 5, 10, 30)
+
 class UDPClient:
-    def __init__(self, server_host='localhost', server_port=5000, server_tcp_port=5001):
+    def __init__(self, server_host='localhost', server_port=5000, server_tcp_port=5001, cluster=None):
         # Remove the nested __init__ function
-        self.server_address = (server_host, server_port)
-        self.server_tcp_address = (server_host, server_tcp_port)
+        # Resolved up front so replies can be matched to the node that sent them
+        self.server_address = (socket.gethostbyname(server_host), server_port)
+        self.server_tcp_address = (self.server_address[0], server_tcp_port)
+        # With a cluster, each request goes to the node(s) the ring routes it to
+        self.ring = HashRing(cluster) if cluster else None
         self.client_name = None
         self.client_udp_port = random.randint(6000, 7000)
-        self.client_tcp_port = random.randint(7001, 8000)
         self.role = None
         self.request_counter = 1
         self.is_registered = False
-        self.tcp_server_socket = None
-        self.tcp_listener_thread = None
+        # Push channels this client opened to the server(s), by TCP address
+        self.channels = {}
+        # Session token from each node that accepted our REGISTER/LOGIN, by UDP address
+        self.tokens = {}
         self.running = True
 
         self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.udp_socket.bind(('0.0.0.0', self.client_udp_port))
         self.udp_socket.settimeout(5.0)
+        # The listener thread and the menu both read the UDP socket, so each
+        # thread gets its own reusable receive buffer
+        self.recv_buffers = threading.local()
+        # Shared by both readers: the fragments of one reply may be split between them
+        self.fragmenter = Fragmenter()
+        self.reassembler = Reassembler()
 
         self.udp_listener_thread = threading.Thread(target=self.udp_listener)
         self.udp_listener_thread.daemon = True
         self.udp_listener_thread.start()
         self.payment_in_progress = False
-        # Start TCP listener immediately
-        self.start_tcp_listener()
-        print(f"Client initialized with UDP port: {self.client_udp_port}, TCP port: {self.client_tcp_port}")
+        # Last version seen of each subscribed item, whichever way updates
+        # arrive; a jump in versions triggers a RESYNC over unicast
+        self.versions = VersionTracker(self.resync)
+        # Groups of hot items this client subscribed to
+        self.multicast = MulticastReceiver(self.show_group_update, self.versions)
+        # Price, leader and deadline of subscribed items, kept from pushes
+        self.cache = AuctionCache()
+        threading.Thread(target=self.heartbeat_loop, daemon=True).start()
+        print(f"Client initialized with UDP port: {self.client_udp_port}")
 
     def udp_listener(self):
         """Listen for incoming UDP messages"""
@@ -37,17 +68,9 @@ class UDPClient:
 
         while self.running:
             try:
-                data, server = self.udp_socket.recvfrom(1024)
-                message = data.decode('utf-8')
+                message = self.receive_from()[0]
                 print(f"\nReceived from server: {message}")
-
-                # Handle different types of messages
-                '''if message.startswith("AUCTION_ANNOUNCE"):
-                    self.handle_auction_announcement(message)
-                elif message.startswith("BID_UPDATE"):
-                    self.handle_bid_update(message)
-                elif message.startswith("PRICE_ADJUSTMENT"):
-                    self.handle_price_adjustment(message)'''
+                self.handle_push(message)
 
             except socket.timeout:
                 # This is just to allow checking if we're still running
@@ -58,83 +81,178 @@ class UDPClient:
 
         print("UDP listener stopped")
 
-    def start_tcp_listener(self):
-        """Start TCP listener socket for auction closures"""
-        # Prevent double initialization
-        if self.tcp_listener_thread is not None and self.tcp_listener_thread.is_alive():
-            print("TCP listener already running.")
-            return
+    def handle_push(self, message):
+        """Apply pushes and RESYNC replies to the item versions and the auction cache.
 
-        try:
-            # Close previous socket if it exists
-            if self.tcp_server_socket:
+        Batched pushes arrive newline-joined in one datagram; a
+        RESYNC_RESULT is a header followed by its change lines.
+        """
+        if message.startswith("SESSION_EXPIRED"):
+            # Nothing more to keep alive; the server now treats us as offline
+            self.tokens.clear()
+            print("Session expired. Log in again to keep bidding and to receive closure messages.")
+            return
+        if message.startswith("RESYNC_RESULT"):
+            header, *lines = message.split("\n")
+            parts = header.split()
+            self.versions.resynced(parts[2], int(parts[3]))
+            self.cache.apply_resync(parts[2], lines)
+            return
+        for line in message.split("\n"):
+            parts = line.split()
+            command = parts[0] if parts else None
+            if command == "AUCTION_ANNOUNCE" and len(parts) >= 7:
+                self.versions.resynced(parts[2], int(parts[6]))
+                self.cache.announce(parts[2], float(parts[4]), int(parts[5]), int(parts[6]))
+                if len(parts) == 8:
+                    self.multicast.join(parts[2], parse_group(parts[7]))
+                    print(f"Joined multicast group {parts[7]} for '{parts[2]}'")
+            elif command == "BID_UPDATE" and len(parts) == 7:
+                if self.versions.accept(parts[2], int(parts[6])):
+                    self.cache.update(parts[2], float(parts[3]), parts[4], int(parts[6]), int(parts[5]))
+
+    def show_group_update(self, item_name, message):
+        _, req_num, item_name, bid_amount, bidder_name, time_left, version = message.split()
+        self.cache.update(item_name, float(bid_amount), bidder_name, int(version), int(time_left))
+        print(f"\nNew bid on '{item_name}': ${bid_amount} by {bidder_name}, {time_left}s left")
+
+    def heartbeat_loop(self):
+        """Tell every node we are still here, so our sessions outlive idle spells"""
+        while self.running:
+            time.sleep(HEARTBEAT_INTERVAL)
+            for node, token in list(self.tokens.items()):
+                req_num = self.request_counter
+                self.request_counter += 1
                 try:
-                    self.tcp_server_socket.close()
-                except:
+                    self.send(encode_message("HEARTBEAT", req_num, token), node)
+                except OSError:
                     pass
 
-            self.tcp_server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            # Use 0.0.0.0 to listen on all interfaces
-            self.tcp_server_socket.bind(('0.0.0.0', self.client_tcp_port))
-            self.tcp_server_socket.listen(5)
-
-            # Get the actual port (important if we used port 0)
-            actual_port = self.tcp_server_socket.getsockname()[1]
-            self.client_tcp_port = actual_port  # Update with the actual bound port
-
-            print(f"TCP listener started on port {self.client_tcp_port}")
-        except OSError as e:
-            print(f"Port {self.client_tcp_port} is in use. Trying a different port.")
-            self.client_tcp_port = random.randint(7001, 8000)
-            print(f"New TCP port: {self.client_tcp_port}")
-            # Try again with new port
-            self.start_tcp_listener()
-            return
-
-        # Start listener thread
-        self.tcp_listener_thread = threading.Thread(target=self.tcp_listener)
-        self.tcp_listener_thread.daemon = True
-        self.tcp_listener_thread.start()
-        print(f"TCP listener thread started and listening on port {self.client_tcp_port}")
-
-    def tcp_listener(self):
-        """Listen for incoming TCP connections from the server"""
-        self.tcp_server_socket.settimeout(None)  # Set timeout for checking if client is still running
-
-        while self.running:
-            try:
-                client_socket, address = self.tcp_server_socket.accept()
-                print(f"Received TCP connection from {address}")
+    def resync(self, item_name, version):
+        """Ask for the changes to an item since version after missing updates; the reply comes by unicast"""
+        req_num = self.request_counter
+        self.request_counter += 1
+        print(f"\nMissed updates for '{item_name}' after version {version}, resyncing")
+        self.send(encode_message("RESYNC", req_num, item_name, version))
 
-                # Handle the TCP connection in a separate thread
-                tcp_handler = threading.Thread(target=self.handle_tcp_connection, args=(client_socket,))
-                tcp_handler.daemon = True
-                tcp_handler.start()
+    def receive(self):
+        """Receive one message into this thread's reusable buffer and decode it.
 
-            except socket.timeout:
-                # This is just to allow checking if we're still running
+        Fragmented messages are reassembled first; this blocks (up to the
+        socket timeout per datagram) until a whole message is available.
+        Pushes that arrive while a menu waits for its reply are applied and
+        skipped, so they are not mistaken for the reply.
+        """
+        while True:
+            message = self.receive_from()[0]
+            if not message.startswith(PUSHES):
+                return message
+            print(f"\nReceived from server: {message}")
+            self.handle_push(message)
+
+    def receive_from(self):
+        """Like receive(), but also return the address of the node that sent the message"""
+        buffers = self.recv_buffers
+        if not hasattr(buffers, "view"):
+            buffers.buffer = bytearray(RECV_BUFFER_SIZE)
+            buffers.view = memoryview(buffers.buffer)
+        while True:
+            size, server = self.udp_socket.recvfrom_into(buffers.buffer)
+            if not is_fragment(buffers.buffer, size):
+                return str(buffers.view[:size], 'utf-8'), server
+            payload = self.reassembler.add(buffers.view[:size].tobytes(), server)
+            if payload is not None:
+                return payload.decode('utf-8'), server
+
+    def send(self, message, address=None):
+        """Send a request to the server, fragmenting it if it does not fit in one datagram.
+
+        In cluster mode the request goes to every node the ring routes it
+        to; returns the number of nodes it was sent to (one reply each).
+        """
+        if address is not None:
+            addresses = [address]
+        elif self.ring is not None:
+            addresses = self.ring.route(message)
+        else:
+            addresses = [self.server_address]
+        datagrams = self.fragmenter.split(message.encode('utf-8'))
+        for address in addresses:
+            for datagram in datagrams:
+                self.udp_socket.sendto(datagram, address)
+        return len(addresses)
+
+    def receive_replies(self, count, success):
+        """Collect one reply per node; return the first that does not start with success
+        (else the first), along with every (reply, node) pair"""
+        replies = [self.receive_from() for _ in range(count)]
+        reply = next((reply for reply, _ in replies if not reply.startswith(success)), replies[0][0])
+        return reply, replies
+
+    def channel_address(self, node):
+        """TCP address of the push channel for the node at UDP address node"""
+        if self.ring is None:
+            return self.server_tcp_address
+        # Cluster nodes listen for TCP one port above their UDP port
+        return node[0], node[1] + 1
+
+    def open_channels(self, replies):
+        """Keep the session token of every node that accepted this REGISTER/LOGIN and open a push channel to it"""
+        for reply, node in replies:
+            fields = dict(part.split("=", 1) for part in reply.split()[2:] if "=" in part)
+            token = fields.get("token")
+            if token is None:
+                print(f"Server at {node} gave no push channel token; closure messages will not arrive")
                 continue
-            except Exception as e:
-                if self.running:
-                    print(f"Error accepting TCP connection: {e}")
+            self.tokens[node] = token
+            self.open_channel(token, self.channel_address(node))
+
+    def open_channel(self, token, address):
+        """Connect to the server's TCP port and authenticate with token.
 
-        print("TCP listener stopped")
+        The server pushes closure messages (and bid updates) over this one
+        connection, so the client needs no listening port of its own.
+        """
+        old = self.channels.pop(address, None)
+        if old is not None:
+            old.close()
 
-    def handle_tcp_connection(self, conn):
-        """Handle incoming TCP connection"""
+        req_num = self.request_counter
+        self.request_counter += 1
         try:
-            # Set a reasonable timeout
-            #conn.settimeout()  # 60 seconds for user input
+            conn = socket.create_connection(address, timeout=5.0)
+            conn.sendall((encode_message("CONNECT", req_num, self.client_name, token, "tcp") + "\n").encode('utf-8'))
+            lines = self.read_lines(conn)
+            reply = next(lines, "")
+        except OSError as e:
+            print(f"Could not open push channel to {address[0]}:{address[1]}: {e}")
+            return False
+        if not reply.startswith("CONNECTED"):
+            print(f"Push channel refused: {reply}")
+            conn.close()
+            return False
 
-            # Instead of reading once, loop to read multiple messages
-            while True:
-                data = conn.recv(1024).decode('utf-8')
+        conn.settimeout(None)
+        self.channels[address] = conn
+        # The same line reader continues, so nothing the server sent right
+        # after CONNECTED is lost
+        handler = threading.Thread(target=self.handle_tcp_connection, args=(conn, lines, token, address))
+        handler.daemon = True
+        handler.start()
+        print(f"Push channel open to {address[0]}:{address[1]}")
+        return True
+
+    def handle_tcp_connection(self, conn, lines=None, token=None, address=None):
+        """Handle messages the server pushes over this client's channel.
+
+        If the channel drops while it is still this client's channel for
+        address (not closed by logout or replaced), it is reopened with token.
+        """
+        try:
+            # The server keeps this connection open and sends one message per line
+            for data in lines if lines is not None else self.read_lines(conn):
                 print(f"\nReceived TCP message: {data}")
 
-                if not data:
-                    print("Connection closed by server")
-                    break
-
                 parts = data.strip().split()
                 if not parts:
                     print("No valid message parts")
@@ -175,8 +293,8 @@ class UDPClient:
                         cc_exp = input("Enter credit card expiry (MM/YY): ")
                         address = input("Enter your shipping address: ")
 
-                        inform_response = f"INFORM_Res {req_num} {name} {cc_num} {cc_exp} {address}"
-                        conn.sendall(inform_response.encode('utf-8'))
+                        inform_response = encode_message("INFORM_Res", req_num, name, cc_num, cc_exp, address)
+                        conn.sendall((inform_response + "\n").encode('utf-8'))
                         print("Sent payment and address info to server.")
                         print("Waiting for confirmation...")
                     except Exception as e:
@@ -187,13 +305,28 @@ class UDPClient:
                     buyer_name = parts[2]
                     buyer_address = " ".join(parts[3:])
                     print(f"\nShip item to {buyer_name} at address: {buyer_address}")
-                    # This is the end of the conversation for the seller
-                    break
 
                 elif message_type == "CANCEL":
                     reason = " ".join(parts[2:])
                     print(f"\nTransaction cancelled: {reason}")
-                    break
+
+                elif message_type == "NON_OFFER":
+                    print(f"\nYour auction for '{parts[2]}' ended with no bids.")
+
+                elif message_type == "CHANNEL_CLOSED":
+                    # Closed on purpose to make room; reconnecting would push out someone else
+                    if self.channels.get(address) is conn:
+                        del self.channels[address]
+                    print(f"\nThe server closed the push channel ({' '.join(parts[2:])}). "
+                          "Log in again to reopen it.")
+
+                elif message_type == "BID_UPDATE":
+                    _, req_num, item_name, bid_amount, bidder_name, time_left = parts[:6]
+                    print(f"\nNew bid on '{item_name}': ${bid_amount} by {bidder_name}, {time_left}s left")
+                    self.handle_push(data)
+
+                elif message_type == "AUCTION_ANNOUNCE":
+                    self.handle_push(data)
 
                 else:
                     print(f"Unknown TCP message type: {message_type}")
@@ -209,9 +342,38 @@ class UDPClient:
         finally:
             try:
                 conn.close()
-                print("TCP connection closed")
+                print("Push channel closed")
             except:
                 pass
+            if address is not None and self.channels.get(address) is conn:
+                self.reconnect(token, address)
+
+    def reconnect(self, token, address):
+        """Reopen the push channel to address after it dropped, backing off between attempts"""
+        del self.channels[address]
+        for delay in RECONNECT_DELAYS:
+            time.sleep(delay)
+            if not self.running or address in self.channels or token not in self.tokens.values():
+                # Stopped, reopened by a new login, or logged out
+                return
+            print(f"Reopening push channel to {address[0]}:{address[1]}")
+            if self.open_channel(token, address):
+                return
+        print("Could not reopen the push channel; log in again to reopen it")
+
+    @staticmethod
+    def read_lines(conn):
+        """Yield newline-framed messages from a TCP connection until the server closes it"""
+        pending = ""
+        while True:
+            data = conn.recv(1024).decode('utf-8')
+            if not data:
+                print("Connection closed by server")
+                return
+            *lines, pending = (pending + data).split("\n")
+            for line in lines:
+                if line.strip():
+                    yield line
 
     def prompt_user_details(self):
         """Prompt user for name and role"""
@@ -231,28 +393,27 @@ class UDPClient:
         if not self.client_name or not self.role:
             self.prompt_user_details()
 
-        # Ensure TCP listener is running with correct port before registration
-        self.start_tcp_listener()
-
         req_num = self.request_counter
         self.request_counter += 1
 
         # Get the actual machine hostname and IP for better connectivity
         local_ip = socket.gethostbyname(socket.gethostname())
 
-        message = f"REGISTER {req_num} {self.client_name} {self.role} {local_ip} {self.client_udp_port} {self.client_tcp_port}"
+        # The TCP port field is kept for the wire format; the client opens its
+        # push channel to the server instead of listening itself
+        message = encode_message("REGISTER", req_num, self.client_name, self.role, local_ip,
+                                 self.client_udp_port, 0)
 
         print(f"Sending: {message}")
-        self.udp_socket.sendto(message.encode('utf-8'), self.server_address)
+        sent = self.send(message)
 
         try:
-            data, server = self.udp_socket.recvfrom(1024)
-            response = data.decode('utf-8')
+            response, replies = self.receive_replies(sent, "REGISTERED")
             print(f"Received: {response}")
             if response.startswith("REGISTERED"):
                 self.is_registered = True
-                # TCP listener should already be running from init
-                print(f"Registration successful. TCP listener is active on port {self.client_tcp_port}")
+                self.open_channels(replies)
+                print("Registration successful.")
             return response
         except socket.timeout:
             print("Timeout waiting for response")
@@ -263,28 +424,23 @@ class UDPClient:
         print("\n--- User Login ---")
         self.client_name = input("Enter your username: ")
 
-        # Ensure TCP listener is running before login
-        if not self.tcp_listener_thread or not self.tcp_listener_thread.is_alive():
-            self.start_tcp_listener()
-
         req_num = self.request_counter
         self.request_counter += 1
 
-        # Include TCP port in login message
-        message = f"LOGIN {req_num} {self.client_name} {self.client_tcp_port}"
+        message = encode_message("LOGIN", req_num, self.client_name)
 
         print(f"Sending: {message}")
-        self.udp_socket.sendto(message.encode('utf-8'), self.server_address)
+        sent = self.send(message)
 
         try:
-            data, server = self.udp_socket.recvfrom(1024)
-            response = data.decode('utf-8')
+            response, replies = self.receive_replies(sent, "LOGIN_SUCCESS")
             print(f"Received: {response}")
 
             if response.startswith("LOGIN_SUCCESS"):
                 self.is_registered = True
-                self.role = response.split("role=")[1].strip()
-                print(f"Login successful as {self.role}. TCP listener active on port {self.client_tcp_port}")
+                self.role = response.split("role=")[1].split()[0]
+                self.open_channels(replies)
+                print(f"Login successful as {self.role}.")
             else:
                 print("Login failed. User not found or invalid credentials.")
                 return False
@@ -298,18 +454,21 @@ class UDPClient:
         req_num = self.request_counter
         self.request_counter += 1
 
-        message = f"DE-REGISTER {req_num} {self.client_name}"
+        message = encode_message("DE-REGISTER", req_num, self.client_name)
 
         print(f"Sending: {message}")
-        self.udp_socket.sendto(message.encode('utf-8'), self.server_address)
+        self.send(message)
 
         print("Deregistration message sent")
+        self.tokens.clear()
         self.client_name = None
         self.role = None
         self.is_registered = False
 
     def logout(self):
         """Handle logout"""
+        self.close_channels()
+        self.tokens.clear()
         self.client_name = None
         self.role = None
         self.is_registered = False
@@ -320,10 +479,22 @@ class UDPClient:
         self.running = False
         if self.udp_socket:
             self.udp_socket.close()
-        if self.tcp_server_socket:
-            self.tcp_server_socket.close()
+        self.close_channels()
+        self.multicast.close()
         print("Client stopped")
 
+    def close_channels(self):
+        # Emptied first, so the channels' readers know not to reconnect
+        channels = list(self.channels.values())
+        self.channels.clear()
+        for conn in channels:
+            try:
+                # shutdown() wakes the reader thread blocked in recv()
+                conn.shutdown(socket.SHUT_RDWR)
+                conn.close()
+            except OSError:
+                pass
+
     def bid_item(self):
         """Handle item bidding"""
         if self.role != "buyer":
@@ -334,23 +505,93 @@ class UDPClient:
         item_name = input("Enter item name to bid on: ")
         bid_amount = input("Enter bid amount: ")
 
+        try:
+            reason = self.cache.check_bid(item_name, float(bid_amount))
+        except ValueError:
+            # Not a number; the server's reply explains
+            reason = None
+        if reason is not None:
+            entry = self.cache.items[item_name]
+            print(f"Bid rejected locally: {reason} (current price ${entry.price}, {entry.time_left()}s left)")
+            return None
+
         req_num = self.request_counter
         self.request_counter += 1
 
-        message = f"BID {req_num} {item_name} {bid_amount}"
+        message = encode_message("BID", req_num, item_name, bid_amount)
         print(f"Sending Bid: {message}")
-        self.udp_socket.sendto(message.encode('utf-8'), self.server_address)
+        self.send(message)
 
         try:
-            data, server = self.udp_socket.recvfrom(1024)
-            response = data.decode('utf-8')
+            response = self.receive()
             print(f"Received: {response}")
 
             if response.startswith("BID_ACCEPTED"):
                 print(f"Bid of ${bid_amount} accepted for {item_name}")
+                parts = response.split()
+                if len(parts) > 2:
+                    # Our own bid is a version of the item we will get no update for
+                    self.versions.accept(item_name, int(parts[2]))
+                    self.cache.update(item_name, float(bid_amount), self.client_name, int(parts[2]))
             elif response.startswith("BID_REJECTED"):
                 reason = response.split(" ", 2)[2]
                 print(f"Bid rejected: {reason}")
+                if item_name in self.cache.items:
+                    self.cache.bid_rejected(reason)
+            elif response.startswith("BUSY"):
+                print(f"Server busy, try again shortly: {' '.join(response.split()[2:])}")
+            return response
+
+        except socket.timeout:
+            print("Timeout waiting for response")
+            return None
+
+    def proxy_bid(self):
+        """Let the server bid on an item for us, one increment at a time, up to a maximum"""
+        if self.role != "buyer":
+            print("Only buyers can bid on items.")
+            return
+
+        print("\n--- Proxy Bid ---")
+        item_name = input("Enter item name to bid on: ")
+        max_amount = input("Enter the most you will pay: ")
+
+        try:
+            # A maximum the price has already passed can never win either
+            reason = self.cache.check_bid(item_name, float(max_amount))
+        except ValueError:
+            reason = None
+        if reason is not None:
+            entry = self.cache.items[item_name]
+            print(f"Proxy bid rejected locally: {reason} (current price ${entry.price}, {entry.time_left()}s left)")
+            return None
+
+        req_num = self.request_counter
+        self.request_counter += 1
+
+        message = encode_message("PROXY_BID", req_num, item_name, max_amount)
+        print(f"Sending Proxy Bid: {message}")
+        self.send(message)
+
+        try:
+            response = self.receive()
+            print(f"Received: {response}")
+
+            if response.startswith("PROXY_ACCEPTED"):
+                _, _, price, leader, version = response.split()
+                if leader == self.client_name:
+                    print(f"You lead {item_name} at ${price}; the server will bid up to ${max_amount} for you")
+                else:
+                    print(f"{leader} still leads {item_name} at ${price}: their maximum is at least yours")
+                if self.versions.accept(item_name, int(version)):
+                    self.cache.update(item_name, float(price), leader, int(version))
+            elif response.startswith("BID_REJECTED"):
+                reason = response.split(" ", 2)[2]
+                print(f"Proxy bid rejected: {reason}")
+                if item_name in self.cache.items:
+                    self.cache.bid_rejected(reason)
+            elif response.startswith("BUSY"):
+                print(f"Server busy, try again shortly: {' '.join(response.split()[2:])}")
             return response
 
         except socket.timeout:
@@ -382,22 +623,24 @@ class UDPClient:
         item_name_safe = item_name.replace(' ', "_")
         item_description_safe = item_description.replace(" ", "_")
 
-        message = f"LIST_ITEM {req_num} {item_name_safe} {item_description_safe} {start_price} {duration} {self.client_name}"
+        message = encode_message("LIST_ITEM", req_num, item_name_safe, item_description_safe,
+                                 start_price, duration, self.client_name)
 
         print(f"Sending: {message}")
-        self.udp_socket.sendto(message.encode('utf-8'), self.server_address)
+        self.send(message)
 
         self.udp_socket.settimeout(5.0)
 
         try:
-            data, server = self.udp_socket.recvfrom(1024)
-            response = data.decode('utf-8')
+            response = self.receive()
             print(f"Received: {response}")
 
             if response.startswith("ITEM_LISTED"):
                 print("Item listed for auction")
-            elif response.startswith("LIST-DENIED"):
+            elif response.startswith("LIST_DENIED") or response.startswith("LIST-DENIED"):
                 print(f"Item listing denied: {' '.join(response.split()[2:])}")
+            elif response.startswith("BUSY"):
+                print(f"Server busy, try again shortly: {' '.join(response.split()[2:])}")
 
             return response
 
@@ -407,6 +650,162 @@ class UDPClient:
         finally:
             self.udp_socket.settimeout(5.0)
 
+    def send_batch(self, messages):
+        """Send several requests in one BATCH datagram and return the replies in order.
+
+        In cluster mode the requests are grouped into one batch per owning node.
+        A command the result has no line for gets MISSING_REPLY.
+        """
+        groups = {}
+        for position, message in enumerate(messages):
+            address = self.ring.route(message)[0] if self.ring is not None else self.server_address
+            groups.setdefault(address, []).append(position)
+
+        pending = {}
+        for address, positions in groups.items():
+            req_num = str(self.request_counter)
+            self.request_counter += 1
+            pending[req_num] = positions
+            envelope = "\n".join([encode_message("BATCH", req_num), *(messages[i] for i in positions)])
+            print(f"Sending batch {req_num} of {len(positions)} requests")
+            self.send(envelope, address)
+
+        replies = [None] * len(messages)
+        try:
+            # Pushes for items in the batch may arrive before the result
+            while pending:
+                response = self.receive()
+                if response.startswith("BUSY"):
+                    print(f"Server busy, try again shortly: {' '.join(response.split()[2:])}")
+                    return None
+                if not response.startswith("BATCH_RESULT"):
+                    print(f"Received: {response}")
+                    continue
+                header, *lines = response.split("\n")
+                for position, line in zip(pending.pop(header.split()[1], ()), lines):
+                    replies[position] = line
+        except socket.timeout:
+            print("Timeout waiting for response")
+            return None
+        return [MISSING_REPLY if reply is None else reply for reply in replies]
+
+    def bulk_list_items(self):
+        """List every item in a file with one BATCH request"""
+        if self.role != "seller":
+            print("Only sellers can auction items.")
+            return
+
+        print("\n--- Bulk Create Auctions ---")
+        path = input("File with one item per line (name,description,price,duration): ")
+        messages = []
+        try:
+            with open(path, 'r') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        item_name, item_description, start_price, duration = [p.strip() for p in line.split(",")]
+                        float(start_price)
+                        int(duration)
+                    except ValueError:
+                        print(f"Skipping invalid line: {line.strip()}")
+                        continue
+                    req_num = self.request_counter
+                    self.request_counter += 1
+                    messages.append(encode_message("LIST_ITEM", req_num, item_name.replace(' ', "_"),
+                                                   item_description.replace(" ", "_"), start_price,
+                                                   duration, self.client_name))
+        except OSError as e:
+            print(f"Could not read {path}: {e}")
+            return
+
+        if not messages:
+            print("No items to list")
+            return
+
+        replies = self.send_batch(messages)
+        if replies is None:
+            return
+        listed = sum(1 for reply in replies if reply.startswith("ITEM_LISTED"))
+        print(f"{listed} of {len(messages)} items listed")
+        for reply in replies:
+            if not reply.startswith("ITEM_LISTED"):
+                print(f"  {reply}")
+        return replies
+
+    def browse(self):
+        """Page through active auctions, or search them by name prefix or seller"""
+        print("\n--- Browse Auctions ---")
+        print("1. Ending soonest")
+        print("2. Lowest price")
+        print("3. By seller")
+        print("4. Search by item name prefix")
+        print("5. Search by seller name")
+        print("6. Search descriptions")
+        choice = input("Enter your choice (1-6): ")
+
+        if choice in ("1", "2", "3"):
+            command = ("LIST_ACTIVE", {"1": "ending", "2": "price", "3": "seller"}[choice])
+        elif choice == "4":
+            command = ("SEARCH", "name", input("Item name starts with: ").replace(' ', "_"))
+        elif choice == "5":
+            command = ("SEARCH", "seller", input("Seller name: "))
+        elif choice == "6":
+            # Ranked top matches come back as a single page
+            command = ("SEARCH_TEXT", 10, input("Search words: "))
+        else:
+            print("Invalid choice.")
+            return
+
+        # Each node pages through its own items, so keep one cursor per node
+        nodes = self.ring.nodes if self.ring is not None else [self.server_address]
+        cursors = dict.fromkeys(nodes)
+        while cursors:
+            req_num = self.request_counter
+            self.request_counter += 1
+            for address, cursor in cursors.items():
+                if command[0] == "SEARCH_TEXT":
+                    self.send(encode_message(*command[:1], req_num, *command[1:]), address)
+                else:
+                    self.send(encode_message(command[0], req_num, *command[1:], 10, cursor), address)
+
+            rows = []
+            try:
+                for _ in range(len(cursors)):
+                    # Skip pushes that arrive while waiting for the page
+                    response, address = self.receive_from()
+                    while not response.startswith("SEARCH_"):
+                        print(f"Received: {response}")
+                        response, address = self.receive_from()
+
+                    header, *page = response.split("\n")
+                    if header.startswith("SEARCH_DENIED"):
+                        print(f"Search denied: {' '.join(header.split()[2:])}")
+                        return
+                    rows.extend(row.split() for row in page)
+                    if header.split()[2] == "-":
+                        cursors.pop(address, None)
+                    else:
+                        cursors[address] = header.split()[2]
+            except socket.timeout:
+                print("Timeout waiting for response")
+                return
+
+            if len(nodes) > 1 and command[0] == "LIST_ACTIVE":
+                # Merge the nodes' pages back into the requested order
+                order = {"ending": lambda row: int(row[2]), "price": lambda row: float(row[1]),
+                         "seller": lambda row: (row[3], int(row[2]))}[command[1]]
+                rows.sort(key=order)
+            if not rows:
+                print("No active auctions found")
+            for item_name, price, time_left, seller in rows:
+                print(f"{item_name:20s} ${price:>10s}  {int(time_left) // 60:4d} min left  seller: {seller}")
+
+            if command[0] == "SEARCH_TEXT" or not cursors:
+                return
+            if input("Press Enter for more, or q to stop: ").lower() == "q":
+                return
+
     def subscribe(self):
         """Handle subscribe item"""
         if self.role != "buyer":
@@ -421,26 +820,25 @@ class UDPClient:
 
         item_name_safe = item_name.replace(' ', "_")
 
-        message = f"SUBSCRIBE {req_num} {item_name_safe} {self.client_name}"
+        message = encode_message("SUBSCRIBE", req_num, item_name_safe, self.client_name)
 
         print(f"Sending: {message}")
-        self.udp_socket.sendto(message.encode('utf-8'), self.server_address)
+        self.send(message)
 
         self.udp_socket.settimeout(5.0)
 
         try:
-            data, server = self.udp_socket.recvfrom(1024)
-            response = data.decode('utf-8')
+            response = self.receive()
             print(f"Received: {response}")
 
-            if response.startswith("SUSBSCRIBED"):
+            if response.startswith("SUBSCRIBED"):
                 print("Subscribed to auction announcements")
                 # Wait for auction announcement
                 try:
-                    data, server = self.udp_socket.recvfrom(1024)
-                    response = data.decode('utf-8')
+                    response = self.receive()
                     print(f"Received: {response}")
-                    if response.startswith("AUCTION_ANNOUNCED"):
+                    if response.startswith("AUCTION_ANNOUNCE"):
+                        self.handle_push(response)
                         parts = response.split()
                         req_num = parts[1]
                         item_name = parts[2]
@@ -451,12 +849,13 @@ class UDPClient:
                         print(f"Item Name: {item_name}")
                         print(f"Description: {description}")
                         print(f"Current Price: ${current_price}")
-                        print(f"Time Left: {time_left} minutes")
+                        print(f"Time Left: {time_left} seconds")
                 except socket.timeout:
                     print("No auction announcement received")
 
-            elif response.startswith("AUCTION_ANNOUNCED"):
+            elif response.startswith("AUCTION_ANNOUNCE"):
                 print("Auction announcement received")
+                self.handle_push(response)
                 parts = response.split()
                 req_num = parts[1]
                 item_name = parts[2]
@@ -467,11 +866,10 @@ class UDPClient:
                 print(f"Item Name: {item_name}")
                 print(f"Description: {description}")
                 print(f"Current Price: ${current_price}")
-                print(f"Time Left: {time_left} minutes")
+                print(f"Time Left: {time_left} seconds")
                 # Wait for subscription confirmation
                 try:
-                    data, server = self.udp_socket.recvfrom(1024)
-                    response = data.decode('utf-8')
+                    response = self.receive()
                     print(f"Received: {response}")
                     if response.startswith("SUBSCRIBED"):
                         print("Subscribed to auction announcements")
@@ -497,10 +895,53 @@ class UDPClient:
 
         item_name_safe = item_name.replace(' ', "_")
 
-        message = f"DE-SUBSCRIBE {req_num} {item_name_safe} {self.client_name}"
+        message = encode_message("DE-SUBSCRIBE", req_num, item_name_safe, self.client_name)
 
         print(f"Sending: {message}")
-        self.udp_socket.sendto(message.encode('utf-8'), self.server_address)
+        self.send(message)
+        self.multicast.leave(item_name_safe)
+        self.versions.forget(item_name_safe)
+        self.cache.forget(item_name_safe)
+
+    def show_cache(self):
+        """Print the cached state of subscribed auctions, without asking the server"""
+        print("\n--- Cached Auctions ---")
+        for item_name, entry in sorted(self.cache.items.items()):
+            status = f"{entry.time_left()}s left" if entry.active else "closed"
+            print(f"{item_name}: ${entry.price} leader {entry.leader or '-'}, {status}, "
+                  f"version {entry.version}, updated {time.monotonic() - entry.updated:.0f}s ago")
+        stats = self.cache.stats()
+        print(f"{stats['items']} items ({stats['stale']} not updated recently), "
+              f"bid check hit rate {stats['hit_rate']:.0%}, {stats['local_rejects']} bids rejected locally, "
+              f"{stats['stale_passes']} passed on stale prices")
+
+    def market_stats(self):
+        """Ask for the running market statistics, or one seller's"""
+        print("\n--- Market Statistics ---")
+        seller_name = input("Seller name (leave blank for the whole market): ").strip()
+        req_num = self.request_counter
+        self.request_counter += 1
+        # In cluster mode every node reports on the auctions it holds
+        replies = self.send(encode_message("MARKET_STATS", req_num, seller_name or None))
+
+        try:
+            for _ in range(replies):
+                response, address = self.receive_from()
+                while not response.startswith("MARKET_STATS"):
+                    print(f"Received: {response}")
+                    response, address = self.receive_from()
+                if response.startswith("MARKET_STATS_DENIED"):
+                    print(f"Market statistics denied: {' '.join(response.split()[2:])}")
+                    continue
+                (_, _, scope, active, listed, sold, unsold, sell_through,
+                 mean_price, median_price, bids_per_minute) = response.split()
+                where = f" on {address[0]}:{address[1]}" if self.ring is not None else ""
+                print(f"{'Market' if scope == '*' else scope}{where}: {active} active of {listed} listed, "
+                      f"{sold} sold, {unsold} unsold (sell-through {float(sell_through):.0%})")
+                print(f"  Final price mean ${mean_price}, median ${median_price}; "
+                      f"{bids_per_minute} bids in the last minute")
+        except socket.timeout:
+            print("Timeout waiting for response")
 
 
 def main():
@@ -508,8 +949,9 @@ def main():
     server_host = input("Enter server IP (leave blank for localhost): ") or "localhost"
     server_port = int(input("Enter server UDP port (leave blank for 5000): ") or "5000")
     server_tcp_port = int(input("Enter server TCP port (leave blank for 5001): ") or "5001")
+    cluster = input("Enter cluster nodes as host:port,... (leave blank for a single server): ")
 
-    client = UDPClient(server_host, server_port, server_tcp_port)
+    client = UDPClient(server_host, server_port, server_tcp_port, parse_nodes(cluster) if cluster else None)
 
     try:
         while True:
@@ -544,9 +986,14 @@ def main():
                 print("4. Subscribe to auction announcements")
                 print("5. Unsubscribe from auction announcement")
                 print("6. Bid")
-                print("7. Show my TCP port")
+                print("7. Show push channel status")
+                print("8. Bulk auction items from a file")
+                print("9. Browse and search active auctions")
+                print("10. Show cached auctions")
+                print("11. Proxy bid (server bids for you up to a maximum)")
+                print("12. Market statistics")
 
-                choice = input("\nEnter your choice (1-7): ")
+                choice = input("\nEnter your choice (1-12): ")
 
                 if choice == "1":
                     client.auction_item()
@@ -563,9 +1010,20 @@ def main():
                 elif choice == "6":
                     client.bid_item()
                 elif choice == "7":
-                    print(f"Your TCP port is: {client.client_tcp_port}")
-                    print(
-                        f"TCP listener active: {client.tcp_listener_thread is not None and client.tcp_listener_thread.is_alive()}")
+                    for address in client.channels:
+                        print(f"Push channel open to {address[0]}:{address[1]}")
+                    if not client.channels:
+                        print("No push channel open; log in again to reopen it")
+                elif choice == "8":
+                    client.bulk_list_items()
+                elif choice == "9":
+                    client.browse()
+                elif choice == "10":
+                    client.show_cache()
+                elif choice == "11":
+                    client.proxy_bid()
+                elif choice == "12":
+                    client.market_stats()
                 else:
                     print("Invalid choice. Please try again.")
 
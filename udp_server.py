@@ -1,28 +1,111 @@
+import argparse
 import socket
 import json
+import math
 import os
+import secrets
 import threading
 import time
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 
+from utils.capture import CaptureWriter
+from utils.clock import SystemClock
+from utils.bid_engine import BID_INCREMENT, BidEngine, Outcome, best_bid, proxy_price
+from utils.connection_pool import ConnectionPool, PooledConnection, PoolFullError
+from utils.cluster import HashRing, node_name, normalize_node, parse_nodes
+from utils.indexes import AuctionIndex
+from utils.logger import DEBUG, get_logger, setup_logging, shutdown_logging
+from utils.market_stats import MarketStats
+from utils.multicast import HOT_SUBSCRIBERS, INTERFACE, MulticastPublisher, format_group
+from utils.text_index import TextIndex
+from utils.parser import MessageError, encode_message, parse_datagram, parse_message
+from utils.rate_limit import ADDRESS_RATE, MAX_IN_FLIGHT, USER_RATE, Admission
+from utils.replication import FAILOVER_TIMEOUT, ReplicationPrimary, ReplicationStandby
+from utils.sessions import SessionTable
+from utils.scheduler import CLOSURE, READ, URGENT_BID, WRITE, PriorityRequestQueue
+from utils.snapshot import SnapshotStore
+from utils.transport import MAX_DATAGRAM, RECV_BUFFER_SIZE, Fragmenter, Reassembler, fragment_count, is_fragment
+from utils.versions import ChangeLog
+
+log = get_logger("server")
+
+# Reply line for a batched command whose handler sends no reply
+BATCH_NO_REPLY = "-"
+# How a BATCH envelope starts; other tokens (BATCH_RESULT) share the prefix
+BATCH_HEADER = (b'BATCH ', b'BATCH\n', b'BATCH\r')
+# Seconds a closure waits for a client to answer INFORM_Req before cancelling
+FINALIZE_TIMEOUT = 300
+# Bids on auctions ending within this many seconds jump the request queue
+CLOSING_SOON = 10
+# Commands scheduled behind every write: browsing, searching and bulk batches
+READ_COMMANDS = frozenset({b'LIST_ACTIVE', b'SEARCH', b'SEARCH_TEXT', b'BATCH', b'RESYNC', b'MARKET_STATS'})
+# Threads taking requests off the queue; handlers other than BID still
+# share plain dicts, so requests are executed one at a time
+WORKERS = 1
+# Seconds between queue-time metric log lines
+QUEUE_STATS_INTERVAL = 60
+# Seconds a new TCP connection has to send its CONNECT line
+HANDSHAKE_TIMEOUT = 5
+# Closure messages kept per user without a push channel, and seconds each is
+# kept; a dropped one leaves its item's closure pending, resumed on restart
+MAX_DEFERRED = 32
+DEFERRED_TTL = 24 * 60 * 60
+
+# Page sizes for LIST_ACTIVE and SEARCH
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def write_json(path, data, indent=None):
+    """Write data to path as JSON through a temporary file, so a crash mid-write leaves the old file intact"""
+    tmp = path + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=indent)
+    os.replace(tmp, path)
+
+
 class AuctionServer:
-    def __init__(self, host='0.0.0.0', udp_port=5000, tcp_port=5001):
+    def __init__(self, host='0.0.0.0', udp_port=5000, tcp_port=5001, data_file='server_data.json',
+                 cluster=None, node=None, replication_port=None, admission=None, multicast=None,
+                 bid_increment=BID_INCREMENT, clock=None, capture=None):
         self.host = host
         self.udp_port = udp_port
         self.tcp_port = tcp_port
+        self.data_file = data_file
+        # In cluster mode this node only lists items whose names hash to it
+        self.ring = HashRing(cluster) if cluster else None
+        self.node = normalize_node(node) if node is not None else None
         self.users = {}
         self.items = {}
         self.subscriptions = {}
-        self.ip_to_name: dict[str, str] = {}
+        # Logged-in users by token and source address; saved with the state
+        # so a restart does not log everyone out
+        self.sessions = SessionTable(on_expire=self.sessions_expired)
         self.lock = threading.Lock()
-
-        if os.path.exists('server_data.json'):
+        # Everything that reads auction time goes through this; a VirtualClock
+        # lets a simulation fast-forward through deadlines
+        self.clock = clock or SystemClock()
+        # With a CaptureWriter, requests, push channel lines and replies are
+        # recorded for replay.py
+        self.capture = capture
+        saved_text_index = None
+        saved_market_stats = None
+        # Name lookups and browse indexes are derived from self.items, not saved
+        self.item_ids_by_name = {}
+        self.browse = AuctionIndex()
+
+        if os.path.exists(self.data_file):
             try:
-                with open('server_data.json', 'r') as f:
+                with open(self.data_file, 'r') as f:
                     data = json.load(f)
                     self.users = data.get('users', {})
                     self.subscriptions = data.get('subscriptions', {})
                     items_data = data.get('items', {})
+                    saved_text_index = data.get('text_index')
+                    saved_market_stats = data.get('market_stats')
+                    self.sessions.load(data.get('sessions', {}))
                     self.items = {}
                     for k, v in items_data.items():
                         if 'start_time' in v and 'end_time' in v:
@@ -33,13 +116,51 @@ class AuctionServer:
                             }
                         else:
                             self.items[int(k)] = v
+                        # Items listed before sellers were recorded by name have none
+                        self.items[int(k)].setdefault('seller_name', '')
+                    self.index_items()
 
-                    print(f"Loaded {len(self.users)} users and {len(self.items)} items from saved data and {len(self.subscriptions)} subscriptions")
+                    log.info("Loaded %d users, %d items, %d subscriptions and %d sessions from saved data",
+                             len(self.users), len(self.items), len(self.subscriptions), len(self.sessions))
             except Exception as e:
-                print(f"Error loading data: {e}")
+                log.error("Error loading data: %s", e)
+
+        # Full-text postings are saved with the state; only items the saved
+        # index is missing (or still holds after closing) are re-tokenized
+        self.text_index = TextIndex.from_dict(saved_text_index) if saved_text_index else TextIndex()
+        for item_id in [item_id for item_id in self.text_index.lengths if item_id not in self.browse]:
+            item = self.items.get(item_id)
+            self.text_index.remove(item_id, self.item_text(item) if item else None)
+        for item_id, item in self.items.items():
+            if item_id in self.browse and item_id not in self.text_index.lengths:
+                self.text_index.add(item_id, self.item_text(item))
+        # Market statistics are updated as auctions are listed, bid on and
+        # closed; a state saved without them is counted once here
+        self.market = MarketStats()
+        if saved_market_stats is not None:
+            self.market.load(saved_market_stats)
+        else:
+            self.market.rebuild(self.items)
+        # Browse and search commands format their replies from published
+        # snapshots; every write to self.items goes through snapshots.write()
+        self.snapshots = SnapshotStore(self.items)
+        # Check-then-update of an item's price happens per item, in batches
+        self.bid_engine = BidEngine()
+        # Proxy bids raise their bidder's price in steps of this much
+        self.bid_increment = bid_increment
+        # Every change to an item bumps item['version']; recent ones are kept
+        # here so RESYNC can answer with just what a client missed
+        self.changes = ChangeLog()
 
         self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.udp_socket.bind((self.host, self.udp_port))
+        # Reused by the receive loop for every datagram; parsing reads fields
+        # straight out of it, so nothing here may outlive one request
+        self.recv_buffer = bytearray(RECV_BUFFER_SIZE)
+        self.recv_view = memoryview(self.recv_buffer)
+        # Payloads over MAX_DATAGRAM travel as FRAG datagrams in both directions
+        self.fragmenter = Fragmenter()
+        self.reassembler = Reassembler()
 
         self.tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.tcp_socket.bind((self.host, self.tcp_port))
@@ -47,161 +168,276 @@ class AuctionServer:
 
         hostname = socket.gethostname()
         ip_address = socket.gethostbyname(hostname)
-        print(f"Server started on {ip_address} - UDP:{self.udp_port}, TCP:{self.tcp_port}")
+        log.info("Server started on %s - UDP:%s, TCP:%s", ip_address, self.udp_port, self.tcp_port)
 
         self.threads = []
         self.active_auctions = {}
         self.request_counter = 1
+        # Per-thread BATCH state: while a thread runs a batch its saves and
+        # pushes are deferred and flushed once when the batch ends
+        self.batch_state = threading.local()
+        # Token buckets and an in-flight budget checked before anything is parsed
+        self.admission = admission or Admission()
+        # Admitted requests and auction closures wait here for a worker, most urgent first
+        self.requests = PriorityRequestQueue()
+        # Push channels the clients opened to tcp_port, by user name; closure
+        # messages (and opted-in bid updates) go over these
+        self.connections = ConnectionPool(on_line=self.capture_line if capture is not None else None,
+                                          idle_notice=encode_message('CHANNEL_CLOSED', '-', "Idle"))
+        # With a MulticastPublisher, items with many subscribers get a group
+        # and each of their BID_UPDATEs is sent once
+        self.multicast = multicast
+        # Closure messages for users without a push channel, sent once they
+        # connect: (deferred at, retry, args), at most MAX_DEFERRED per user
+        self.deferred = {}
+        self.deferred_lock = threading.Lock()
+        # Saves run on handler and closure threads alike
+        self.save_lock = threading.RLock()
+
+        # Standbys tail every saved change from here (see utils/replication.py)
+        self.replication = None
+        if replication_port is not None:
+            self.replication = ReplicationPrimary(self.host, replication_port)
+            self.replication.start()
+            self.save_data()
+
+        # Command token -> handler; every handler takes (message, client_address)
+        self.handlers = {
+            'REGISTER': self.handle_registration,
+            'DE-REGISTER': self.handle_deregistration,
+            'LOGIN': self.handle_login,
+            'LIST_ITEM': self.handle_list_item,
+            'SUBSCRIBE': self.handle_auction_subscription,
+            'DE-SUBSCRIBE': self.handle_unsubscribe,
+            'BID': self.handle_bid,
+            'PROXY_BID': self.handle_proxy_bid,
+            'LIST_ACTIVE': self.handle_list_active,
+            'SEARCH': self.handle_search,
+            'SEARCH_TEXT': self.handle_search_text,
+            'RESYNC': self.handle_resync,
+            'HEARTBEAT': self.handle_heartbeat,
+            'MARKET_STATS': self.handle_market_stats,
+        }
+
+    def index_items(self):
+        """Build the name lookup and browse indexes from the loaded items"""
+        self.item_ids_by_name = {item['name']: item_id for item_id, item in self.items.items()}
+        self.browse = AuctionIndex()
+        self.browse.load((item_id, item['name'], item['end_time'], item['current_price'], item.get('seller_name', ''))
+                         for item_id, item in self.items.items()
+                         if item.get('active') and isinstance(item.get('end_time'), datetime))
 
     def save_data(self):
         """Save the current state of users, subscriptions, and items to disk"""
-        try:
-            data = {
-                'users': self.users,
-                'subscriptions': self.subscriptions,
-                'items': {
-                    item_id: {
-                        **item,
-                        'start_time': item['start_time'].isoformat() if isinstance(item.get('start_time'),
-                                                                                   datetime) else item.get(
-                            'start_time'),
-                        'end_time': item['end_time'].isoformat() if isinstance(item.get('end_time'),
-                                                                               datetime) else item.get('end_time'),
-                        'bids': item.get('bids', []),  # Save bid list as is
-                        'highest_bidder': item.get('highest_bidder')  # Save highest bidder name
-                    }
-                    for item_id, item in self.items.items()
+        if getattr(self.batch_state, 'depth', 0):
+            self.batch_state.save_pending = True
+            return
+
+        # Held while the state is serialized so saves land in the file and the
+        # replication stream in the order they were taken
+        with self.save_lock:
+            try:
+                data = {
+                    'users': self.users,
+                    'subscriptions': self.subscriptions,
+                    'items': {
+                        item_id: {
+                            **item,
+                            'start_time': item['start_time'].isoformat() if isinstance(item.get('start_time'),
+                                                                                       datetime) else item.get(
+                                'start_time'),
+                            'end_time': item['end_time'].isoformat() if isinstance(item.get('end_time'),
+                                                                                   datetime) else item.get('end_time'),
+                            'bids': item.get('bids', []),  # Save bid list as is
+                            'highest_bidder': item.get('highest_bidder')  # Save highest bidder name
+                        }
+                        for item_id, item in self.items.items()
+                    },
+                    'text_index': self.text_index.to_dict(),
+                    'sessions': self.sessions.to_dict(),
+                    'market_stats': self.market.to_dict()
                 }
-            }
 
-            with open('server_data.json', 'w') as f:
-                json.dump(data, f, indent=2)
+                write_json(self.data_file, data, indent=2)
+                if self.replication is not None:
+                    self.replication.publish(data)
 
-            print("✅ Data saved to server_data.json")
+                log.debug("Data saved to %s", self.data_file)
 
-        except Exception as e:
-            print(f"❌ Error while saving data: {e}")
+            except Exception as e:
+                log.error("Error while saving data: %s", e)
 
     def handle_registration(self, message, client_address):
         """Handle REGISTER message"""
-        parts = message.split()
-
-        if len(parts) != 7:
-            return f"REGISTER-DENIED {parts[1]} Invalid format"
-
-        _, req_num, name, role, ip, udp_port, tcp_port = parts
+        req_num = message.req_num
+        name = message.name
 
         if name in self.users:
             return f"REGISTER-DENIED {req_num} User name is already taken"
 
         self.users[name] = {
-            'role': role,
-            'ip': ip,
-            'udp_port': udp_port,
-            'tcp_port': tcp_port,
-            'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            'role': message.role,
+            'ip': message.ip,
+            'udp_port': message.udp_port,
+            'tcp_port': message.tcp_port,
+            'time': self.clock.now().strftime("%Y-%m-%d %H:%M:%S")
         }
-        # Store the full client_address tuple as key.
-        self.ip_to_name[client_address] = name
+        # The session ties the client's address to the name; its token
+        # authenticates the push channel and HEARTBEATs
+        token = self.sessions.open(name, client_address)
+        self.save_data()
+        return f"REGISTERED {req_num} token={token}"
+
+    def handle_heartbeat(self, message, client_address):
+        """Handle HEARTBEAT: keep the session alive and follow the client to a new address"""
+        session = self.sessions.heartbeat(message.token, client_address)
+        if session is None:
+            return f"SESSION_EXPIRED {message.req_num} Log in again"
+        return f"HEARTBEAT_ACK {message.req_num} {int(self.sessions.ttl)}"
+
+    def sessions_expired(self, sessions):
+        """Drop the push channels of users whose sessions expired"""
+        for session in sessions:
+            log.info("Session of %s expired", session.name)
+            # Closing the channel also fails any closure waiting on it
+            self.connections.discard(session.name)
         self.save_data()
-        return f"REGISTERED {req_num}"
 
     def handle_list_item(self, message, client_address):
         """Handle LIST_ITEM message"""
-        parts = message.split()
+        req_num = message.req_num
+        item_name = message.item_name
+        item_description = message.item_description
+        start_price = message.start_price
+        duration = message.duration
+        seller_name = message.seller_name
 
-        if len(parts) < 6:
-            return f"LIST-DENIED {parts[1]} Invalid format"
+        # nan and inf parse as floats but would corrupt the price index
+        if not math.isfinite(start_price) or start_price <= 0:
+            return f"LIST_DENIED {req_num} start price must be a positive number"
 
-        _, req_num, item_name, item_description, start_price, duration, seller_name = parts
+        if duration <= 0:
+            return f"LIST_DENIED {req_num} duration must be postive"
 
-        try:
-            start_price = float(start_price)
-            duration = int(duration)
-
-            if start_price <= 0:
-                return f"LIST_DENIED {req_num} start price must be positive"
-
-            if duration <= 0:
-                return f"LIST_DENIED {req_num} duration must be postive"
+        if self.ring is not None and self.ring.node_for(item_name) != self.node:
+            return f"LIST_DENIED {req_num} item belongs to node {node_name(self.ring.node_for(item_name))}"
 
-            if any(item['name'] == item_name for item in self.items.values()):
+        with self.snapshots.write(self.items) as changed:
+            if item_name in self.item_ids_by_name:
                 return f"LIST_DENIED {req_num} item name already exists"
 
-        except ValueError:
-            return f"LIST_DENIED {req_num} invalid price or duration format"
-
-
-        item_id = len(self.items) + 1
-
-        self.items[item_id] = {
-            'name': item_name,
-            'description': item_description,
-            'start_price': start_price,
-            'current_price': start_price,
-            'duration': duration,
-            'seller_address': client_address,
-            'seller_name': seller_name,
-            'start_time': datetime.now(),
-            'end_time': datetime.now() + timedelta(minutes=duration),
-            'active': True,
-            'bids': [],
-            'highest_bidder': None
-        }
+            item_id = len(self.items) + 1
+            now = self.clock.now()
+
+            self.items[item_id] = {
+                'name': item_name,
+                'description': item_description,
+                'start_price': start_price,
+                'current_price': start_price,
+                'duration': duration,
+                'seller_address': client_address,
+                'seller_name': seller_name,
+                'start_time': now,
+                'end_time': now + timedelta(minutes=duration),
+                'active': True,
+                'bids': [],
+                'highest_bidder': None
+            }
+            item = self.items[item_id]
+            self.item_ids_by_name[item_name] = item_id
+            self.browse.add(item_id, item_name, item['end_time'], start_price, seller_name)
+            self.text_index.add(item_id, self.item_text(item))
+            changed.add(item_id)
+        self.market.listed(seller_name)
         self.save_data()
-
-        auction_timer = threading.Thread(target=self.monitor_auction_end, args=(item_id,))
-        auction_timer.daemon = True
-        auction_timer.start()
-        #self.threads.append(auction_timer)
+        self.monitor_auction_end(item_id)
 
         return f"ITEM_LISTED {req_num}"
 
     def monitor_auction_end(self, item_id):
-        """Monitor when an auction ends and handle closure"""
+        """Queue the auction's closure for when it ends"""
         item = self.items[item_id]
-        time_to_wait = (item['end_time'] - datetime.now()).total_seconds()
+        time_to_wait = (item['end_time'] - self.clock.now()).total_seconds()
 
         if time_to_wait > 0:
-            print(f"Auction for {item['name']} will end in {time_to_wait:.2f} seconds")
-            time.sleep(time_to_wait)
+            log.info("Auction for %s will end in %.2f seconds", item['name'], time_to_wait)
+
+        # The clock's timer fires at once for an auction that already ended
+        self.clock.call_at(item['end_time'], self.requests.put, CLOSURE, (self.close_auction, (item_id,)))
 
+    def close_auction(self, item_id):
+        """Mark an ended auction inactive and start notifying its winner and seller"""
         item = self.items[item_id]
-        if not item['active']:
-            return
+        # Holding the item's bid lock means no bid batch is mid-resolution
+        with self.bid_engine.lock_for(item['name']), self.snapshots.write(self.items) as changed:
+            item = self.items[item_id]
+            if not item['active']:
+                return
 
-        item['active'] = False
-        print(f"🔔 Auction for {item['name']} has ended. Marking inactive.")
+            item['active'] = False
+            # Unused maxima are nobody else's business once the auction is over
+            item.pop('proxies', None)
+            # Cleared once the closure is finished; a promoted standby resumes pending ones
+            item['closure'] = 'pending'
+            self.browse.remove(item_id)
+            self.text_index.remove(item_id, self.item_text(item))
+            self.bump_version(item_id, f"CLOSED {item['current_price']} {item['highest_bidder'] or '-'}")
+            changed.add(item_id)
+        # A closed item changes no more, and a RESYNC for it is answered with
+        # its full (closed) state, which is no longer than a delta
+        self.changes.forget(item_id)
+        self.market.closed(item['seller_name'],
+                           item['current_price'] if item['bids'] and item['highest_bidder'] else None)
+        if self.multicast is not None:
+            self.multicast.drop(item['name'])
+        log.info("Auction for %s has ended. Marking inactive.", item['name'])
         self.save_data()
+        self.start_closure(item_id)
 
-        print(f"Auction for {item['name']} has ended!")
+    def start_closure(self, item_id):
+        """Notify the winner and seller of an ended auction, or the seller that nothing sold"""
+        item = self.items[item_id]
 
-        # If there are bids, notify the winner and seller
         # If there are bids, notify the winner and seller
         if item['bids'] and item['highest_bidder']:
             winner_name = item['highest_bidder']
             seller_name = item['seller_name']
 
-            # Check if we have TCP connection info for both parties
+            # Messages to a party without an open push channel wait until they connect
             if winner_name not in self.users:
-                print(f"⚠️ WARNING: Winner {winner_name} not found in self.users!")
+                log.warning("Winner %s not found in registered users", winner_name)
             else:
-                winner_info = self.users[winner_name]
-                print(f"Winner TCP info: {winner_name} at {winner_info['ip']}:{winner_info['tcp_port']}")
+                log.debug("Winner %s push channel open: %s", winner_name, winner_name in self.connections)
 
             if seller_name not in self.users:
-                print(f"⚠️ WARNING: Seller {seller_name} not found in self.users!")
+                log.warning("Seller %s not found in registered users", seller_name)
             else:
-                seller_info = self.users[seller_name]
-                print(f"Seller TCP info: {seller_name} at {seller_info['ip']}:{seller_info['tcp_port']}")
+                log.debug("Seller %s push channel open: %s", seller_name, seller_name in self.connections)
 
             threading.Thread(target=self.handle_auction_close, args=(item_id,)).start()
 
         else:
             # No bids were placed
-            print("NO BIDS !!!")
-            self.send_no_offer_message(item_id)
+            log.info("No bids placed on %s", item['name'])
+            # Off the request workers: this writes to the seller's push channel
+            threading.Thread(target=self.send_no_offer_message, args=(item_id,)).start()
+
+    def resume_auctions(self):
+        """Re-arm the deadline of every active auction and restart closures that never finished"""
+        resumed = 0
+        for item_id, item in list(self.items.items()):
+            if item.get('active') and isinstance(item.get('end_time'), datetime):
+                self.monitor_auction_end(item_id)
+            elif item.get('closure') == 'pending':
+                threading.Thread(target=self.start_closure, args=(item_id,), daemon=True).start()
+            else:
+                continue
+            resumed += 1
+        log.info("Resumed %d auctions and closures", resumed)
 
+    def finish_closure(self, item_id):
+        self.items[item_id]['closure'] = 'done'
+        self.save_data()
 
     def handle_auction_close(self, item_id):
         """Handle the auction closure process using TCP"""
@@ -210,14 +446,8 @@ class AuctionServer:
         winner_name = item['highest_bidder']
         final_price = item['current_price']
 
-        print("\n===== DEBUG USER DATA =====")
-        print(f"All registered users: {list(self.users.keys())}")
-        print(f"Winner name: {winner_name}, Seller name: {seller_name}")
-        if winner_name in self.users:
-            print(f"Winner data: {self.users[winner_name]}")
-        if seller_name in self.users:
-            print(f"Seller data: {self.users[seller_name]}")
-        print("==========================\n")
+        log.info("Closing auction for %s: winner %s, seller %s, price %s",
+                 item['name'], winner_name, seller_name, final_price)
 
         # Connect to the winner (buyer) using TCP
         if winner_name in self.users:
@@ -232,83 +462,55 @@ class AuctionServer:
     def send_winner_message(self, buyer_name, item_id, final_price, seller_name):
         """Send WINNER message to buyer via TCP"""
         if buyer_name not in self.users:
-            print(f"Buyer {buyer_name} not found in registered users")
+            log.warning("Buyer %s not found in registered users", buyer_name)
             return
 
-        buyer_info = self.users[buyer_name]
-        buyer_ip = buyer_info['ip']
-        buyer_tcp_port = int(buyer_info['tcp_port'])
+        connection = self.channel_for(buyer_name, self.send_winner_message,
+                                      buyer_name, item_id, final_price, seller_name)
+        if connection is None:
+            return
         item = self.items[item_id]
 
-        print(f"Attempting to connect to buyer {buyer_name} at {buyer_ip}:{buyer_tcp_port}")
-
-        # Create TCP connection to buyer
-        tcp_client = None
         try:
-            tcp_client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            tcp_client.settimeout(None)  # Set timeout for connection attempts
-
-            # Try connecting to the buyer
-            tcp_client.connect((buyer_ip, buyer_tcp_port))
-
             # Send WINNER message
             req_num = self.request_counter
             self.request_counter += 1
 
             winner_msg = f"WINNER {req_num} {item['name']} {final_price} {seller_name}"
-            tcp_client.sendall(winner_msg.encode('utf-8'))
-            print(f"Sent to buyer {buyer_name}: {winner_msg}")
-            time.sleep(1)  # Wait a moment for client to process
+            connection.send(winner_msg)
+            log.info("Sent to buyer %s: %s", buyer_name, winner_msg)
 
-            # KEEP THE SAME CONNECTION OPEN for purchase finalization
-            self.handle_purchase_finalization(tcp_client, item_id, final_price, "buyer", buyer_name)
+            # The same connection carries the purchase finalization
+            self.handle_purchase_finalization(connection, item_id, final_price, "buyer", buyer_name)
 
-        except ConnectionRefusedError:
-            print(f"Connection refused by buyer {buyer_name} at {buyer_ip}:{buyer_tcp_port}")
-            print("The client TCP listener might not be running or the port is incorrect")
         except Exception as e:
-            print(f"Error sending WINNER message to {buyer_name}: {e}")
-            print(f"Buyer TCP details: IP={buyer_ip}, PORT={buyer_tcp_port}")
-        finally:
-            # DON'T close the connection here, it's closed in handle_purchase_finalization
-            pass
+            log.error("Error sending WINNER message to %s: %s", buyer_name, e)
 
     def send_sold_message(self, seller_name, item_id, final_price, buyer_name):
         """Send SOLD message to seller via TCP"""
         if seller_name not in self.users:
-            print(f"Seller {seller_name} not found in registered users")
+            log.warning("Seller %s not found in registered users", seller_name)
             return
 
-        seller_info = self.users[seller_name]
-        seller_ip = seller_info['ip']
-        seller_tcp_port = int(seller_info['tcp_port'])
+        connection = self.channel_for(seller_name, self.send_sold_message,
+                                      seller_name, item_id, final_price, buyer_name)
+        if connection is None:
+            return
         item = self.items[item_id]
 
-        print(f"Attempting to connect to buyer {buyer_name} at {seller_ip}:{seller_tcp_port}")
-
-        # Create TCP connection to seller
         try:
-            tcp_client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            tcp_client.settimeout(None)  # Set a timeout for the connection attempt
-            tcp_client.connect((seller_ip, seller_tcp_port))
-
             # Send SOLD message
             req_num = self.request_counter
             self.request_counter += 1
 
             sold_msg = f"SOLD {req_num} {item['name']} {final_price} {buyer_name}"
-            tcp_client.sendall(sold_msg.encode('utf-8'))
-            print(f"Sent to seller {seller_name}: {sold_msg}")
-            time.sleep(0.5)
+            connection.send(sold_msg)
+            log.info("Sent to seller %s: %s", seller_name, sold_msg)
             # Start purchase finalization process
-            self.handle_purchase_finalization(tcp_client, item_id, final_price, "seller", seller_name)
+            self.handle_purchase_finalization(connection, item_id, final_price, "seller", seller_name)
 
         except Exception as e:
-            print(f"Error sending SOLD message to {seller_name}: {e}")
-            print(f"Buyer TCP details: IP={seller_ip}, PORT={seller_tcp_port}")
-        finally:
-            # DON'T close the connection here, it's closed in handle_purchase_finalization
-            pass
+            log.error("Error sending SOLD message to %s: %s", seller_name, e)
 
     def send_no_offer_message(self, item_id):
         """Send NON_OFFER message to seller via TCP when no bids are placed"""
@@ -316,37 +518,62 @@ class AuctionServer:
         seller_name = item['seller_name']
 
         if seller_name not in self.users:
-            print(f"Seller {seller_name} not found in registered users")
+            log.warning("Seller %s not found in registered users", seller_name)
+            self.finish_closure(item_id)
             return
 
-        seller_info = self.users[seller_name]
-        seller_ip = seller_info['ip']
-        seller_tcp_port = int(seller_info['tcp_port'])
+        connection = self.channel_for(seller_name, self.send_no_offer_message, item_id)
+        if connection is None:
+            return
 
-        # Create TCP connection to seller
         try:
-            tcp_client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            tcp_client.connect((seller_ip, seller_tcp_port))
-
             # Send NON_OFFER message
             req_num = self.request_counter
             self.request_counter += 1
 
             no_offer_msg = f"NON_OFFER {req_num} {item['name']}"
-            tcp_client.sendall(no_offer_msg.encode('utf-8'))
-            print(f"Sent to seller {seller_name}: {no_offer_msg}")
+            connection.send(no_offer_msg)
+            log.info("Sent to seller %s: %s", seller_name, no_offer_msg)
+            self.finish_closure(item_id)
 
         except Exception as e:
-            print(f"Error sending NON_OFFER message to {seller_name}: {e}")
-        finally:
-            tcp_client.close()
+            log.error("Error sending NON_OFFER message to %s: %s", seller_name, e)
 
-    def handle_purchase_finalization(self, tcp_socket, item_id, final_price, role, user_name):
-        """Handle the purchase finalization process via TCP"""
-        item = self.items[item_id]
+    def channel_for(self, user_name, retry, *args):
+        """Return the user's push channel, or None after deferring retry(*args) until they connect.
 
-        # Set a reasonable timeout for receiving responses
-        #tcp_socket.settimeout(30)  # 30 seconds should be enough for user input
+        Users without a live session are offline: any channel they left
+        behind is closed rather than written to and waited on.
+        """
+        with self.deferred_lock:
+            if self.sessions.online(user_name):
+                connection = self.connections.get(user_name)
+            else:
+                connection = None
+                self.connections.discard(user_name)
+            if connection is None:
+                now = time.monotonic()
+                self.expire_deferred(now)
+                waiting = self.deferred.setdefault(user_name, deque(maxlen=MAX_DEFERRED))
+                if len(waiting) == MAX_DEFERRED:
+                    log.warning("Dropped the oldest deferred message for %s: %s", user_name, waiting[0][1].__name__)
+                waiting.append((now, retry, args))
+                log.info("No push channel for %s; %s deferred until they connect", user_name, retry.__name__)
+            return connection
+
+    def expire_deferred(self, now):
+        """Drop deferred messages older than DEFERRED_TTL; call with deferred_lock held"""
+        for user_name in list(self.deferred):
+            waiting = self.deferred[user_name]
+            while waiting and now - waiting[0][0] >= DEFERRED_TTL:
+                _, retry, _ = waiting.popleft()
+                log.warning("Deferred %s for %s expired", retry.__name__, user_name)
+            if not waiting:
+                del self.deferred[user_name]
+
+    def handle_purchase_finalization(self, connection, item_id, final_price, role, user_name):
+        """Handle the purchase finalization process over the user's push channel"""
+        item = self.items[item_id]
 
         try:
             # First send the INFORM_Req message
@@ -354,35 +581,30 @@ class AuctionServer:
             self.request_counter += 1
             inform_msg = f"INFORM_Req {req_num} {item['name']} {final_price}"
 
-            print(f"Sending INFORM_Req to {role} {user_name}")
-            tcp_socket.sendall(inform_msg.encode('utf-8'))
-            print(f"Sent to {role} {user_name}: {inform_msg}")
+            # Wait for the INFORM_Res carrying the same request number; other
+            # closures for this user share the connection meanwhile
+            log.debug("Sent to %s %s: %s", role, user_name, inform_msg)
+            data = connection.request(inform_msg, req_num, FINALIZE_TIMEOUT)
 
-            # Add a small delay after sending to ensure the message is processed
-            time.sleep(0.5)
+            log.debug("Received from %s %s: %s", role, user_name, data)
 
-            # Wait for INFORM_Res response
-            print(f"Waiting for INFORM_Res from {role} {user_name}...")
-            data = tcp_socket.recv(1024).decode('utf-8')
-
-            if not data:
-                print(f"Empty response from {role} {user_name}")
-                return
-
-            print(f"Received from {role} {user_name}: {data}")
+            try:
+                response = parse_message(data)
+            except MessageError:
+                response = None
 
-            parts = data.split()
-            if not data.startswith("INFORM_Res") or len(parts) < 6:
+            if response is None or response.command != "INFORM_Res" or not response.address:
                 # Invalid response, cancel transaction
                 cancel_msg = f"CANCEL {req_num} Invalid response format"
-                tcp_socket.sendall(cancel_msg.encode('utf-8'))
-                print(f"Invalid response format from {role} {user_name}, sent CANCEL")
-                time.sleep(0.5)  # Give time for CANCEL to be sent
+                connection.send(cancel_msg)
+                log.warning("Invalid response format from %s %s, sent CANCEL", role, user_name)
                 return
 
             # Process payment information
-            _, resp_req_num, name, cc_num, cc_exp_date, *address_parts = parts
-            address = " ".join(address_parts)
+            name = response.name
+            cc_num = response.cc_num
+            cc_exp_date = response.cc_exp_date
+            address = response.address
 
             # Store information for transaction processing
             with self.lock:  # Use a lock for thread safety
@@ -393,7 +615,7 @@ class AuctionServer:
                         'cc_exp_date': cc_exp_date,
                         'address': address
                     }
-                    print(f"Stored buyer payment info")
+                    log.info("Stored buyer payment info for %s", item['name'])
                 else:  # seller
                     item['seller_info'] = {
                         'name': name,
@@ -401,115 +623,228 @@ class AuctionServer:
                         'cc_exp_date': cc_exp_date,
                         'address': address
                     }
-                    print(f"Stored seller payment info")
+                    log.info("Stored seller payment info for %s", item['name'])
+                if 'buyer_info' in item and 'seller_info' in item:
+                    item['closure'] = 'done'
                 self.save_data()  # Save after updating
 
             # Only send shipping info if we have both buyer and seller info
             if role == "seller" and 'buyer_info' in item:
                 try:
-                    # Give extra time before sending shipping info
-                    time.sleep(0.5)
-
                     # Send shipping info to seller
                     shipping_msg = f"Shipping_Info {req_num} {item['buyer_info']['name']} {item['buyer_info']['address']}"
-                    tcp_socket.sendall(shipping_msg.encode('utf-8'))
-                    print(f"Sent shipping info to seller {user_name}")
-
-                    # Wait longer before closing to make sure shipping info is received
-                    time.sleep(1)
+                    connection.send(shipping_msg)
+                    log.info("Sent shipping info to seller %s", user_name)
                 except Exception as ship_err:
-                    print(f"Error sending shipping info: {ship_err}")
+                    log.error("Error sending shipping info: %s", ship_err)
 
         except socket.timeout:
-            print(f"Timeout waiting for response from {role} {user_name}")
+            log.warning("Timeout waiting for response from %s %s", role, user_name)
             try:
                 cancel_msg = f"CANCEL {req_num} Connection timeout"
-                tcp_socket.sendall(cancel_msg.encode('utf-8'))
-                time.sleep(0.5)  # Give time for CANCEL to be sent
+                connection.send(cancel_msg)
             except:
                 pass
         except Exception as e:
-            print(f"Error in purchase finalization with {role} {user_name}: {e}")
-            print(f"Error type: {type(e)}")
+            log.error("Error in purchase finalization with %s %s: %r", role, user_name, e)
             try:
                 # Try to send a cancel message
                 cancel_msg = f"CANCEL {req_num} Connection error"
-                tcp_socket.sendall(cancel_msg.encode('utf-8'))
-                time.sleep(0.5)  # Give time for CANCEL to be sent
+                connection.send(cancel_msg)
             except:
                 pass
-        finally:
-            # Always close the socket at the end, but wait to make sure messages are sent
-            time.sleep(1)
-            try:
-                tcp_socket.close()
-                print(f"Closed TCP connection to {role} {user_name}")
-            except:
-                pass
-
 
     def handle_auction_subscription(self, message, client_address):
         """Handle SUBSCRIBE message"""
-        parts = message.split()
-
-        if len(parts) < 3:
-            return f"SUBSCRIPTION-DENIED {parts[1]} Invalid format"
-
-        _, req_num, item_name, client_name = parts
+        req_num = message.req_num
+        item_name = message.item_name
+        client_name = message.client_name
 
         if not client_name:
             return f"SUBSCRIBE-DENIED {req_num} User not registered"
-        if not any(item['name'] == item_name for item in self.items.values()):
+        if item_name not in self.item_ids_by_name:
             return f"SUBSCRIPTION-DENIED {req_num} item does not exist"
-        subscription_id = len(self.subscriptions) + 1
 
+        # Subscribing again just re-sends the announcement
+        if not any(sub['name'] == item_name and sub['client_name'] == client_name
+                   for sub in self.subscriptions.values()):
+            subscription_id = len(self.subscriptions) + 1
+            self.subscriptions[subscription_id] = {
+                'client_name': client_name,
+                'name': item_name
+            }
+            self.save_data()
 
-        self.subscriptions[subscription_id] = {
-            'client_name': client_name,
-            'name': item_name
-        }
-        self.save_data()
-
-        required_item = next((item for item in self.items.values() if item['name'] == item_name), None)
+        required_item = self.items[self.item_ids_by_name[item_name]]
             
         # Calculate time left in seconds
-        time_left = max(0, int((required_item['end_time'] - datetime.now()).total_seconds()))
+        time_left = max(0, int((required_item['end_time'] - self.clock.now()).total_seconds()))
         
         # Send initial auction status to subscriber
-        announce_msg = f"AUCTION_ANNOUNCE {req_num} {item_name} {required_item['description']} {required_item['current_price']} {time_left}"
-        self.udp_socket.sendto(announce_msg.encode('utf-8'), client_address)
-        print(f"Sent {announce_msg}")
+        announce_msg = (f"AUCTION_ANNOUNCE {req_num} {item_name} {required_item['description']} "
+                        f"{required_item['current_price']} {time_left} {required_item.get('version', 0)}")
+        group = self.multicast_group(item_name, client_name, announce_msg)
+        if group is not None:
+            announce_msg += f" {format_group(group)}"
+        self.send_push(announce_msg, client_address)
+        log.debug("Sent %s", announce_msg)
 
         return f"SUBSCRIBED {req_num}"
 
-    def handle_deregistration(self, message):
-        """Handle DE-SUBSCRIBE message"""
-        parts = message.split()
+    def multicast_group(self, item_name, client_name, announce_msg):
+        """Multicast group a new subscriber of item_name should join, if any.
 
-        if len(parts) != 3:
+        When this subscription makes the item hot, the earlier subscribers
+        are sent the announcement again with the group added.
+        """
+        if self.multicast is None:
             return None
-
-        _, req_num, name = parts
-
+        group = self.multicast.group(item_name)
+        if group is not None:
+            return group
+        subscribers = {sub['client_name'] for sub in self.subscriptions.values() if sub['name'] == item_name}
+        if len(subscribers) < self.multicast.threshold:
+            return None
+        group = self.multicast.promote(item_name, self.node or self.udp_socket.getsockname())
+        for subscriber in subscribers - {client_name}:
+            target = self.push_target(subscriber)
+            if target is not None:
+                self.send_push(f"{announce_msg} {format_group(group)}", target)
+        return group
+
+    def push_target(self, user_name):
+        """Where pushes for a user go: their push channel if they asked for updates there, else UDP"""
+        connection = self.connections.get(user_name)
+        if connection is not None and connection.push_updates:
+            return connection
+        user = self.users.get(user_name)
+        if user is None:
+            return None
+        return user['ip'], int(user['udp_port'])
+
+    def handle_resync(self, message, client_address):
+        """Handle RESYNC message: what changed on an item since the client's version.
+
+        The reply is RESYNC_RESULT <req#> <item> <version> delta <count>
+        followed by one "<version> BID <amount> <bidder>" or
+        "<version> CLOSED <price> <winner>" line per change. If the changes
+        are no longer all kept, or no version was given, it is
+        RESYNC_RESULT ... full 1 with one
+        "<version> STATE <price> <bidder> <time_left> <active|closed>" line.
+        """
+        req_num = message.req_num
+        item_id = self.item_ids_by_name.get(message.item_name)
+        if item_id is None:
+            return f"RESYNC_DENIED {req_num} item does not exist"
+        item = self.items[item_id]
+        version = item.get('version', 0)
+
+        lines = None
+        if message.version is not None:
+            lines = self.changes.since(item_id, message.version, version)
+        if lines is None:
+            time_left = max(0, int((item['end_time'] - self.clock.now()).total_seconds()))
+            lines = [f"{version} STATE {item['current_price']} {item['highest_bidder'] or '-'} {time_left} "
+                     f"{'active' if item.get('active') else 'closed'}"]
+            mode = 'full'
+        else:
+            mode = 'delta'
+        header = encode_message('RESYNC_RESULT', req_num, item['name'], version, mode, len(lines))
+        return "\n".join([header, *lines])
+
+    def handle_market_stats(self, message, client_address):
+        """Handle MARKET_STATS message: the running market figures, or one seller's.
+
+        The reply is MARKET_STATS_RESULT <req#> <scope> <active> <listed>
+        <sold> <unsold> <sell_through> <mean_price> <median_price>
+        <bids_per_minute>, where scope is * or the seller's name. Prices are
+        final prices of sold auctions; the median is a P² estimate and
+        bids per minute is always the whole market's.
+        """
+        req_num = message.req_num
+        summary = self.market.summary(message.seller_name)
+        if summary is None:
+            return f"MARKET_STATS_DENIED {req_num} {message.seller_name} has not listed any items"
+        return encode_message('MARKET_STATS_RESULT', req_num, message.seller_name or "*", *summary,
+                              self.market.bids_per_minute(self.clock.now().timestamp()))
+
+    def bump_version(self, item_id, change):
+        """Advance an item's version for a change and log it; call inside snapshots.write()"""
+        item = self.items[item_id]
+        version = item['version'] = item.get('version', 0) + 1
+        self.changes.record(item_id, version, change)
+        return version
+
+    def handle_list_active(self, message, client_address):
+        """Handle LIST_ACTIVE message: one page of active auctions in ending, price or seller order"""
+        def query(snapshot):
+            item_ids, next_cursor = self.browse.page(message.sort_by, self.page_size(message.limit),
+                                                     message.cursor)
+            return self.format_search_result(message.req_num, item_ids, next_cursor, snapshot)
+        try:
+            return self.snapshots.read(query)
+        except ValueError as e:
+            return f"SEARCH_DENIED {message.req_num} {e}"
+
+    def handle_search(self, message, client_address):
+        """Handle SEARCH message: active auctions by item name prefix or exact seller name"""
+        def query(snapshot):
+            item_ids, next_cursor = self.browse.search(message.field, message.value,
+                                                       self.page_size(message.limit), message.cursor)
+            return self.format_search_result(message.req_num, item_ids, next_cursor, snapshot)
+        try:
+            return self.snapshots.read(query)
+        except ValueError as e:
+            return f"SEARCH_DENIED {message.req_num} {e}"
+
+    def handle_search_text(self, message, client_address):
+        """Handle SEARCH_TEXT message: top matches among active auction names and descriptions"""
+        def query(snapshot):
+            item_ids = self.text_index.search(message.query, self.page_size(message.limit))
+            return self.format_search_result(message.req_num, item_ids, None, snapshot)
+        return self.snapshots.read(query)
+
+    @staticmethod
+    def item_text(item):
+        """Text indexed for full-text search"""
+        return f"{item['name']} {item['description']}"
+
+    @staticmethod
+    def page_size(limit):
+        if limit is None or limit <= 0:
+            return DEFAULT_PAGE_SIZE
+        return min(limit, MAX_PAGE_SIZE)
+
+    def format_search_result(self, req_num, item_ids, next_cursor, snapshot):
+        """SEARCH_RESULT header, then one 'name price time_left seller' line per item"""
+        now = self.clock.now()
+        lines = []
+        for item_id in item_ids:
+            item = snapshot.get(item_id)
+            if item is None or not item.active:
+                continue
+            time_left = max(0, int((item.end_time - now).total_seconds()))
+            lines.append(f"{item.name} {item.current_price} {time_left} {item.seller_name}")
+        lines.insert(0, encode_message('SEARCH_RESULT', req_num, next_cursor or '-', len(lines)))
+        return "\n".join(lines)
+
+    def handle_deregistration(self, message, client_address):
+        """Handle DE-REGISTER message"""
+        name = message.name
 
         if name in self.users:
             del self.users[name]
+            self.sessions.close(name)
+            self.connections.discard(name)
             self.save_data()
-            print(f"User {name} deregistered")
+            log.info("User %s deregistered", name)
 
             return None
 
-
-# THIS ISNT WORKING PLZ FIX ME
     def handle_unsubscribe(self, message, client_address):
-        """Handle DE-REGISTER message"""
-        parts = message.split()
-
-        if len(parts) != 3:
-            return None
-
-        _, req_num, name, client_name = parts
-
+        """Handle DE-SUBSCRIBE message"""
+        name = message.item_name
+        client_name = message.client_name
 
         to_delete = None
         for key, subscription in self.subscriptions.items():
@@ -520,29 +855,23 @@ class AuctionServer:
         if to_delete is not None:
             del self.subscriptions[to_delete]
             self.save_data()
-            print(f"Subscription to {name} for {client_name} deleted")
+            log.info("Subscription to %s for %s deleted", name, client_name)
         else:
-            print(f"No subscription found for {name} and {client_name}")
+            log.debug("No subscription found for %s and %s", name, client_name)
         return None
 
     def handle_login(self, message, client_address):
         """Handle LOGIN message"""
-        parts = message.split()
-
-        # Check if we have the TCP port in the message
-        if len(parts) == 4:  # LOGIN req_num name tcp_port
-            _, req_num, name, tcp_port = parts
-            has_tcp_port = True
-        elif len(parts) == 3:  # Old format: LOGIN req_num name
-            _, req_num, name = parts
-            has_tcp_port = False
-        else:
-            return f"LOGIN-FAILED {parts[1]} Invalid format"
+        req_num = message.req_num
+        name = message.name
+        # Old clients send LOGIN req_num name without a TCP port
+        tcp_port = message.tcp_port
+        has_tcp_port = tcp_port is not None
 
         if name in self.users:
             role = self.users[name]['role']
-            # Save IP → name mapping on login
-            self.ip_to_name[client_address] = name
+            # A new session replaces any earlier one for this user
+            token = self.sessions.open(name, client_address)
 
             # Update the user's IP address to match their current connection
             self.users[name]['ip'] = client_address[0]
@@ -550,71 +879,259 @@ class AuctionServer:
             # Update TCP port if provided
             if has_tcp_port:
                 self.users[name]['tcp_port'] = tcp_port
-                print(f"Updated TCP port for {name} to {tcp_port}")
+                log.debug("Updated TCP port for %s to %s", name, tcp_port)
 
             self.save_data()
 
-            print(f"User {name} logged in successfully from {client_address[0]}")
-            return f"LOGIN_SUCCESS {req_num} role={role}"
+            log.info("User %s logged in from %s", name, client_address[0])
+            return f"LOGIN_SUCCESS {req_num} role={role} token={token}"
         else:
-            print(f"Login failed for user {name} - not found")
+            log.info("Login failed for user %s - not found", name)
             return f"LOGIN-FAILED {req_num} User not found"
 
     def run(self):
         """Run the server"""
-        print("Server running")
+        log.info("Server running")
+        self.sessions.start()
 
-        #tcp_thread = threading.Thread(target=self.tcp_listener)
-        #tcp_thread.daemon = True
-        #tcp_thread.start()
-        #self.threads.append(tcp_thread)
+        tcp_thread = threading.Thread(target=self.tcp_listener)
+        tcp_thread.daemon = True
+        tcp_thread.start()
+        self.threads.append(tcp_thread)
+
+        for _ in range(WORKERS):
+            threading.Thread(target=self.work, daemon=True).start()
 
         try:
             while True:
-                data, client_address = self.udp_socket.recvfrom(1024)
-                message = data.decode('utf-8')
-                print(f"Received from {client_address}: {message}")
-                print(f"Handling request in thread: {threading.current_thread().name}")
-
-
-                if message.startswith("REGISTER"):
-                    response = self.handle_registration(message, client_address)
-                elif message.startswith("DE-REGISTER"):
-                    response = self.handle_deregistration(message)
-                elif message.startswith("LOGIN"):
-                    response = self.handle_login(message, client_address)
-                elif message.startswith("LIST_ITEM"):
-                    response = self.handle_list_item(message, client_address)
-                elif message.startswith("SUBSCRIBE"):
-                  response = self.handle_auction_subscription(message, client_address)
-                elif message.startswith("DE-SUBSCRIBE"):
-                  response = self.handle_unsubscribe(message, client_address)
-                elif message.startswith("BID"):
-                    response = self.handle_bid(message, client_address)
-
+                size, client_address = self.udp_socket.recvfrom_into(self.recv_buffer)
+                if is_fragment(self.recv_buffer, size):
+                    # Each fragment costs its sender a token, or FRAG traffic
+                    # would go unmetered until it is reassembled
+                    if not self.admission.charge(client_address):
+                        continue
+                    request = self.reassembler.add(self.recv_view[:size].tobytes(), client_address)
+                    if request is None:
+                        continue
+                    prepaid = fragment_count(len(request))
                 else:
-                    response = None
-                    print(f"Unknown command: {message}")
-
-                if response:
-                    self.udp_socket.sendto(response.encode('utf-8'), client_address)
-                    print(f"Send to {client_address}: {response}")
+                    # The receive buffer is reused for the next datagram while
+                    # this request waits in the queue, so it takes one copy here
+                    request = self.recv_view[:size].tobytes()
+                    prepaid = 0
+
+                if log.isEnabledFor(DEBUG):
+                    log.debug("Received from %s: %s", client_address, request)
+                if self.capture is not None:
+                    self.capture.record('udp', client_address, request)
+
+                busy = self.admit(request, client_address, prepaid)
+                if busy:
+                    if self.capture is not None:
+                        self.capture.record('reply', client_address, busy)
+                    self.send_datagram(busy.encode('utf-8'), client_address)
+                    continue
+                self.requests.put(self.classify(request), (self.serve_request, (request, client_address)))
 
                 # self.handle_seller_timeout()
 
         except KeyboardInterrupt:
-            print("\n Server shutting down...")
+            log.info("Server shutting down...")
+            if self.capture is not None:
+                self.capture.close()
             self.save_data()
-            self.socket.close()
+            self.udp_socket.close()
+
+    def work(self):
+        """Worker loop: run queued requests and closures in priority order"""
+        last_report = time.monotonic()
+        while True:
+            entry = self.requests.get(timeout=QUEUE_STATS_INTERVAL)
+            if entry is not None:
+                task, args = entry[1]
+                try:
+                    task(*args)
+                except Exception:
+                    log.exception("Queued task %s failed", task.__name__)
+            if time.monotonic() - last_report >= QUEUE_STATS_INTERVAL:
+                last_report = time.monotonic()
+                log.info("Request queue times: %s", self.requests.report())
+
+    def serve_request(self, request, client_address):
+        try:
+            response = self.handle_datagram(request, client_address)
+        finally:
+            self.admission.release()
+
+        if response:
+            if self.capture is not None:
+                self.capture.record('reply', client_address, response)
+            self.send_datagram(response.encode('utf-8'), client_address)
+            log.debug("Sent to %s: %s", client_address, response)
+
+    def classify(self, request):
+        """Priority class of a request, from its command token and, for bids, the item's deadline"""
+        parts = request.split(None, 3)
+        command = parts[0] if parts else b''
+        if command in READ_COMMANDS:
+            return READ
+        if command in (b'BID', b'PROXY_BID') and len(parts) > 2:
+            item_id = self.item_ids_by_name.get(parts[2].decode('utf-8', 'replace'))
+            item = self.items.get(item_id) if item_id is not None else None
+            if item and (item['end_time'] - self.clock.now()).total_seconds() <= CLOSING_SOON:
+                return URGENT_BID
+        return WRITE
+
+    def admit(self, data, client_address, prepaid=0):
+        """Charge a request to its address and user; returns a BUSY reply if it is over budget.
+
+        prepaid is the number of fragments the request arrived in, already
+        charged to the address one by one.
+        """
+        # A batch costs one token per command line after its header (a final
+        # newline starts no command), capped at a full bucket so any batch
+        # can be admitted once the bucket has refilled
+        if data.startswith(BATCH_HEADER):
+            cost = max(1, data.count(b'\n') - data.endswith(b'\n'))
+        else:
+            cost = 1
+        reason = self.admission.admit(client_address, self.sessions.name_for(client_address), cost, prepaid)
+        if reason is None:
+            return None
+        log.info("Shed request from %s: %s", client_address, reason)
+        # Only the request number is read from a shed request
+        parts = data[:64].split(None, 2)
+        req_num = parts[1].decode('utf-8', 'replace') if len(parts) > 1 else '-'
+        return encode_message('BUSY', req_num, reason)
+
+    def handle_datagram(self, data, client_address):
+        """Parse data, one datagram's bytes, as a request and dispatch it"""
+        if data.startswith(BATCH_HEADER):
+            return self.handle_batch(data, client_address)
+        try:
+            request = parse_datagram(data)
+        except MessageError as e:
+            log.warning("Rejected message from %s: %s", client_address, e)
+            return e.reply()
+        return self.dispatch(request, client_address)
+
+    def dispatch(self, request, client_address):
+        """Route a parsed request to its handler by command token"""
+        handler = self.handlers.get(request.command)
+        if handler is None:
+            log.warning("No handler for command: %s", request.command)
+            return None
+        return handler(request, client_address)
+
+    def handle_batch(self, data, client_address):
+        """Handle a BATCH envelope: one command per line after the BATCH header.
+
+        Commands run in order with a single save_data() and one coalesced
+        push per recipient at the end. The reply is a BATCH_RESULT header
+        followed by one line per command, in the same order.
+        """
+        header, *lines = data.split(b'\n')
+        try:
+            batch = parse_datagram(header)
+        except MessageError as e:
+            log.warning("Rejected batch from %s: %s", client_address, e)
+            return None
+
+        replies = []
+        with self.batched():
+            for line in lines:
+                if not line.strip():
+                    continue
+                if line.startswith(BATCH_HEADER) or line.strip() == b'BATCH':
+                    replies.append(BATCH_NO_REPLY)
+                    continue
+                replies.append(self.handle_datagram(line, client_address) or BATCH_NO_REPLY)
+
+        log.debug("Ran batch %s of %d commands from %s", batch.req_num, len(replies), client_address)
+        return "\n".join([encode_message('BATCH_RESULT', batch.req_num, len(replies)), *replies])
+
+    @contextmanager
+    def batched(self):
+        """Defer save_data() and coalesce pushes made by this thread until the block ends"""
+        state = self.batch_state
+        state.depth = getattr(state, 'depth', 0) + 1
+        if state.depth == 1:
+            state.save_pending = False
+            state.outbox = {}
+        try:
+            yield
+        finally:
+            state.depth -= 1
+            if state.depth == 0:
+                outbox, state.outbox = state.outbox, None
+                if state.save_pending:
+                    self.save_data()
+                self.flush_outbox(outbox)
+
+    def send_push(self, message, address, coalesce_key=None):
+        """Send an unsolicited message, or queue it if this thread is running a batch.
+
+        address is a UDP address or a client's push channel. Queued
+        messages with the same coalesce_key for the same address replace
+        each other, so only the latest one is delivered.
+        """
+        outbox = getattr(self.batch_state, 'outbox', None)
+        if outbox is None:
+            if isinstance(address, PooledConnection):
+                self.send_channel(message, address)
+            else:
+                self.send_datagram(message.encode('utf-8'), address)
+            return
+        pending = outbox.setdefault(address, {})
+        if coalesce_key is None:
+            coalesce_key = len(pending)
+        pending.pop(coalesce_key, None)
+        pending[coalesce_key] = message
+
+    def flush_outbox(self, outbox):
+        """Send queued pushes as one newline-joined datagram per address where they fit"""
+        for address, pending in outbox.items():
+            if isinstance(address, PooledConnection):
+                # A stream has no size limit; one write carries them all
+                self.send_channel("\n".join(pending.values()), address)
+                continue
+            chunk = []
+            chunk_size = 0
+            for message in pending.values():
+                encoded = message.encode('utf-8')
+                if chunk and chunk_size + 1 + len(encoded) > MAX_DATAGRAM:
+                    self.send_datagram(b'\n'.join(chunk), address)
+                    chunk = []
+                    chunk_size = 0
+                chunk_size += len(encoded) + (1 if chunk else 0)
+                chunk.append(encoded)
+            if chunk:
+                self.send_datagram(b'\n'.join(chunk), address)
+
+    def send_datagram(self, payload, address):
+        """Send an encoded payload, fragmenting it if needed; socket errors are logged"""
+        try:
+            for datagram in self.fragmenter.split(payload):
+                self.udp_socket.sendto(datagram, address)
+        except OSError as e:
+            log.warning("Failed to send to %s: %s", address, e)
+
+    def send_channel(self, message, connection):
+        """Write a push to a client's channel; a broken channel is logged and dropped"""
+        try:
+            connection.send(message)
+        except OSError as e:
+            log.warning("Failed to push to %s: %s", connection.key, e)
+            connection.close()
 
     def tcp_listener(self):
         """Listen for incoming TCP connections"""
-        print(f"TCP listener started on port {self.tcp_port}")
+        log.info("TCP listener started on port %s", self.tcp_port)
 
         while True:
             try:
                 client_socket, client_address = self.tcp_socket.accept()
-                print(f"New TCP connection from {client_address}")
+                log.debug("New TCP connection from %s", client_address)
 
                 # Handle the TCP connection in a separate thread
                 client_thread = threading.Thread(target=self.handle_tcp_client, args=(client_socket, client_address))
@@ -623,88 +1140,278 @@ class AuctionServer:
                 self.threads.append(client_thread)
 
             except Exception as e:
-                print(f"Error accepting TCP connection: {e}")
+                log.error("Error accepting TCP connection: %s", e)
+
+    def capture_line(self, connection, line):
+        self.capture.record('tcp', connection.address, line)
 
     def handle_tcp_client(self, client_socket, client_address):
-        """Handle individual TCP client connections"""
+        """Authenticate a client's push channel and add it to the connection pool.
+
+        The first line must be CONNECT <req#> <name> <token> [tcp|udp], with
+        the token from the client's REGISTERED or LOGIN_SUCCESS reply; "tcp"
+        asks for BID_UPDATEs over the channel too. Deferred closure messages
+        for the user are sent as soon as the channel is up.
+        """
         try:
-            # Wait for any message from client
-            data = client_socket.recv(1024).decode('utf-8')
-            print(f"Received TCP from {client_address}: {data}")
-
-            # Process message based on type
-            if data.startswith("INFORM_Res"):
-                # Handle purchase info response
-                pass  # This is handled in handle_purchase_finalization
-            else:
-                print(f"Unknown TCP message: {data}")
+            client_socket.settimeout(HANDSHAKE_TIMEOUT)
+            # The client waits for CONNECTED before anything else, so one line is all there is
+            data = b""
+            while b"\n" not in data and len(data) < MAX_DATAGRAM:
+                chunk = client_socket.recv(MAX_DATAGRAM)
+                if not chunk:
+                    break
+                data += chunk
+            log.debug("Received TCP from %s: %s", client_address, data)
+            if self.capture is not None:
+                self.capture.record('tcp', client_address, data.strip())
+
+            try:
+                message = parse_message(data.decode('utf-8', 'replace').strip())
+                if message.command != 'CONNECT':
+                    raise MessageError(message.command, message.req_num, "Expected CONNECT")
+            except MessageError as e:
+                log.warning("Rejected TCP connection from %s: %s", client_address, e)
+                client_socket.sendall((encode_message('CONNECT-DENIED', e.req_num or '-', e.reason) + "\n").encode('utf-8'))
+                client_socket.close()
+                return
+
+            name = message.name
+            session = self.sessions.get(name)
+            if session is None or not secrets.compare_digest(session.token, message.token):
+                log.warning("Rejected push channel for %s from %s: bad token", name, client_address)
+                client_socket.sendall((encode_message('CONNECT-DENIED', message.req_num, "Invalid token") + "\n").encode('utf-8'))
+                client_socket.close()
+                return
+
+            client_socket.settimeout(None)
+            with self.deferred_lock:
+                try:
+                    self.connections.attach(name, client_address, client_socket, push_updates=message.updates == 'tcp',
+                                            greeting=encode_message('CONNECTED', message.req_num))
+                except PoolFullError as e:
+                    log.warning("Refused push channel for %s from %s: %s", name, client_address, e)
+                    client_socket.sendall((encode_message('CONNECT-DENIED', message.req_num, "Too many connections") + "\n").encode('utf-8'))
+                    client_socket.close()
+                    return
+                deferred = self.deferred.pop(name, [])
+            log.info("Push channel open for %s from %s:%s (%d deferred messages)",
+                     name, client_address[0], client_address[1], len(deferred))
+            for _, retry, args in deferred:
+                threading.Thread(target=retry, args=args, daemon=True).start()
 
         except Exception as e:
-            print(f"Error handling TCP client {client_address}: {e}")
-        finally:
+            log.error("Error handling TCP client %s: %s", client_address, e)
             client_socket.close()
 
     def handle_bid(self, message, client_address):
         """Handle BID message"""
-        parts = message.split()
-        if len(parts) != 4:
-            return f"BID_REJECTED Invalid format"
-
-        _, req_num, item_name, bid_amount = parts
-        bidder_name = self.ip_to_name.get(client_address)
+        req_num = message.req_num
+        item_name = message.item_name
+        bid_amount = message.bid_amount
+        bidder_name = self.sessions.name_for(client_address)
 
         if not bidder_name:
             return f"BID_REJECTED {req_num} User_not_registered"
+        if not math.isfinite(bid_amount):
+            return f"BID_REJECTED {req_num} Invalid_amount"
 
         # Find the item
-        item_id = next((id for id, item in self.items.items() if item['name'] == item_name), None)
+        item_id = self.item_ids_by_name.get(item_name)
         if item_id is None:
             return f"BID_REJECTED {req_num} Item_not_found"
 
-        item = self.items[item_id]
+        # The winning bid's result is an Outcome; the others get a reason
+        result = self.bid_engine.submit(item_name, bidder_name, bid_amount,
+                                        lambda bids: self.resolve_bids(item_id, bids))
+        if isinstance(result, str):
+            return f"BID_REJECTED {req_num} {result}"
+
+        log.debug("Accepted bid of %s from %s on %s", bid_amount, bidder_name, item_name)
+        self.save_data()
+        self.publish_bid(req_num, item_id, result)
 
-        # Check if auction is still active
-        if not item.get('active', True):
-            return f"BID_REJECTED {req_num} Auction_ended"
+        # The bid raised the price, but a proxy bid was still higher
+        if result.leader != bidder_name:
+            return f"BID_REJECTED {req_num} Outbid_by_proxy"
+        return f"BID_ACCEPTED {req_num} {result.version}"
 
-        # Validate bid
-        try:
-            bid_amount = float(bid_amount)
-        except ValueError:
-            return f"BID_REJECTED {req_num} Invalid_bid_amount"
+    def handle_proxy_bid(self, message, client_address):
+        """Handle PROXY_BID: bid for the user up to max_amount, one increment at a time"""
+        req_num = message.req_num
+        item_name = message.item_name
+        bidder_name = self.sessions.name_for(client_address)
 
-        if bid_amount <= item['current_price']:
-            return f"BID_REJECTED {req_num} Bid_too_low"
+        if not bidder_name:
+            return f"BID_REJECTED {req_num} User_not_registered"
+        if not math.isfinite(message.max_amount):
+            return f"BID_REJECTED {req_num} Invalid_amount"
+
+        item_id = self.item_ids_by_name.get(item_name)
+        if item_id is None:
+            return f"BID_REJECTED {req_num} Item_not_found"
 
-        # Update bid
-        item['bids'].append((bidder_name, bid_amount))
-        item['current_price'] = bid_amount
-        item['highest_bidder'] = bidder_name
+        result = self.bid_engine.submit(item_name, bidder_name, message.max_amount,
+                                        lambda bids: self.resolve_bids(item_id, bids), proxy=True)
+        if isinstance(result, str):
+            return f"BID_REJECTED {req_num} {result}"
 
-        print(f"Accepted bid of {bid_amount} from {bidder_name} on {item_name}")
+        log.debug("Proxy bid up to %s from %s on %s", message.max_amount, bidder_name, item_name)
+        # Saved even if the price did not move: the maximum has to survive a restart
         self.save_data()
+        if result.changed:
+            self.publish_bid(req_num, item_id, result)
+        return f"PROXY_ACCEPTED {req_num} {result.price} {result.leader} {result.version}"
+
+    def publish_bid(self, req_num, item_id, outcome):
+        """Send a BID_UPDATE for an item's new price to everyone subscribed but its leader"""
+        item = self.items[item_id]
+        item_name = item['name']
+        time_left = max(0, int((item['end_time'] - self.clock.now()).total_seconds()))
+        update_msg = (f"BID_UPDATE {req_num} {item_name} {outcome.price} {outcome.leader} "
+                      f"{time_left} {outcome.version}")
+
+        # A hot item's subscribers all listen on its group: one send covers them
+        if self.multicast is not None and self.multicast.group(item_name) is not None:
+            self.multicast.publish(item_name, update_msg)
+            return
 
         # Notify all subscribers
         for sub_id, sub in self.subscriptions.items():
-            if sub['name'] == item_name and sub['client_name'] != bidder_name:
+            if sub['name'] == item_name and sub['client_name'] != outcome.leader:
                 subscriber = self.users.get(sub['client_name'])
                 if subscriber:
                     try:
-                        # Calculate time left in seconds
-                        time_left = max(0, int((item['end_time'] - datetime.now()).total_seconds()))
+                        addr = self.push_target(sub['client_name'])
+                        # Within a batch only the latest update per item reaches each subscriber
+                        self.send_push(update_msg, addr, coalesce_key=('BID_UPDATE', item_name))
+                    except Exception as e:
+                        log.warning("Failed to send update to %s: %s", sub['client_name'], e)
 
-                        # Include bidder name and time left in message
-                        update_msg = f"BID_UPDATE {req_num} {item_name} {bid_amount} {bidder_name} {time_left}"
+    def resolve_bids(self, item_id, bids):
+        """Settle a batch of concurrent bids on one item.
 
-                        addr = (subscriber['ip'], int(subscriber['udp_port']))
-                        self.udp_socket.sendto(update_msg.encode('utf-8'), addr)
-                    except Exception as e:
-                        print(f"Failed to send update to {subscriber['name']}: {e}")
+        Only the highest plain bid can raise the price. Proxy bids then
+        replace their bidders' maxima, and proxy_price() settles the
+        competition between all standing maxima in one step, so the batch
+        makes at most one change to the item however many bids it holds.
+        """
+        item = self.items[item_id]
 
-        return f"BID_ACCEPTED {req_num}"
+        # Check if auction is still active; its closure may still be queued
+        if not item.get('active', True) or self.clock.now() >= item['end_time']:
+            for bid in bids:
+                bid.result = "Auction_ended"
+            return
 
+        for bid in bids:
+            bid.result = "Bid_too_low"
+        price, leader = item['current_price'], item.get('highest_bidder')
+        placed = []
 
-if __name__ == "__main__":
-    server = AuctionServer()
-    server.run()
+        plain = [bid for bid in bids if not bid.proxy]
+        best = best_bid(plain) if plain else None
+        if best is not None and best.amount > price:
+            price, leader = best.amount, best.bidder
+            placed.append((best.bidder, best.amount))
+        else:
+            best = None
+
+        proxies = dict(item.get('proxies', {}))
+        accepted = []
+        for bid in bids:
+            if bid.proxy and bid.amount > price and bid.amount > proxies.get(bid.bidder, 0):
+                # A raised maximum counts from when it was raised, so it loses ties
+                proxies.pop(bid.bidder, None)
+                proxies[bid.bidder] = bid.amount
+                accepted.append(bid)
+        if best is None and not accepted:
+            return
+
+        new_price, new_leader = proxy_price(proxies, price, leader, self.bid_increment)
+        if (new_price, new_leader) != (price, leader):
+            placed.append((new_leader, new_price))
+        # A maximum the price has reached can never bid again
+        proxies = {bidder: maximum for bidder, maximum in proxies.items()
+                   if maximum > new_price or bidder == new_leader}
+
+        version = item.get('version', 0)
+        with self.snapshots.write(self.items) as changed:
+            if proxies:
+                item['proxies'] = proxies
+            else:
+                item.pop('proxies', None)
+            if placed:
+                item['bids'].extend(placed)
+                item['current_price'] = new_price
+                item['highest_bidder'] = new_leader
+                self.browse.update_price(item_id, new_price)
+                version = self.bump_version(item_id, f"BID {new_price} {new_leader}")
+                changed.add(item_id)
+        if placed:
+            self.market.bid(self.clock.now().timestamp(), len(placed))
+
+        # The plain bid, or else the first proxy, reports the change for the batch
+        announcer = best or accepted[0]
+        for bid in ([best] if best else []) + accepted:
+            bid.result = Outcome(version, new_price, new_leader, bool(placed) and bid is announcer)
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Auction server")
+    parser.add_argument("--udp-port", type=int, default=5000)
+    parser.add_argument("--tcp-port", type=int, default=5001)
+    parser.add_argument("--data", default="server_data.json", help="file the server state is saved to")
+    parser.add_argument("--cluster", help="every node's UDP address as host:port,host:port,...")
+    parser.add_argument("--node", help="this node's address as it appears in --cluster")
+    parser.add_argument("--replication-port", type=int, help="serve the replication log to standbys on this TCP port")
+    parser.add_argument("--standby", help="follow the primary's replication log at host:port and take over when it stops")
+    parser.add_argument("--failover-timeout", type=float, default=FAILOVER_TIMEOUT,
+                        help="seconds without a heartbeat before a standby takes over")
+    parser.add_argument("--address-rate", type=float, default=ADDRESS_RATE,
+                        help="requests per second allowed from one address (bursts of twice that)")
+    parser.add_argument("--user-rate", type=float, default=USER_RATE,
+                        help="requests per second allowed from one user (bursts of twice that)")
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT,
+                        help="requests admitted but not yet finished before BUSY is returned")
+    parser.add_argument("--capture", metavar="PATH",
+                        help="record every request, push channel line and reply to PATH for replay.py")
+    parser.add_argument("--bid-increment", type=float, default=BID_INCREMENT,
+                        help="step proxy bids raise the price by")
+    parser.add_argument("--multicast", action="store_true",
+                        help="send BID_UPDATEs for items with many subscribers to a multicast group")
+    parser.add_argument("--multicast-threshold", type=int, default=HOT_SUBSCRIBERS,
+                        help="subscribers an item needs before it gets a multicast group")
+    parser.add_argument("--multicast-interface", default=INTERFACE,
+                        help="address of the interface multicast updates are sent from")
+    args = parser.parse_args()
+
+    cluster = parse_nodes(args.cluster) if args.cluster else None
+    node = parse_nodes(args.node)[0] if args.node else None
+    if cluster and node not in cluster:
+        parser.error("--node must be one of the --cluster addresses")
+
+    setup_logging()
+    try:
+        standby = None
+        if args.standby:
+            standby = ReplicationStandby(parse_nodes(args.standby)[0], args.failover_timeout)
+            standby.follow()
+            write_json(args.data, standby.to_data())
+
+        server = AuctionServer(udp_port=args.udp_port, tcp_port=args.tcp_port, data_file=args.data,
+                               cluster=cluster, node=node, replication_port=args.replication_port,
+                               admission=Admission(args.address_rate, 2 * args.address_rate, args.user_rate,
+                                                   2 * args.user_rate, args.max_in_flight),
+                               multicast=MulticastPublisher(args.multicast_interface, args.multicast_threshold)
+                               if args.multicast else None,
+                               bid_increment=args.bid_increment,
+                               capture=CaptureWriter(args.capture) if args.capture else None)
+        server.resume_auctions()
+        if standby is not None:
+            log.warning("Promoted to primary at seq %d, %.2fs after the last word from the old primary "
+                        "(replication lag last %.1f ms, max %.1f ms)", standby.seq,
+                        time.monotonic() - standby.last_heard,
+                        standby.lag * 1000, standby.max_lag * 1000)
+        server.run()
+    finally:
+        shutdown_logging()
@@ -0,0 +1,140 @@
+import threading
+import time
+
+# An entry not refreshed for this long is reported as stale (it may still be current:
+# an auction nobody bids on sends no updates)
+STALE_AFTER = 30.0
+# Pushes carry whole seconds left, rounded down, so a cached deadline can be
+# up to a second early; a bid is only rejected as late this long after it
+DEADLINE_GRACE = 2.0
+
+
+class CachedItem:
+    """What the client last heard about one subscribed item"""
+    __slots__ = ('price', 'leader', 'deadline', 'version', 'active', 'updated')
+
+    def __init__(self, price, leader, deadline, version, active=True):
+        self.price = price
+        self.leader = leader
+        self.deadline = deadline
+        self.version = version
+        self.active = active
+        self.updated = time.monotonic()
+
+    def remaining(self, now=None):
+        """Seconds until the cached deadline; negative once it has passed"""
+        return self.deadline - (now if now is not None else time.monotonic())
+
+    def time_left(self, now=None):
+        return max(0, int(self.remaining(now)))
+
+
+class AuctionCache:
+    """Client-side view of subscribed items, kept current from server pushes.
+
+    Prices only rise and closed auctions stay closed, so a bid the cache
+    finds too low, or for an auction it saw close, is certain to be
+    rejected by the server even if the entry is out of date; check_bid()
+    rejects those locally. The cached deadline is only as exact as the
+    whole seconds pushes carry, so a bid counts as late only DEADLINE_GRACE
+    seconds after it. Anything else still goes to the server, which has
+    the final word.
+    """
+
+    def __init__(self):
+        self.items = {}
+        self.hits = 0
+        self.misses = 0
+        self.local_rejects = 0
+        # Bids the cache let through that the server then found too low:
+        # updates the cache had not seen yet
+        self.stale_passes = 0
+        self._lock = threading.Lock()
+
+    def announce(self, item_name, price, time_left, version):
+        with self._lock:
+            entry = self.items.get(item_name)
+            if entry is not None and entry.version > version:
+                return
+            self.items[item_name] = CachedItem(price, entry.leader if entry else None,
+                                               time.monotonic() + time_left, version)
+
+    def update(self, item_name, amount, leader, version, time_left=None):
+        """Apply a bid on an item; older versions than the cached one are ignored"""
+        with self._lock:
+            entry = self.items.get(item_name)
+            if entry is None or entry.version >= version:
+                return
+            entry.price = amount
+            entry.leader = leader
+            entry.version = version
+            if time_left is not None:
+                entry.deadline = time.monotonic() + time_left
+            entry.updated = time.monotonic()
+
+    def close(self, item_name, version):
+        with self._lock:
+            entry = self.items.get(item_name)
+            if entry is not None and entry.version < version:
+                entry.active = False
+                entry.version = version
+                entry.updated = time.monotonic()
+
+    def apply_resync(self, item_name, lines):
+        """Apply the change lines of a RESYNC_RESULT (see AuctionServer.handle_resync)"""
+        for line in lines:
+            parts = line.split()
+            if len(parts) < 4:
+                continue
+            version, kind = int(parts[0]), parts[1]
+            if kind == "BID":
+                self.update(item_name, float(parts[2]), parts[3], version)
+            elif kind == "CLOSED":
+                self.close(item_name, version)
+            elif kind == "STATE" and len(parts) >= 6:
+                with self._lock:
+                    entry = self.items.get(item_name)
+                    if entry is None or entry.version > version:
+                        continue
+                    entry.price = float(parts[2])
+                    entry.leader = None if parts[3] == "-" else parts[3]
+                    entry.deadline = time.monotonic() + int(parts[4])
+                    entry.active = parts[5] == "active"
+                    entry.version = version
+                    entry.updated = time.monotonic()
+
+    def forget(self, item_name):
+        with self._lock:
+            self.items.pop(item_name, None)
+
+    def check_bid(self, item_name, amount):
+        """Reason the server would reject this bid, or None if it has to be sent"""
+        entry = self.items.get(item_name)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if not entry.active or entry.remaining() < -DEADLINE_GRACE:
+            reason = "Auction_ended"
+        elif amount <= entry.price:
+            reason = "Bid_too_low"
+        else:
+            return None
+        self.local_rejects += 1
+        return reason
+
+    def bid_rejected(self, reason):
+        """Note a server rejection of a bid the cache had let through"""
+        if reason.startswith("Bid_too_low"):
+            self.stale_passes += 1
+
+    def stats(self):
+        checks = self.hits + self.misses
+        now = time.monotonic()
+        return {
+            'items': len(self.items),
+            'stale': sum(1 for entry in self.items.values() if now - entry.updated > STALE_AFTER),
+            'hit_rate': round(self.hits / checks, 3) if checks else 0.0,
+            'local_rejects': self.local_rejects,
+            'stale_passes': self.stale_passes,
+        }
@@ -0,0 +1,123 @@
+import threading
+from typing import NamedTuple, Optional
+
+# Items are spread over this many lock stripes; bids on items in different
+# stripes never touch the same lock
+SHARDS = 64
+# Step a proxy bid raises the price by over the best competing bid
+BID_INCREMENT = 1.0
+# Result of every bid left unresolved when resolve() raised for its batch
+RESOLVE_FAILED = "Server_error"
+
+
+class Bid:
+    """One bid waiting to be resolved; result is set by whichever thread resolves its batch.
+
+    A proxy bid's amount is the most its bidder will pay rather than a price.
+    """
+    __slots__ = ('bidder', 'amount', 'proxy', 'result')
+
+    def __init__(self, bidder, amount, proxy=False):
+        self.bidder = bidder
+        self.amount = amount
+        self.proxy = proxy
+        self.result = None
+
+
+class Outcome(NamedTuple):
+    """Where an accepted bid left its item.
+
+    Of the bids in a batch that changed the item, exactly one has changed
+    set; its handler saves and announces the change for the whole batch.
+    """
+    version: int
+    price: float
+    leader: Optional[str]
+    changed: bool
+
+
+class BidEngine:
+    """Resolve bids per item under striped locks, draining concurrent bids as one batch.
+
+    submit() queues a bid on its item and then takes the item's stripe
+    lock. The first thread through drains every bid queued for that item
+    and hands the whole batch to resolve() in one call; the other threads
+    find their result already set when they get the lock and return
+    without touching the item. A hot item therefore costs one
+    check-then-update per batch rather than one per bid.
+    """
+
+    def __init__(self, shards=SHARDS):
+        self.shards = shards
+        self._queue_locks = [threading.Lock() for _ in range(shards)]
+        self._item_locks = [threading.RLock() for _ in range(shards)]
+        self._pending = {}
+        self.batches = 0
+        self.resolved = 0
+
+    def lock_for(self, key):
+        """Lock that serializes every change to the item with this key"""
+        return self._item_locks[hash(key) % self.shards]
+
+    def submit(self, key, bidder, amount, resolve, proxy=False):
+        """Queue a bid on key and return its result once its batch is resolved.
+
+        resolve(bids) is called with the item's lock held and must set
+        result on every bid in the list. If it raises, the exception goes
+        to the thread that called it and every other bid in the batch gets
+        RESOLVE_FAILED.
+        """
+        bid = Bid(bidder, amount, proxy)
+        index = hash(key) % self.shards
+        with self._queue_locks[index]:
+            self._pending.setdefault(key, []).append(bid)
+        with self._item_locks[index]:
+            if bid.result is None:
+                with self._queue_locks[index]:
+                    batch = self._pending.pop(key)
+                try:
+                    resolve(batch)
+                finally:
+                    for queued in batch:
+                        if queued.result is None:
+                            queued.result = RESOLVE_FAILED
+                self.batches += 1
+                self.resolved += len(batch)
+        return bid.result
+
+
+def best_bid(bids):
+    """The highest bid in a batch; the earliest one wins a tie"""
+    best = bids[0]
+    for bid in bids[1:]:
+        if bid.amount > best.amount:
+            best = bid
+    return best
+
+
+def proxy_price(proxies, price, leader, increment=BID_INCREMENT):
+    """Where competing proxy bids leave an item, as (price, leader).
+
+    proxies maps each bidder to their maximum, in the order they were
+    placed; price and leader are the standing bid. The highest maximum
+    leads (the earliest on a tie) and pays one increment over the best
+    competing maximum or the standing price, but never more than its own
+    maximum. However many proxies compete, this is one step: the rounds of
+    outbidding they would have gone through are skipped.
+    """
+    top = None
+    for bidder, maximum in proxies.items():
+        if top is None or maximum > proxies[top]:
+            top = bidder
+    if top is None:
+        return price, leader
+    rival = max((maximum for bidder, maximum in proxies.items() if bidder != top), default=None)
+    if top == leader:
+        # Already winning: only a rival proxy above the price pushes it up
+        if rival is None or rival <= price:
+            return price, leader
+        return max(price, round(min(proxies[top], rival + increment), 2)), leader
+    if proxies[top] <= price:
+        return price, leader
+    floor = price if rival is None else max(price, rival)
+    return round(min(proxies[top], floor + increment), 2), top
@@ -0,0 +1,91 @@
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+
+from utils.logger import get_logger, redact
+
+log = get_logger("capture")
+
+# Seconds between flushes of the capture file
+FLUSH_INTERVAL = 1.0
+# Version of the capture format, written in the header line
+CAPTURE_FORMAT = 1
+
+
+def format_peer(address):
+    return f"{address[0]}:{address[1]}"
+
+
+def parse_peer(text):
+    host, _, port = text.rpartition(":")
+    return host, int(port)
+
+
+class CaptureWriter:
+    """Record server traffic to a JSON-lines capture file for replay.py.
+
+    The first line is a header; each later line is one record:
+    {"t": seconds since the capture started, "kind": "udp" | "tcp" |
+    "reply", "peer": "host:port", "data": text}. "udp" is a request as it
+    arrived (after reassembly), "tcp" a line read from a push channel and
+    "reply" the server's answer to a udp request. Card data is masked with
+    the logger's redact() before anything is written, so INFORM_Res lines
+    are kept without their card numbers. record() only queues the record;
+    a background thread masks, encodes and writes it, so the request path
+    pays for one queue put.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = 0
+        self._start = time.monotonic()
+        self._queue = queue.SimpleQueue()
+        self._file = open(path, 'w', encoding='utf-8')
+        self._file.write(json.dumps({'capture': CAPTURE_FORMAT, 'started': datetime.now().isoformat()}) + "\n")
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+        log.info("Capturing traffic to %s", path)
+
+    def record(self, kind, address, data):
+        """Queue one record; data is bytes or str"""
+        self._queue.put((time.monotonic() - self._start, kind, address, data))
+
+    def close(self):
+        """Write everything queued so far and close the file"""
+        self._queue.put(None)
+        self._thread.join()
+        log.info("Captured %d records to %s", self.records, self.path)
+
+    def _write_loop(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                entry = self._queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                entry = False
+            if entry is None:
+                break
+            if entry:
+                at, kind, address, data = entry
+                if isinstance(data, (bytes, bytearray)):
+                    data = data.decode('utf-8', 'replace')
+                self._file.write(json.dumps({'t': round(at, 6), 'kind': kind,
+                                             'peer': format_peer(address), 'data': redact(data)}) + "\n")
+                self.records += 1
+            if time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                self._file.flush()
+                last_flush = time.monotonic()
+        self._file.close()
+
+
+def read_capture(path):
+    """Yield the records of a capture file in order; the header is skipped"""
+    with open(path, encoding='utf-8') as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get('capture') != CAPTURE_FORMAT:
+            raise ValueError(f"{path} is not a capture file (format {CAPTURE_FORMAT})")
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
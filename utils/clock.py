@@ -0,0 +1,98 @@
+import heapq
+import itertools
+import threading
+from datetime import datetime, timedelta
+
+from utils.logger import get_logger
+
+log = get_logger("clock")
+
+# Where virtual time starts unless told otherwise; fixed so runs repeat exactly
+SIMULATION_START = datetime(2025, 1, 1)
+
+
+class SystemClock:
+    """Wall-clock time for the server.
+
+    call_at() timers are kept in one heap served by a single thread, which
+    sleeps until the earliest deadline, rather than one sleeping thread per
+    auction.
+    """
+
+    def __init__(self):
+        self._timers = []
+        self._seq = itertools.count()
+        self._wake = threading.Condition()
+        self._thread = None
+
+    def now(self):
+        return datetime.now()
+
+    def call_at(self, when, callback, *args):
+        """Run callback(*args) on the timer thread once now() reaches when"""
+        with self._wake:
+            heapq.heappush(self._timers, (when, next(self._seq), callback, args))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._wake.notify()
+
+    def _run(self):
+        while True:
+            with self._wake:
+                while True:
+                    delay = (self._timers[0][0] - self.now()).total_seconds() if self._timers else None
+                    if delay is not None and delay <= 0:
+                        break
+                    # A new, earlier timer wakes us up early
+                    self._wake.wait(delay)
+                _, _, callback, args = heapq.heappop(self._timers)
+            try:
+                callback(*args)
+            except Exception:
+                log.exception("Timer %s failed", callback.__name__)
+
+
+class VirtualClock:
+    """Simulated time that stands still until advanced.
+
+    advance() and advance_to() jump forward, running each call_at() timer
+    that comes due on the caller's thread with now() set to the timer's
+    own deadline. Timers due at the same moment run in the order they were
+    set, so a run driven from one thread is fully deterministic.
+    """
+
+    def __init__(self, start=SIMULATION_START):
+        self._now = start
+        self._timers = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def now(self):
+        return self._now
+
+    def call_at(self, when, callback, *args):
+        with self._lock:
+            heapq.heappush(self._timers, (when, next(self._seq), callback, args))
+
+    def next_timer(self):
+        """Deadline of the earliest pending timer, or None"""
+        with self._lock:
+            return self._timers[0][0] if self._timers else None
+
+    def advance(self, seconds):
+        return self.advance_to(self._now + timedelta(seconds=seconds))
+
+    def advance_to(self, when):
+        """Move time forward to when, running timers due by then; returns how many ran"""
+        ran = 0
+        while True:
+            with self._lock:
+                if not self._timers or self._timers[0][0] > when:
+                    break
+                due, _, callback, args = heapq.heappop(self._timers)
+                self._now = max(self._now, due)
+            callback(*args)
+            ran += 1
+        self._now = max(self._now, when)
+        return ran
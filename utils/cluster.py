@@ -0,0 +1,74 @@
+import hashlib
+import socket
+from bisect import bisect_right
+
+# Virtual points per node on the ring; more points spread item names more evenly
+REPLICAS = 64
+
+# Commands that carry an item name, and the token it is in; these go to
+# the node that owns the name
+ITEM_COMMANDS = {"LIST_ITEM": 2, "BID": 2, "PROXY_BID": 2, "SUBSCRIBE": 2, "DE-SUBSCRIBE": 2, "RESYNC": 2}
+# User commands every node must see, since any node may serve the user's items
+BROADCAST_COMMANDS = frozenset({"REGISTER", "LOGIN", "DE-REGISTER"})
+# Read-only queries that are asked of every node and merged by the caller
+SCATTER_COMMANDS = frozenset({"LIST_ACTIVE", "SEARCH", "SEARCH_TEXT", "MARKET_STATS"})
+
+
+def _point(key):
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+def parse_nodes(spec):
+    """Parse 'host:port,host:port' into a list of (host, port) addresses"""
+    nodes = []
+    for entry in spec.split(","):
+        host, _, port = entry.strip().rpartition(":")
+        nodes.append((host or "127.0.0.1", int(port)))
+    return nodes
+
+
+def normalize_node(address):
+    """A node address with its host resolved to an IP, so every side names a node the same way"""
+    host, port = address
+    return socket.gethostbyname(host), int(port)
+
+
+def node_name(address):
+    return f"{address[0]}:{address[1]}"
+
+
+class HashRing:
+    """Consistent hash ring assigning item names to cluster nodes.
+
+    Each node is placed at REPLICAS points; a name belongs to the first
+    node point at or after the name's own hash. Adding or removing a node
+    only moves the names in the ranges next to its points.
+    """
+
+    def __init__(self, nodes, replicas=REPLICAS):
+        # The ring is hashed from node names: "localhost" and "127.0.0.1" must agree
+        self.nodes = [normalize_node(node) for node in nodes]
+        if not self.nodes:
+            raise ValueError("a cluster needs at least one node")
+        ring = sorted((_point(f"{node_name(node)}#{i}"), node) for node in self.nodes for i in range(replicas))
+        self._points = [point for point, _ in ring]
+        self._owners = [node for _, node in ring]
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def node_for(self, key):
+        index = bisect_right(self._points, _point(key))
+        return self._owners[index % len(self._owners)]
+
+    def route(self, message):
+        """Return the nodes a wire message must be sent to"""
+        parts = message.split(None, 3)
+        command = parts[0] if parts else ""
+        position = ITEM_COMMANDS.get(command)
+        if position is not None and len(parts) > position:
+            return [self.node_for(parts[position])]
+        if command in BROADCAST_COMMANDS or command in SCATTER_COMMANDS:
+            return list(self.nodes)
+        # Anything else has no item to route by; the first node answers it
+        return [self.nodes[0]]
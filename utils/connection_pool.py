@@ -0,0 +1,226 @@
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+from utils.logger import get_logger
+
+log = get_logger("connections")
+
+# Push channels kept open at once; past this, a channel idle for
+# IDLE_TIMEOUT seconds makes room for a new one, or the new one is refused
+MAX_CONNECTIONS = 256
+IDLE_TIMEOUT = 300.0
+
+
+class PoolFullError(ConnectionError):
+    """Raised by attach() when the pool already holds max_connections channels"""
+
+
+class PooledConnection:
+    """One long-lived TCP connection to a client, carrying newline-framed messages.
+
+    A reader thread owns the receiving side: replies that carry a request
+    number are handed to whichever thread is waiting on that number, so
+    several closures can share the connection at once. The connection is
+    marked dead as soon as the reader sees it close or fail.
+    """
+
+    def __init__(self, key, address, sock, push_updates=False, on_close=None, on_line=None):
+        self.key = key
+        self.address = address
+        # Whether the client asked for BID_UPDATEs here instead of over UDP
+        self.push_updates = push_updates
+        self.alive = True
+        self.last_used = time.monotonic()
+        self._sock = sock
+        self._on_close = on_close
+        # Sees every line the client sends, before it is delivered
+        self._on_line = on_line
+        self._send_lock = threading.Lock()
+        self._waiting = {}
+        self._waiting_lock = threading.Lock()
+        threading.Thread(target=self._read_loop, daemon=True).start()
+
+    @property
+    def busy(self):
+        """True while some thread is waiting for a reply on this connection"""
+        return bool(self._waiting)
+
+    def send(self, message):
+        if not self.alive:
+            raise ConnectionError(f"connection to {self.key} is closed")
+        with self._send_lock:
+            self._sock.sendall((message + "\n").encode('utf-8'))
+        self.last_used = time.monotonic()
+
+    def request(self, message, req_num, timeout=None):
+        """Send message and wait for the reply whose second token is req_num.
+
+        Raises socket.timeout if no reply arrives in time and
+        ConnectionError if the connection drops while waiting.
+        """
+        slot = [threading.Event(), None]
+        with self._waiting_lock:
+            self._waiting[str(req_num)] = slot
+        try:
+            self.send(message)
+            if not slot[0].wait(timeout):
+                raise socket.timeout(f"no reply to {req_num} from {self.key}")
+        finally:
+            with self._waiting_lock:
+                self._waiting.pop(str(req_num), None)
+        if slot[1] is None:
+            raise ConnectionError(f"connection to {self.key} closed while waiting for {req_num}")
+        self.last_used = time.monotonic()
+        return slot[1]
+
+    def close(self):
+        self.alive = False
+        try:
+            # shutdown() wakes the reader thread blocked in recv()
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self._sock.close()
+        except OSError:
+            pass
+
+    def _read_loop(self):
+        pending = b""
+        try:
+            while True:
+                data = self._sock.recv(4096)
+                if not data:
+                    break
+                *lines, pending = (pending + data).split(b"\n")
+                if lines:
+                    self.last_used = time.monotonic()
+                for line in lines:
+                    line = line.decode('utf-8', 'replace').strip()
+                    if self._on_line is not None:
+                        self._on_line(self, line)
+                    self._deliver(line)
+        except OSError:
+            pass
+        finally:
+            self.alive = False
+            with self._waiting_lock:
+                waiting = list(self._waiting.values())
+            # Wake every waiter; a None reply tells it the connection is gone
+            for slot in waiting:
+                slot[0].set()
+            log.debug("Connection to %s closed", self.key)
+            if self._on_close is not None:
+                self._on_close(self)
+
+    def _deliver(self, line):
+        parts = line.split(None, 2)
+        if len(parts) < 2:
+            return
+        with self._waiting_lock:
+            slot = self._waiting.get(parts[1])
+        if slot is None:
+            log.warning("Unexpected message from %s: %s", self.key, parts[0])
+            return
+        slot[1] = line
+        slot[0].set()
+
+
+class ConnectionPool:
+    """Keyed registry of client push channels (user name -> PooledConnection).
+
+    Clients open the channel to the server's TCP port after logging in,
+    so the server never connects out to them (which fails behind NAT).
+    attach() replaces any older channel of the same user. When the pool
+    holds max_connections channels, the least recently used channel makes
+    room for a new user's if nothing has been sent or received on it for
+    idle_timeout seconds; it is sent idle_notice first, so its client knows
+    why it closed. Otherwise the new channel is refused with PoolFullError.
+    A channel drops out of the pool as soon as its reader sees it close.
+    """
+
+    def __init__(self, max_connections=MAX_CONNECTIONS, on_line=None, idle_timeout=IDLE_TIMEOUT, idle_notice=None):
+        self.max_connections = max_connections
+        self.on_line = on_line
+        self.idle_timeout = idle_timeout
+        self.idle_notice = idle_notice
+        self.attached = 0
+        self.reused = 0
+        self.evicted = 0
+        self._connections = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._connections)
+
+    def __contains__(self, key):
+        return self.get(key, touch=False) is not None
+
+    def attach(self, key, address, sock, push_updates=False, greeting=None):
+        """Adopt an authenticated client socket as key's push channel.
+
+        greeting, if given, is sent on sock before the channel is in the
+        pool, so it is the first line the client reads. Raises PoolFullError
+        (and leaves sock alone) if the pool is full and no channel is idle.
+        """
+        idle = None
+        with self._lock:
+            if key not in self._connections and len(self._connections) >= self.max_connections:
+                idle = min(self._connections.values(), key=lambda connection: connection.last_used)
+                if time.monotonic() - idle.last_used < self.idle_timeout:
+                    raise PoolFullError(f"{len(self._connections)} push channels open, none idle")
+                del self._connections[idle.key]
+                self.evicted += 1
+            if greeting is not None:
+                sock.sendall((greeting + "\n").encode('utf-8'))
+            connection = PooledConnection(key, address, sock, push_updates, on_close=self._closed, on_line=self.on_line)
+            previous = self._connections.pop(key, None)
+            self._connections[key] = connection
+            self.attached += 1
+        if previous is not None:
+            previous.close()
+        if idle is not None:
+            log.info("Closed idle push channel of %s to make room for %s", idle.key, key)
+            self._close_idle(idle)
+        log.debug("Attached push channel for %s from %s:%s", key, *address)
+        return connection
+
+    def get(self, key, touch=True):
+        """Return key's live push channel, or None if the user has none open"""
+        with self._lock:
+            connection = self._connections.get(key)
+            if connection is None or not connection.alive:
+                return None
+            if touch:
+                self._connections.move_to_end(key)
+                self.reused += 1
+            return connection
+
+    def discard(self, key):
+        with self._lock:
+            connection = self._connections.pop(key, None)
+        if connection is not None:
+            connection.close()
+
+    def close_all(self):
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for connection in connections:
+            connection.close()
+
+    def _close_idle(self, connection):
+        if self.idle_notice is not None:
+            try:
+                connection.send(self.idle_notice)
+            except OSError:
+                pass
+        connection.close()
+
+    def _closed(self, connection):
+        with self._lock:
+            # A newer channel for the same user may already have replaced it
+            if self._connections.get(connection.key) is connection:
+                del self._connections[connection.key]
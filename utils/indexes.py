@@ -0,0 +1,352 @@
+import base64
+import json
+import math
+from bisect import bisect_left, bisect_right, insort
+
+# Entries per bucket before it is split in two; keeps inserts and removals
+# at O(sqrt n) list moves instead of shifting one list of every entry
+BUCKET_SIZE = 1000
+# Names per burst-trie leaf before it bursts into child nodes
+BURST_LIMIT = 256
+
+
+class SortedIndex:
+    """Sorted list of (key, item_id) entries, stored as a list of buckets"""
+
+    def __init__(self):
+        self._buckets = []
+        self._maxes = []
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, key, item_id):
+        entry = (key, item_id)
+        self._size += 1
+        if not self._buckets:
+            self._buckets.append([entry])
+            self._maxes.append(entry)
+            return
+        pos = bisect_left(self._maxes, entry)
+        if pos == len(self._maxes):
+            pos -= 1
+            self._buckets[pos].append(entry)
+            self._maxes[pos] = entry
+        else:
+            insort(self._buckets[pos], entry)
+        bucket = self._buckets[pos]
+        if len(bucket) > BUCKET_SIZE * 2:
+            half = bucket[BUCKET_SIZE:]
+            del bucket[BUCKET_SIZE:]
+            self._buckets.insert(pos + 1, half)
+            self._maxes[pos] = bucket[-1]
+            self._maxes.insert(pos + 1, half[-1])
+
+    def load(self, entries):
+        """Replace the contents with entries, sorting once instead of inserting one by one"""
+        entries = sorted(entries)
+        self._buckets = [entries[i:i + BUCKET_SIZE] for i in range(0, len(entries), BUCKET_SIZE)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._size = len(entries)
+
+    def remove(self, key, item_id):
+        """Remove an entry; returns False if it was not in the index"""
+        entry = (key, item_id)
+        pos = bisect_left(self._maxes, entry)
+        if pos == len(self._maxes):
+            return False
+        bucket = self._buckets[pos]
+        index = bisect_left(bucket, entry)
+        if index == len(bucket) or bucket[index] != entry:
+            return False
+        del bucket[index]
+        self._size -= 1
+        if not bucket:
+            del self._buckets[pos]
+            del self._maxes[pos]
+        elif index == len(bucket):
+            self._maxes[pos] = bucket[-1]
+        return True
+
+    def update(self, old_key, new_key, item_id):
+        if self.remove(old_key, item_id):
+            self.add(new_key, item_id)
+
+    def iter_from(self, start=None, inclusive=True):
+        """Yield entries in order, starting at (or after) the start entry"""
+        if start is None:
+            pos, index = 0, 0
+        else:
+            pos = bisect_left(self._maxes, start) if inclusive else bisect_right(self._maxes, start)
+            if pos == len(self._maxes):
+                return
+            bucket = self._buckets[pos]
+            index = bisect_left(bucket, start) if inclusive else bisect_right(bucket, start)
+        buckets = self._buckets
+        while pos < len(buckets):
+            # Slice so a concurrent writer cannot shift entries under the reader
+            yield from buckets[pos][index:]
+            pos += 1
+            index = 0
+
+
+class _TrieNode:
+    __slots__ = ("children", "leaf", "name", "item_id")
+
+    def __init__(self):
+        self.children = None
+        self.leaf = []
+        # Set on a burst node whose path is itself an item name
+        self.name = None
+        self.item_id = None
+
+
+class PrefixTrie:
+    """Burst trie mapping item names to ids, iterated in name order.
+
+    Names live in sorted leaf lists until a leaf passes BURST_LIMIT, then
+    the leaf bursts into one child node per next character. This keeps the
+    node count near n / BURST_LIMIT instead of one node per character.
+    """
+
+    def __init__(self):
+        self.root = _TrieNode()
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, name, item_id):
+        node, depth = self._descend(name)
+        if node.children is None:
+            insort(node.leaf, (name, item_id))
+            if len(node.leaf) > BURST_LIMIT:
+                self._burst(node, depth)
+        else:
+            node.name = name
+            node.item_id = item_id
+        self._size += 1
+
+    def remove(self, name):
+        node, _ = self._descend(name)
+        if node.children is None:
+            index = bisect_left(node.leaf, (name,))
+            if index < len(node.leaf) and node.leaf[index][0] == name:
+                del node.leaf[index]
+                self._size -= 1
+                return True
+            return False
+        if node.name == name:
+            node.name = None
+            node.item_id = None
+            self._size -= 1
+            return True
+        return False
+
+    def iter_prefix(self, prefix, after=None):
+        """Yield (name, item_id) for names starting with prefix, in order, after the given name"""
+        node = self.root
+        depth = 0
+        while node.children is not None and depth < len(prefix):
+            node = node.children.get(prefix[depth])
+            if node is None:
+                return
+            depth += 1
+        # The walk compares the cursor character by character from this
+        # node down, so it only applies when it lies on the node's path
+        path = prefix[:depth]
+        if after is not None and not after.startswith(path):
+            if after > path:
+                return
+            after = None
+        for name, item_id in self._walk(node, depth, after):
+            if name.startswith(prefix):
+                yield name, item_id
+            elif name > prefix:
+                return
+
+    def _descend(self, name):
+        node = self.root
+        depth = 0
+        while node.children is not None and depth < len(name):
+            child = node.children.get(name[depth])
+            if child is None:
+                child = node.children[name[depth]] = _TrieNode()
+            node = child
+            depth += 1
+        return node, depth
+
+    def _burst(self, node, depth):
+        entries = node.leaf
+        node.leaf = []
+        node.children = {}
+        for name, item_id in entries:
+            if len(name) == depth:
+                node.name = name
+                node.item_id = item_id
+            else:
+                child = node.children.setdefault(name[depth], _TrieNode())
+                child.leaf.append((name, item_id))
+        for child in node.children.values():
+            if len(child.leaf) > BURST_LIMIT:
+                self._burst(child, depth + 1)
+
+    def _walk(self, node, depth, after):
+        if node.children is None:
+            leaf = node.leaf
+            start = 0 if after is None else bisect_right(leaf, (after, float("inf")))
+            yield from leaf[start:]
+            return
+        if node.name is not None and (after is None or node.name > after):
+            yield node.name, node.item_id
+        for char in sorted(node.children):
+            if after is not None and depth < len(after) and char < after[depth]:
+                continue
+            # Past the cursor's branch every name in the subtree is after it
+            child_after = after if after is not None and depth < len(after) and char == after[depth] else None
+            yield from self._walk(node.children[char], depth + 1, child_after)
+
+
+class AuctionIndex:
+    """Browse indexes over active auctions: by end time, current price, seller and name.
+
+    The server calls add() when an item is listed, update_price() when a bid
+    is accepted and remove() when the auction closes; each is O(sqrt n).
+    """
+
+    SORTS = ("ending", "price", "seller")
+    SEARCH_FIELDS = ("name", "seller")
+
+    def __init__(self):
+        self.by_end = SortedIndex()
+        self.by_price = SortedIndex()
+        self.by_seller = SortedIndex()
+        self.names = PrefixTrie()
+        # item_id -> (name, end_key, price, seller) as currently indexed
+        self._keys = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, item_id):
+        return item_id in self._keys
+
+    def add(self, item_id, name, end_time, price, seller):
+        if item_id in self._keys:
+            self.remove(item_id)
+        end_key = end_time.timestamp()
+        self._keys[item_id] = (name, end_key, price, seller)
+        self.by_end.add(end_key, item_id)
+        self.by_price.add(price, item_id)
+        self.by_seller.add((seller, end_key), item_id)
+        self.names.add(name, item_id)
+
+    def load(self, records):
+        """Rebuild every index from (item_id, name, end_time, price, seller) records"""
+        self._keys = {item_id: (name, end_time.timestamp(), price, seller)
+                      for item_id, name, end_time, price, seller in records}
+        self.by_end.load((keys[1], item_id) for item_id, keys in self._keys.items())
+        self.by_price.load((keys[2], item_id) for item_id, keys in self._keys.items())
+        self.by_seller.load(((keys[3], keys[1]), item_id) for item_id, keys in self._keys.items())
+        self.names = PrefixTrie()
+        for item_id, keys in self._keys.items():
+            self.names.add(keys[0], item_id)
+
+    def update_price(self, item_id, price):
+        keys = self._keys.get(item_id)
+        if keys is None or keys[2] == price:
+            return
+        self.by_price.update(keys[2], price, item_id)
+        self._keys[item_id] = (keys[0], keys[1], price, keys[3])
+
+    def remove(self, item_id):
+        keys = self._keys.pop(item_id, None)
+        if keys is None:
+            return
+        name, end_key, price, seller = keys
+        self.by_end.remove(end_key, item_id)
+        self.by_price.remove(price, item_id)
+        self.by_seller.remove((seller, end_key), item_id)
+        self.names.remove(name)
+
+    def page(self, sort, limit, cursor=None):
+        """Return (item_ids, next_cursor) for one page of active auctions in sort order"""
+        index = {"ending": self.by_end, "price": self.by_price, "seller": self.by_seller}.get(sort)
+        if index is None:
+            raise ValueError(f"unknown sort {sort}")
+        start = None
+        if cursor is not None:
+            kind, key, item_id = decode_cursor(cursor)
+            if kind != sort:
+                raise ValueError("cursor is for a different sort")
+            start = (tuple(key) if isinstance(key, list) else key, item_id)
+        entries = index.iter_from(start, inclusive=start is None)
+        return self._take(sort, entries, limit, lambda entry: True)
+
+    def search(self, field, value, limit, cursor=None):
+        """Return (item_ids, next_cursor) for active auctions matching a name prefix or seller"""
+        after = None
+        if cursor is not None:
+            kind, key, item_id = decode_cursor(cursor)
+            if kind != field:
+                raise ValueError("cursor is for a different search")
+            after = (tuple(key) if isinstance(key, list) else key, item_id)
+
+        if field == "name":
+            entries = self.names.iter_prefix(value, after[0] if after else None)
+            return self._take("name", entries, limit, lambda entry: True)
+        if field == "seller":
+            # (seller, -inf) sorts before every entry for that seller
+            start = after or ((value, float("-inf")), -1)
+            entries = self.by_seller.iter_from(start, inclusive=after is None)
+            return self._take("seller", entries, limit, lambda entry: entry[0][0] == value)
+        raise ValueError(f"unknown search field {field}")
+
+    @staticmethod
+    def _take(kind, entries, limit, matches):
+        page = []
+        for entry in entries:
+            if not matches(entry):
+                break
+            if len(page) == limit:
+                last = page[-1]
+                return [item_id for _, item_id in page], encode_cursor(kind, last[0], last[1])
+            page.append(entry)
+        return [item_id for _, item_id in page], None
+
+
+def encode_cursor(*values):
+    """Pack the last entry of a page into an opaque, space-free cursor token"""
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+# Cursor kind -> check of the key it carries, matching what each index sorts on
+_CURSOR_KEYS = {
+    "ending": _is_number,
+    "price": _is_number,
+    "seller": lambda key: (isinstance(key, list) and len(key) == 2 and isinstance(key[0], str)
+                           and _is_number(key[1])),
+    "name": lambda key: isinstance(key, str),
+}
+
+
+def decode_cursor(cursor):
+    """Unpack a cursor token into (kind, key, item_id); raises ValueError if it is malformed.
+
+    The token comes from the client, so its shape and types are checked
+    here: anything else would fail later inside the index comparisons.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception as e:
+        raise ValueError(f"bad cursor: {e}") from None
+    if not (isinstance(values, list) and len(values) == 3 and values[0] in _CURSOR_KEYS
+            and _CURSOR_KEYS[values[0]](values[1]) and isinstance(values[2], int)
+            and not isinstance(values[2], bool)):
+        raise ValueError("bad cursor")
+    return values
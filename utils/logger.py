@@ -0,0 +1,141 @@
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import time
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
+
+ROOT_LOGGER = "auction"
+LOG_FORMAT = "%(asctime)s %(levelname)-7s [%(threadName)s] %(name)s: %(message)s"
+
+# Card numbers and expiry dates typed into INFORM_Res must never reach a log file
+_INFORM_RES = re.compile(r"(INFORM_Res\s+\S+\s+\S+\s+)\S+(\s+)\S+")
+_CARD_KEYS = re.compile(r"""(['"]cc_(?:num|exp_date)['"]\s*:\s*)(['"]).*?\2""")
+_CARD_NUMBER = re.compile(r"\b(?:\d[ -]?){12,18}\d\b")
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+def redact(text):
+    """Mask payment card data in a log line"""
+    text = _INFORM_RES.sub(r"\1****\2**/**", text)
+    text = _CARD_KEYS.sub(r"\1\2****\2", text)
+    return _CARD_NUMBER.sub("****", text)
+
+
+class RedactingFormatter(logging.Formatter):
+    """Formatter that strips card data after formatting, on the writer thread"""
+
+    def format(self, record):
+        return redact(super().format(record))
+
+
+class RateLimitFilter(logging.Filter):
+    """Let at most `burst` identical records through per `interval` seconds.
+
+    Records are alike when they have the same logger, level and message
+    template; the arguments are not formatted, since this runs on the
+    caller's thread and formatting is left to the background writer. So a
+    busy template is limited as a whole. WARNING and above always pass.
+    """
+
+    def __init__(self, interval=5.0, burst=5, max_keys=1024):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.max_keys = max_keys
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.msg, record.levelno)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                if window is None and len(self._windows) >= self.max_keys:
+                    self._windows.clear()
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} (suppressed {suppressed} similar messages)"
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the background writer"""
+
+    def prepare(self, record):
+        # The stock handler formats here, on the caller's thread; callers pass
+        # immutable args, so the record can be formatted later as-is.
+        return record
+
+
+def get_logger(name):
+    """Return the logger for one component of the auction system"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def setup_logging(level=None, path=None, stream=None, rate_interval=5.0, rate_burst=5):
+    """Route all auction loggers through a queue drained by a background writer thread.
+
+    `level` and `path` default to the AUCTION_LOG_LEVEL and AUCTION_LOG_FILE
+    environment variables. Calling this again replaces the previous setup.
+    """
+    global _listener
+
+    level = level or os.environ.get("AUCTION_LOG_LEVEL", "INFO")
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+    path = path or os.environ.get("AUCTION_LOG_FILE")
+
+    if path:
+        output = logging.FileHandler(path, encoding="utf-8")
+    else:
+        output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(RedactingFormatter(LOG_FORMAT))
+
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+
+        log_queue = queue.SimpleQueue()
+        handler = _DeferredQueueHandler(log_queue)
+        handler.addFilter(RateLimitFilter(rate_interval, rate_burst))
+
+        root = logging.getLogger(ROOT_LOGGER)
+        for old in list(root.handlers):
+            root.removeHandler(old)
+        root.addHandler(handler)
+        root.setLevel(level)
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, output)
+        _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """Flush queued records and stop the background writer"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+            _listener = None
@@ -0,0 +1,209 @@
+import threading
+from bisect import insort
+
+# Quantile of final prices the sketches estimate (the median)
+PRICE_QUANTILE = 0.5
+# Seconds of bids the bids-per-minute figure counts, in one-second slots
+RATE_WINDOW = 60
+# Key of the market-wide record in to_dict(); no user name is empty
+MARKET = ""
+
+
+class QuantileSketch:
+    """Running estimate of one quantile in constant space (the P² algorithm).
+
+    Five markers track the minimum, the quantile, the maximum and two
+    points between; each add() moves at most three of them, adjusting their
+    heights with a parabolic (or, failing that, linear) fit. The first five
+    values are kept exactly.
+    """
+
+    def __init__(self, p=PRICE_QUANTILE):
+        self.p = p
+        self.count = 0
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+
+    def add(self, x):
+        self.count += 1
+        q, n = self.heights, self.positions
+        if self.count <= 5:
+            insort(q, x)
+            return
+        if x < q[0]:
+            q[0] = x
+            cell = 0
+        elif x >= q[4]:
+            q[4] = x
+            cell = 3
+        else:
+            cell = next(i for i in range(4) if q[i] <= x < q[i + 1])
+        for i in range(cell + 1, 5):
+            n[i] += 1
+        p = self.p
+        for i, step in enumerate((0, p / 2, p, (1 + p) / 2, 1)):
+            self.desired[i] += step
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                    (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def value(self):
+        if not self.count:
+            return 0.0
+        if self.count <= 5:
+            return self.heights[round(self.p * (self.count - 1))]
+        return self.heights[2]
+
+    def to_dict(self):
+        return {'p': self.p, 'count': self.count, 'heights': self.heights,
+                'positions': self.positions, 'desired': self.desired}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data.get('p', PRICE_QUANTILE))
+        sketch.count = data.get('count', 0)
+        sketch.heights = list(data.get('heights', []))
+        sketch.positions = list(data.get('positions', sketch.positions))
+        sketch.desired = list(data.get('desired', sketch.desired))
+        return sketch
+
+
+class Tally:
+    """Listing and sale counts and final prices, for the market or one seller"""
+    __slots__ = ('listed', 'sold', 'unsold', 'revenue', 'prices')
+
+    def __init__(self):
+        self.listed = 0
+        self.sold = 0
+        self.unsold = 0
+        self.revenue = 0.0
+        self.prices = QuantileSketch()
+
+    @property
+    def active(self):
+        return self.listed - self.sold - self.unsold
+
+    def summary(self):
+        """(active, listed, sold, unsold, sell-through, mean price, median price)"""
+        closed = self.sold + self.unsold
+        return (self.active, self.listed, self.sold, self.unsold,
+                round(self.sold / closed, 4) if closed else 0.0,
+                round(self.revenue / self.sold, 2) if self.sold else 0.0,
+                round(self.prices.value(), 2))
+
+    def to_dict(self):
+        return {'listed': self.listed, 'sold': self.sold, 'unsold': self.unsold,
+                'revenue': self.revenue, 'prices': self.prices.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data):
+        tally = cls()
+        tally.listed = data.get('listed', 0)
+        tally.sold = data.get('sold', 0)
+        tally.unsold = data.get('unsold', 0)
+        tally.revenue = data.get('revenue', 0.0)
+        tally.prices = QuantileSketch.from_dict(data.get('prices', {}))
+        return tally
+
+
+class MarketStats:
+    """Market statistics kept up to date by the server's list, bid and close events.
+
+    Each event updates the market tally, its seller's tally and (for bids)
+    a ring of one-second slots in O(1), so MARKET_STATS never walks the
+    items or their bids. to_dict() gives one record per seller plus the
+    market under MARKET, which is saved and replicated with the state.
+    """
+
+    def __init__(self):
+        self.market = Tally()
+        self.sellers = {}
+        self.bids = 0
+        self._slots = [0] * RATE_WINDOW
+        self._seconds = [0] * RATE_WINDOW
+        self._lock = threading.Lock()
+
+    def _tallies(self, seller):
+        """The market's tally and seller's; an unknown (empty) seller counts towards the market only"""
+        if not seller:
+            return (self.market,)
+        tally = self.sellers.get(seller)
+        if tally is None:
+            tally = self.sellers[seller] = Tally()
+        return self.market, tally
+
+    def listed(self, seller):
+        with self._lock:
+            for tally in self._tallies(seller):
+                tally.listed += 1
+
+    def bid(self, now, count=1):
+        """count bids were placed at now (epoch seconds)"""
+        second = int(now)
+        slot = second % RATE_WINDOW
+        with self._lock:
+            self.bids += count
+            if self._seconds[slot] != second:
+                self._seconds[slot] = second
+                self._slots[slot] = 0
+            self._slots[slot] += count
+
+    def closed(self, seller, price=None):
+        """An auction of seller's ended; price is None if it did not sell"""
+        with self._lock:
+            for tally in self._tallies(seller):
+                if price is None:
+                    tally.unsold += 1
+                else:
+                    tally.sold += 1
+                    tally.revenue += price
+                    tally.prices.add(price)
+
+    def bids_per_minute(self, now):
+        """Bids placed in the RATE_WINDOW seconds up to now, scaled to a minute"""
+        second = int(now)
+        with self._lock:
+            recent = sum(count for count, at in zip(self._slots, self._seconds) if second - RATE_WINDOW < at <= second)
+        return round(recent * 60 / RATE_WINDOW)
+
+    def summary(self, seller=None):
+        """The market's Tally.summary(), or seller's; None for a seller who never listed"""
+        with self._lock:
+            tally = self.market if seller is None else self.sellers.get(seller)
+            return tally.summary() if tally is not None else None
+
+    def to_dict(self):
+        with self._lock:
+            records = {name: tally.to_dict() for name, tally in self.sellers.items()}
+            records[MARKET] = {**self.market.to_dict(), 'bids': self.bids,
+                               'slots': list(self._slots), 'seconds': list(self._seconds)}
+        return records
+
+    def load(self, records):
+        market = dict(records.get(MARKET, {}))
+        with self._lock:
+            self.market = Tally.from_dict(market)
+            self.bids = market.get('bids', 0)
+            if len(market.get('slots', ())) == RATE_WINDOW:
+                self._slots = list(market['slots'])
+                self._seconds = list(market['seconds'])
+            self.sellers = {name: Tally.from_dict(record) for name, record in records.items() if name != MARKET}
+
+    def rebuild(self, items):
+        """Count the items of a state saved without statistics; bid times are not known"""
+        for item in items.values():
+            # Items saved before sellers were recorded by name have none
+            seller = item.get('seller_name')
+            self.listed(seller)
+            self.bids += len(item.get('bids', ()))
+            if not item.get('active', True):
+                self.closed(seller, item['current_price'] if item.get('highest_bidder') else None)
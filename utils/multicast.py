@@ -0,0 +1,131 @@
+import hashlib
+import socket
+import threading
+
+from utils.logger import get_logger
+
+log = get_logger("multicast")
+
+# An item gets its own group once it has this many subscribers
+HOT_SUBSCRIBERS = 8
+# Every group uses this port; receivers bind the group address to keep groups apart
+MULTICAST_PORT = 5100
+# Administratively scoped range (239.0.0.0/8); a hash of node and item picks the last two octets
+GROUP_PREFIX = "239.255"
+# Interface updates are sent from and groups joined on; loopback keeps tests local
+INTERFACE = "127.0.0.1"
+
+
+def group_for(node, item_name):
+    """Multicast group (address, port) of the item item_name served by node (host, port).
+
+    Item ids repeat across cluster nodes, so the group is hashed from the
+    node and the item's name instead. Two items can still share a group;
+    receivers drop updates for items other than the one they joined for.
+    """
+    digest = hashlib.md5(f"{node[0]}:{node[1]}/{item_name}".encode("utf-8")).digest()
+    return f"{GROUP_PREFIX}.{digest[0]}.{digest[1]}", MULTICAST_PORT
+
+
+def format_group(group):
+    return f"{group[0]}:{group[1]}"
+
+
+def parse_group(text):
+    host, _, port = text.rpartition(":")
+    return host, int(port)
+
+
+class MulticastPublisher:
+    """Sends each BID_UPDATE for a hot item once, to the item's group.
+
+    Updates end with the item's version, so a receiver that sees a jump
+    knows it missed some and can RESYNC.
+    """
+
+    def __init__(self, interface=INTERFACE, threshold=HOT_SUBSCRIBERS, ttl=1):
+        self.threshold = threshold
+        self.groups = {}
+        self.sent = 0
+        self._lock = threading.Lock()
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        self._sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+        self._sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+
+    def group(self, item_name):
+        """The item's group, or None while it is not hot"""
+        return self.groups.get(item_name)
+
+    def promote(self, item_name, node):
+        """Give an item of node's its group; returns the group"""
+        with self._lock:
+            group = self.groups.setdefault(item_name, group_for(node, item_name))
+        log.info("Item %s is hot; updates go to group %s", item_name, format_group(group))
+        return group
+
+    def drop(self, item_name):
+        with self._lock:
+            self.groups.pop(item_name, None)
+
+    def publish(self, item_name, message):
+        """Send message to the item's group"""
+        try:
+            self._sock.sendto(message.encode('utf-8'), self.groups[item_name])
+            self.sent += 1
+        except (KeyError, OSError) as e:
+            log.warning("Failed to send to group of %s: %r", item_name, e)
+
+
+class MulticastReceiver:
+    """Joins item groups and passes each new update on.
+
+    Updates naming another item (one whose group hashed to the same
+    address) are dropped. Versions go through the tracker (see
+    utils/versions.py), which drops duplicates and reports gaps;
+    on_message(item_name, text) gets the rest.
+    """
+
+    def __init__(self, on_message, tracker, interface=INTERFACE):
+        self.on_message = on_message
+        self.tracker = tracker
+        self.interface = interface
+        self._sockets = {}
+
+    def join(self, item_name, group):
+        if item_name in self._sockets:
+            return
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(group)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                        socket.inet_aton(group[0]) + socket.inet_aton(self.interface))
+        self._sockets[item_name] = sock
+        threading.Thread(target=self._listen, args=(item_name, sock), daemon=True).start()
+
+    def leave(self, item_name):
+        sock = self._sockets.pop(item_name, None)
+        if sock is not None:
+            sock.close()
+
+    def close(self):
+        for item_name in list(self._sockets):
+            self.leave(item_name)
+
+    def _listen(self, item_name, sock):
+        while True:
+            try:
+                data = sock.recv(65535)
+            except OSError:
+                return
+            text = data.decode('utf-8', 'replace')
+            parts = text.split()
+            # BID_UPDATE <req#> <item> ... <version>
+            if len(parts) < 4 or parts[2] != item_name:
+                continue
+            try:
+                version = int(parts[-1])
+            except ValueError:
+                continue
+            if self.tracker.accept(item_name, version):
+                self.on_message(item_name, text)
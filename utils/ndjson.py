@@ -0,0 +1,248 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+from datetime import datetime
+
+# Characters read from a file at a time
+READ_SIZE = 1 << 16
+# Records per list from read_chunks()
+CHUNK_SIZE = 10000
+# Version of the export format, written in the header line
+EXPORT_FORMAT = 1
+# Sections of the saved state that are exported, and the record type of each
+SECTIONS = {"users": "user", "items": "item", "subscriptions": "subscription"}
+
+_WHITESPACE = re.compile(r"\s*")
+_STRUCTURE = re.compile(r'["{}\[\]]')
+_STRING_END = re.compile(r'(?:[^"\\]|\\.)*"', re.S)
+
+
+class StateReader:
+    """Read the top level of a saved server state file one record at a time.
+
+    The file is one JSON object of sections, each an object of records.
+    sections() yields (section, key, value) without ever holding more than
+    the current record and a read buffer in memory; sections not asked for
+    are skipped by scanning, not decoded.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.f.read(READ_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError(f"expected {char!r} at offset {self.pos} of the read buffer")
+        self.pos += 1
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def _skip(self):
+        """Move past one value without decoding it"""
+        if self._peek() not in "{[":
+            self._value()
+            return
+        depth = 0
+        while True:
+            match = _STRUCTURE.search(self.buffer, self.pos)
+            if match is None:
+                self.pos = len(self.buffer)
+                if not self._fill():
+                    raise ValueError("state file ends inside a value")
+                continue
+            self.pos = match.end()
+            char = match.group()
+            if char == '"':
+                while True:
+                    end = _STRING_END.match(self.buffer, self.pos)
+                    if end is not None:
+                        self.pos = end.end()
+                        break
+                    if not self._fill():
+                        raise ValueError("state file ends inside a string")
+            elif char in "{[":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def _members(self):
+        """Keys of the object starting here; the caller reads or skips each value"""
+        self._expect("{")
+        if self._peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(":")
+            yield key
+            if self._peek() == ",":
+                self.pos += 1
+                continue
+            self._expect("}")
+            return
+
+    def sections(self, wanted=tuple(SECTIONS)):
+        remaining = set(wanted)
+        for section in self._members():
+            if section not in remaining:
+                self._skip()
+                continue
+            remaining.discard(section)
+            for key in self._members():
+                yield section, key, self._value()
+            if not remaining:
+                return
+
+
+def export_state(data_file, out):
+    """Write the saved state in data_file to out as NDJSON; returns records written per type.
+
+    A header line comes first, then users, items and subscriptions as the
+    file holds them. Each item is followed by one "bid" line per bid
+    instead of carrying its bid list.
+    """
+    counts = dict.fromkeys(("user", "item", "bid", "subscription"), 0)
+    out.write(json.dumps({'type': 'header', 'format': EXPORT_FORMAT,
+                          'exported': datetime.now().isoformat(), 'source': data_file}) + "\n")
+    with open(data_file, encoding='utf-8') as f:
+        for section, key, value in StateReader(f).sections():
+            kind = SECTIONS[section]
+            if kind == 'user':
+                record = {'type': kind, 'name': key, **value}
+            elif kind == 'item':
+                bids = value.pop('bids', [])
+                record = {'type': kind, 'id': int(key), **value}
+            else:
+                record = {'type': kind, 'id': key, **value}
+            out.write(json.dumps(record) + "\n")
+            counts[kind] += 1
+            if kind == 'item':
+                for bidder, amount in bids:
+                    out.write(json.dumps({'type': 'bid', 'item': int(key), 'bidder': bidder, 'amount': amount}) + "\n")
+                counts['bid'] += len(bids)
+    return counts
+
+
+def read_records(path):
+    """Yield the records of an export one at a time; the header is checked and skipped"""
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get('type') == 'header':
+                if record.get('format') != EXPORT_FORMAT:
+                    raise ValueError(f"{path}: unsupported export format {record.get('format')}")
+                continue
+            record['line'] = number
+            yield record
+
+
+def read_chunks(path, size=CHUNK_SIZE):
+    """Yield the records of an export in lists of up to size"""
+    chunk = []
+    for record in read_records(path):
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_state(path, data_file):
+    """Build a server state file from an export; returns records read per type.
+
+    Sections are streamed to temporary files and joined at the end, so
+    memory holds one item (with its bids) at a time however large the
+    export is, and nothing goes through the server. Bid lines must follow
+    their item. The text index and market statistics are not written; the
+    server rebuilds them from the items on its first start.
+    """
+    counts = dict.fromkeys(("user", "item", "bid", "subscription"), 0)
+    directory = os.path.dirname(os.path.abspath(data_file))
+    parts = {section: tempfile.TemporaryFile('w+', encoding='utf-8', dir=directory) for section in SECTIONS}
+    written = dict.fromkeys(SECTIONS, 0)
+
+    def write(section, key, value):
+        f = parts[section]
+        f.write(("," if written[section] else "") + "\n  " + json.dumps(str(key)) + ": " + json.dumps(value))
+        written[section] += 1
+
+    item_id = item = None
+    try:
+        for record in read_records(path):
+            kind = record.pop('type', None)
+            line = record.pop('line')
+            if kind == 'bid':
+                if item is None or record.get('item') != item_id:
+                    raise ValueError(f"line {line}: bid for item {record.get('item')} does not follow that item")
+                item['bids'].append([record['bidder'], record['amount']])
+            else:
+                if item is not None:
+                    write('items', item_id, item)
+                    item_id = item = None
+                if kind == 'user':
+                    write('users', record.pop('name'), record)
+                elif kind == 'item':
+                    item_id = record.pop('id')
+                    item = {**record, 'bids': []}
+                elif kind == 'subscription':
+                    write('subscriptions', record.pop('id'), record)
+                else:
+                    raise ValueError(f"line {line}: unknown record type {kind!r}")
+            counts[kind] += 1
+        if item is not None:
+            write('items', item_id, item)
+
+        tmp = data_file + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as out:
+            out.write("{")
+            for n, section in enumerate(SECTIONS):
+                out.write(("," if n else "") + "\n" + json.dumps(section) + ": {")
+                parts[section].seek(0)
+                shutil.copyfileobj(parts[section], out)
+                out.write("\n}")
+            out.write("\n}\n")
+        os.replace(tmp, data_file)
+    finally:
+        for f in parts.values():
+            f.close()
+    return counts
@@ -1,26 +1,212 @@
-from dataclasses import dataclass, asdict
-from typing import Any, Dict
+from dataclasses import make_dataclass, field as dc_field
+from typing import Any, Dict, Optional
 import json
+import os
 
-### --- UTILITY FUNCTIONS --- ###
+# Every protocol message is declared once, in configs/messages.json. Each entry
+# lists its fields in wire order as [name, kind]; kind is one of str, int,
+# float or text (the rest of the line, spaces included). A trailing "?" marks
+# an optional field. Request entries also name the reply used to deny them.
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "configs", "messages.json")
+
+_CONVERTERS = {"int": int, "float": float}
+_TYPES = {"str": str, "int": int, "float": float, "text": str}
+
+
+class MessageError(ValueError):
+    """Raised when a datagram does not match its message schema"""
+
+    def __init__(self, command, req_num, reason):
+        super().__init__(f"{command or '<empty>'}: {reason}")
+        self.command = command
+        self.req_num = req_num
+        self.reason = reason
+
+    def reply(self) -> Optional[str]:
+        """Return the denial message for this error, or None if the command has none"""
+        cls = MESSAGES.get(self.command)
+        if cls is None or cls.denied is None:
+            return None
+        return f"{cls.denied} {self.req_num or '-'} {self.reason}"
+
+
+class Message:
+    """Base class for the generated message types"""
+    __slots__ = ()
+
+    command = None
+    denied = None
+    field_names = ()
+
+    def encode(self) -> str:
+        """Encode the message in its space-separated wire form"""
+        values = [self.command]
+        for name in self.field_names:
+            value = getattr(self, name)
+            if value is not None:
+                values.append(str(value))
+        return " ".join(values)
+
+
+def _make_message_class(command: str, spec: Dict[str, Any]) -> type:
+    fields = []
+    for name, kind in spec["fields"]:
+        optional = kind.endswith("?")
+        kind = kind.rstrip("?")
+        fields.append((name, kind, optional))
+
+    columns = []
+    for name, kind, optional in fields:
+        if optional:
+            columns.append((name, Optional[_TYPES[kind]], dc_field(default=None)))
+        else:
+            columns.append((name, _TYPES[kind]))
+
+    cls = make_dataclass(spec["class"], columns, bases=(Message,), slots=True)
+    cls.command = command
+    cls.denied = spec.get("denied")
+    cls.field_names = tuple(name for name, _, _ in fields)
+
+    cls.from_parts = _make_parser(cls, command, fields)
+    cls.from_buffer = _make_buffer_parser(cls, command, fields)
+    return cls
+
+
+def _count_check(fields):
+    """Condition on `count` (tokens, command included) that is true for a malformed message"""
+    total = len(fields)
+    required = sum(1 for _, _, optional in fields if not optional)
+    if fields and fields[-1][1] == "text":
+        return f"count < {total}"
+    if required == total:
+        return f"count != {total + 1}"
+    return f"count < {required + 1} or count > {total + 1}"
+
+
+def _decoder_source(name, fields, raw):
+    """Source of a straight-line decoder from split tokens to a message.
 
-def parse_message(json_str: str) -> Any:
-    """Parses a JSON string and returns the corresponding message object."""
-    try:
-        data = json.loads(json_str)
-        if "Register" in data:
-            return Register.from_dict(data["Register"])
-        elif "Deregister" in data:
-            return Deregister.from_dict(data["Deregister"])
-        elif "Register-Denied" in data:
-            return RegisterDenied.from_dict(data["Register-Denied"])
-        elif "List_Item" in data:
-            return ListItem.from_dict(data["List_Item"])
+    A message whose fields are all required is unpacked in one step, which
+    also checks its length; others check the token count first. Either way
+    the instance is filled in slot by slot rather than through the
+    dataclass __init__. raw is True for byte tokens, whose str and text
+    fields are decoded one by one. Any ValueError (wrong count, bad number,
+    bad UTF-8) falls through to the except clause the caller appends.
+    """
+    fixed = not any(optional for _, _, optional in fields) and not (fields and fields[-1][1] == "text")
+    join = "b' '.join" if raw else "' '.join"
+    lines = [f"def {name}(parts):", "    try:"]
+    if fixed:
+        targets = ", ".join(["_"] + [f"f_{field}" for field, _, _ in fields])
+        lines.append(f"        {targets}, = parts")
+    else:
+        lines.append("        count = len(parts)")
+        lines.append(f"        if {_count_check(fields)}:")
+        lines.append("            raise ValueError")
+    lines.append("        message = _new(cls)")
+    for index, (field, kind, optional) in enumerate(fields, start=1):
+        token = f"f_{field}" if fixed else f"parts[{index}]"
+        if kind == "text":
+            value = f"{join}(parts[{index}:])"
         else:
-            raise ValueError("Unsupported message type.")
-    except Exception as e:
-        raise ValueError(f"Failed to parse message: {e}")
+            value = token
+        if kind in ("str", "text") and raw:
+            value = f"{value}.decode('utf-8')"
+        elif kind in ("int", "float"):
+            value = f"_{kind}({value})"
+        if optional and kind != "text":
+            value = f"({value} if count > {index} else None)"
+        lines.append(f"        message.{field} = {value}")
+    lines.append("        return message")
+    lines.append("    except ValueError:")
+    return "\n".join(lines) + "\n"
+
+
+def _make_parser(cls, command, fields):
+    """Generate the parser for the str tokens of a whole line (command included).
+
+    A well-formed message costs one unpack or length check and its
+    conversions; a malformed one raises the MessageError its reply is built from.
+    """
+    source = _decoder_source("from_parts", fields, raw=False) + "        raise _error(parts) from None\n"
+    source += (
+        "def _error(parts):\n"
+        "    count = len(parts)\n"
+        f"    if {_count_check(fields)}:\n"
+        "        return MessageError(command, parts[1] if count > 1 else None, 'Invalid format')\n"
+        "    return _conversion_error(command, fields, parts)\n"
+    )
+    namespace = {"cls": cls, "command": command, "fields": fields, "MessageError": MessageError,
+                 "_conversion_error": _conversion_error, "_new": object.__new__, "_int": int, "_float": float}
+    exec(source, namespace)
+    return staticmethod(namespace["from_parts"])
+
+
+def _make_buffer_parser(cls, command, fields):
+    """Generate a parser for the byte tokens of a datagram.
+
+    Numeric fields are converted straight from bytes and only str/text
+    fields are decoded, so the datagram is never decoded as a whole.
+    Anything irregular (bad numbers, bad UTF-8, wrong token count) falls
+    back to from_parts on the decoded tokens so errors read exactly the same.
+    """
+    source = (_decoder_source("from_buffer", fields, raw=True) +
+              "        return cls.from_parts([part.decode('utf-8', 'replace') for part in parts])\n")
+    namespace = {"cls": cls, "_new": object.__new__, "_int": int, "_float": float}
+    exec(source, namespace)
+    return staticmethod(namespace["from_buffer"])
+
+
+def _conversion_error(command, fields, parts):
+    """Build the error for the first field whose token does not convert"""
+    for index, (name, kind, _) in enumerate(fields, start=1):
+        if kind in ("int", "float") and index < len(parts):
+            try:
+                _CONVERTERS[kind](parts[index])
+            except ValueError:
+                return MessageError(command, parts[1], f"Invalid {name}")
+    return MessageError(command, parts[1], "Invalid format")
+
+
+def load_schema(path: str = SCHEMA_PATH) -> Dict[str, type]:
+    """Generate a message class for every command declared in the schema file"""
+    with open(path, "r") as f:
+        schema = json.load(f)
+    return {command: _make_message_class(command, spec) for command, spec in schema.items()}
+
+
+MESSAGES: Dict[str, type] = load_schema()
+MESSAGES_BY_TOKEN: Dict[bytes, type] = {command.encode("utf-8"): cls for command, cls in MESSAGES.items()}
+# Command token -> generated parser, so a parse is one lookup and one call
+_DECODERS = {command: cls.from_parts for command, cls in MESSAGES.items()}
+
+
+### --- UTILITY FUNCTIONS --- ###
+
+def parse_message(text: str) -> Message:
+    """Parse a wire message into its generated message class"""
+    parts = text.split()
+    decoder = _DECODERS.get(parts[0]) if parts else None
+    if decoder is None:
+        raise MessageError(parts[0] if parts else None, None, "Unknown command")
+    return decoder(parts)
+
+
+def encode_message(command: str, *values: Any) -> str:
+    """Encode a message from positional field values"""
+    return MESSAGES[command](*values).encode()
+
+
+def parse_datagram(data: bytes) -> Message:
+    """Parse one datagram's bytes without decoding the whole datagram.
 
-def is_message_complete(message: Any) -> bool:
-    """Checks whether all fields in a message are set (i.e., not 'None')."""
-    return message.is_complete()
+    data is split as bytes where it is, and only the fields are decoded;
+    the caller copies the datagram out of its receive buffer once, and
+    per-field memoryview slices were measured slower than that in CPython.
+    """
+    parts = data.split()
+    cls = MESSAGES_BY_TOKEN.get(parts[0]) if parts else None
+    if cls is None:
+        raise MessageError(parts[0].decode("utf-8", "replace") if parts else None, None, "Unknown command")
+    return cls.from_buffer(parts)
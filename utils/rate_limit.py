@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Requests per second and burst size allowed from one address and from one user
+ADDRESS_RATE = 100.0
+ADDRESS_BURST = 200
+USER_RATE = 50.0
+USER_BURST = 100
+# Requests admitted but not yet finished, across all clients
+MAX_IN_FLIGHT = 64
+# Buckets tracked per limiter, and seconds before an unused bucket is dropped
+MAX_KEYS = 4096
+IDLE_TIMEOUT = 60.0
+
+
+class _Bucket:
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class RateLimiter:
+    """Token buckets keyed by client, in bounded memory.
+
+    Buckets live in an OrderedDict kept in least-recently-used order, so
+    idle buckets are expired from the front and, past max_keys, the least
+    recently used one is evicted. An evicted or expired bucket comes back
+    full, which is the same state it would have refilled to anyway.
+    """
+
+    def __init__(self, rate, burst, max_keys=MAX_KEYS, idle_timeout=IDLE_TIMEOUT):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.idle_timeout = idle_timeout
+        self._buckets = OrderedDict()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def allow(self, key, cost=1, now=None):
+        """Take cost tokens from key's bucket; returns False if it does not have them.
+
+        A cost above the burst is charged as a full bucket, so a large
+        request waits for a full bucket instead of never fitting.
+        """
+        cost = min(cost, self.burst)
+        if now is None:
+            now = time.monotonic()
+        buckets = self._buckets
+        bucket = buckets.get(key)
+        if bucket is None:
+            self._expire(now)
+            if len(buckets) >= self.max_keys:
+                buckets.popitem(last=False)
+            bucket = buckets[key] = _Bucket(self.burst, now)
+        else:
+            buckets.move_to_end(key)
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+        if bucket.tokens < cost:
+            return False
+        bucket.tokens -= cost
+        return True
+
+    def _expire(self, now):
+        buckets = self._buckets
+        while buckets:
+            bucket = next(iter(buckets.values()))
+            if now - bucket.updated < self.idle_timeout:
+                break
+            buckets.popitem(last=False)
+
+
+class Admission:
+    """Admission control in front of dispatch: per-address and per-user buckets plus a global in-flight budget"""
+
+    def __init__(self, address_rate=ADDRESS_RATE, address_burst=ADDRESS_BURST, user_rate=USER_RATE,
+                 user_burst=USER_BURST, max_in_flight=MAX_IN_FLIGHT):
+        self.addresses = RateLimiter(address_rate, address_burst)
+        self.users = RateLimiter(user_rate, user_burst)
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.rejected = {}
+        self._lock = threading.Lock()
+
+    def admit(self, address, user=None, cost=1, prepaid=0):
+        """Return None and count the request as in flight, or the reason it is rejected.
+
+        prepaid is what the address was already charged for the request's
+        fragments (see charge()); it counts towards the address's share.
+        """
+        now = time.monotonic()
+        address_cost = max(1, min(cost, self.addresses.burst) - prepaid)
+        with self._lock:
+            if self.in_flight >= self.max_in_flight:
+                reason = "Server_overloaded"
+            elif not self.addresses.allow(address, address_cost, now):
+                reason = "Too_many_requests"
+            elif user is not None and not self.users.allow(user, cost, now):
+                reason = "Too_many_requests"
+            else:
+                self.in_flight += 1
+                return None
+            self.rejected[reason] = self.rejected.get(reason, 0) + 1
+            return reason
+
+    def charge(self, address, cost=1):
+        """Take cost tokens from address's bucket for traffic that is not a request yet (fragments)"""
+        with self._lock:
+            if self.addresses.allow(address, cost):
+                return True
+            self.rejected["Too_many_fragments"] = self.rejected.get("Too_many_fragments", 0) + 1
+            return False
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
@@ -0,0 +1,199 @@
+import json
+import queue
+import socket
+import threading
+import time
+
+from utils.logger import get_logger
+
+log = get_logger("replication")
+
+# Sections of the saved server state that are shipped to standbys; the
+# browse and text indexes are derived from items and rebuilt on promotion
+SECTIONS = ("users", "items", "subscriptions", "sessions", "market_stats")
+# Seconds between heartbeats from the primary
+HEARTBEAT_INTERVAL = 0.5
+# Seconds without any line from the primary before a standby takes over
+FAILOVER_TIMEOUT = 2.0
+
+
+class ReplicationPrimary:
+    """Ship the server's state changes to standbys as a stream of JSON lines.
+
+    A standby that connects first gets a snapshot line with every record,
+    then one change line per record that differs from the last published
+    state, plus a heartbeat line every HEARTBEAT_INTERVAL seconds. Each
+    standby has its own queue and sender thread, so a slow standby never
+    blocks the request path.
+    """
+
+    def __init__(self, host='0.0.0.0', port=5002, heartbeat=HEARTBEAT_INTERVAL):
+        self.address = (host, port)
+        self.heartbeat = heartbeat
+        self.seq = 0
+        self._records = {section: {} for section in SECTIONS}
+        self._standbys = []
+        self._lock = threading.Lock()
+        self._running = False
+        self._socket = None
+
+    def start(self):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(self.address)
+        self._socket.listen(5)
+        self.address = (self.address[0], self._socket.getsockname()[1])
+        self._running = True
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        threading.Thread(target=self._heartbeat_loop, daemon=True).start()
+        log.info("Replication log served on TCP port %d", self.address[1])
+
+    def close(self):
+        self._running = False
+        if self._socket is not None:
+            self._socket.close()
+        with self._lock:
+            for standby in self._standbys:
+                standby.put(None)
+            self._standbys = []
+
+    def publish(self, data):
+        """Queue a change line for every record in data that differs from the last call"""
+        now = time.time()
+        lines = []
+        with self._lock:
+            for section in SECTIONS:
+                records = self._records[section]
+                current = {str(key): json.dumps(value) for key, value in data.get(section, {}).items()}
+                for key, encoded in current.items():
+                    if records.get(key) != encoded:
+                        lines.append(self._change(now, section, key, encoded))
+                for key in records.keys() - current.keys():
+                    lines.append(self._change(now, section, key, "null"))
+                self._records[section] = current
+            if lines:
+                payload = "".join(lines).encode('utf-8')
+                for standby in self._standbys:
+                    standby.put(payload)
+
+    def _change(self, now, section, key, encoded):
+        self.seq += 1
+        return (f'{{"type":"change","seq":{self.seq},"time":{now},"section":"{section}",'
+                f'"key":{json.dumps(key)},"value":{encoded}}}\n')
+
+    def _snapshot(self):
+        state = ",".join(
+            f'"{section}":{{' + ",".join(f"{json.dumps(key)}:{encoded}" for key, encoded in records.items()) + "}"
+            for section, records in self._records.items())
+        return f'{{"type":"snapshot","seq":{self.seq},"time":{time.time()},"state":{{{state}}}}}\n'
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                conn, address = self._socket.accept()
+            except OSError:
+                break
+            outbox = queue.Queue()
+            with self._lock:
+                # Taken under the lock so no change falls between snapshot and stream
+                outbox.put(self._snapshot().encode('utf-8'))
+                self._standbys.append(outbox)
+            log.info("Standby %s connected at seq %d", address, self.seq)
+            threading.Thread(target=self._send_loop, args=(conn, address, outbox), daemon=True).start()
+
+    def _send_loop(self, conn, address, outbox):
+        try:
+            while True:
+                payload = outbox.get()
+                if payload is None:
+                    break
+                conn.sendall(payload)
+        except OSError as e:
+            log.warning("Standby %s disconnected: %s", address, e)
+        finally:
+            with self._lock:
+                if outbox in self._standbys:
+                    self._standbys.remove(outbox)
+            conn.close()
+
+    def _heartbeat_loop(self):
+        while self._running:
+            time.sleep(self.heartbeat)
+            with self._lock:
+                payload = f'{{"type":"heartbeat","seq":{self.seq},"time":{time.time()}}}\n'.encode('utf-8')
+                for standby in self._standbys:
+                    standby.put(payload)
+
+
+class ReplicationStandby:
+    """Follow a primary's replication stream into an in-memory copy of its state.
+
+    follow() returns once the primary has been silent for failover_timeout
+    seconds (after at least one snapshot was received); the caller then
+    promotes this process using to_data().
+    """
+
+    def __init__(self, primary, failover_timeout=FAILOVER_TIMEOUT):
+        self.primary = primary
+        self.failover_timeout = failover_timeout
+        self.state = {section: {} for section in SECTIONS}
+        self.seq = 0
+        self.synced = False
+        self.applied = 0
+        self.last_heard = None
+        # Seconds between a change being published and applied here
+        self.lag = 0.0
+        self.max_lag = 0.0
+
+    def follow(self):
+        """Apply the primary's stream until it goes silent; returns the seconds since it was last heard"""
+        while True:
+            try:
+                with socket.create_connection(self.primary, timeout=self.failover_timeout) as conn:
+                    log.info("Following primary %s:%d", *self.primary)
+                    self._read(conn)
+            except OSError as e:
+                log.debug("Primary %s:%d unreachable: %s", self.primary[0], self.primary[1], e)
+            if self.synced and time.monotonic() - self.last_heard >= self.failover_timeout:
+                silence = time.monotonic() - self.last_heard
+                log.warning("No word from primary for %.2fs at seq %d; taking over", silence, self.seq)
+                return silence
+            time.sleep(min(0.1, self.failover_timeout / 10))
+
+    def _read(self, conn):
+        conn.settimeout(self.failover_timeout / 4)
+        pending = b""
+        while True:
+            try:
+                data = conn.recv(65536)
+            except socket.timeout:
+                if self.synced and time.monotonic() - self.last_heard >= self.failover_timeout:
+                    return
+                continue
+            if not data:
+                return
+            self.last_heard = time.monotonic()
+            *lines, pending = (pending + data).split(b"\n")
+            for line in lines:
+                self.apply(json.loads(line))
+
+    def apply(self, entry):
+        kind = entry["type"]
+        if kind == "snapshot":
+            self.state = {section: dict(entry["state"].get(section, {})) for section in SECTIONS}
+            self.synced = True
+            log.info("Received snapshot at seq %d", entry["seq"])
+        elif kind == "change":
+            records = self.state[entry["section"]]
+            if entry["value"] is None:
+                records.pop(entry["key"], None)
+            else:
+                records[entry["key"]] = entry["value"]
+            self.applied += 1
+            self.lag = max(0.0, time.time() - entry["time"])
+            self.max_lag = max(self.max_lag, self.lag)
+        self.seq = entry["seq"]
+
+    def to_data(self):
+        """The replicated state in the server's saved-data layout"""
+        return dict(self.state)
@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import deque
+
+# Priority classes, most urgent first
+URGENT_BID = 0
+CLOSURE = 1
+WRITE = 2
+READ = 3
+CLASS_NAMES = ("urgent_bid", "closure", "write", "read")
+
+# A queued request older than this (seconds) is served ahead of more
+# urgent classes, so a steady stream of urgent work cannot starve the rest
+MAX_WAIT = (None, 0.5, 1.0, 2.0)
+
+
+class ClassStats:
+    """Queue-time metrics for one priority class"""
+    __slots__ = ('served', 'aged', 'total_wait', 'max_wait', 'depth')
+
+    def __init__(self):
+        self.served = 0
+        self.aged = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.depth = 0
+
+    def as_dict(self):
+        return {
+            'served': self.served,
+            'aged': self.aged,
+            'depth': self.depth,
+            'avg_wait_ms': round(self.total_wait / self.served * 1000, 3) if self.served else 0.0,
+            'max_wait_ms': round(self.max_wait * 1000, 3),
+        }
+
+
+class PriorityRequestQueue:
+    """FIFO queue per priority class; get() serves the most urgent class first.
+
+    Before falling back to strict priority, get() serves the head of any
+    class that has waited longer than that class's MAX_WAIT, checking the
+    classes in priority order.
+    """
+
+    def __init__(self, max_wait=MAX_WAIT):
+        self.max_wait = max_wait
+        self._queues = [deque() for _ in CLASS_NAMES]
+        self.stats = [ClassStats() for _ in CLASS_NAMES]
+        self._ready = threading.Condition()
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def put(self, priority, task):
+        with self._ready:
+            self._queues[priority].append((time.monotonic(), task))
+            self.stats[priority].depth += 1
+            self._size += 1
+            self._ready.notify()
+
+    def get(self, timeout=None):
+        """Return the next (priority, task), or None if nothing arrived within timeout"""
+        with self._ready:
+            if not self._size and not self._ready.wait_for(lambda: self._size, timeout):
+                return None
+            now = time.monotonic()
+            chosen = None
+            for priority, queue in enumerate(self._queues):
+                limit = self.max_wait[priority]
+                if queue and limit is not None and now - queue[0][0] > limit:
+                    chosen = priority
+                    self.stats[priority].aged += 1
+                    break
+            if chosen is None:
+                chosen = next(priority for priority, queue in enumerate(self._queues) if queue)
+            queued_at, task = self._queues[chosen].popleft()
+            self._size -= 1
+            stats = self.stats[chosen]
+            stats.depth -= 1
+            stats.served += 1
+            wait = now - queued_at
+            stats.total_wait += wait
+            if wait > stats.max_wait:
+                stats.max_wait = wait
+            return chosen, task
+
+    def report(self):
+        """Queue-time metrics per class name"""
+        with self._ready:
+            return {name: stats.as_dict() for name, stats in zip(CLASS_NAMES, self.stats)}
@@ -0,0 +1,189 @@
+import math
+import secrets
+import threading
+import time
+
+from utils.logger import get_logger
+
+log = get_logger("sessions")
+
+# Seconds a session lives without a request or HEARTBEAT from its client
+SESSION_TTL = 90.0
+# Seconds between a client's HEARTBEATs; three can be lost before the session expires
+HEARTBEAT_INTERVAL = 30.0
+# Resolution of expiry: the timing wheel turns one slot per tick
+WHEEL_TICK = 1.0
+# Sessions kept at once; past this the one due to expire soonest is dropped
+MAX_SESSIONS = 100000
+
+
+class Session:
+    """One logged-in user: the token they were issued and the address they send from"""
+    __slots__ = ('name', 'token', 'address', 'last_seen')
+
+    def __init__(self, name, token, address):
+        self.name = name
+        self.token = token
+        self.address = address
+        self.last_seen = time.monotonic()
+
+
+class SessionTable:
+    """Sessions issued at REGISTER and LOGIN, expired after SESSION_TTL idle seconds.
+
+    Requests are matched to their user by source address, HEARTBEATs by
+    token (which also moves the session to a new address, e.g. after a NAT
+    rebinding). Expiry uses a timing wheel of ceil(ttl / tick) + 1 slots:
+    a session sits in the slot for its deadline and activity only updates
+    last_seen, so touching a session is O(1). When a slot comes due, idle
+    sessions in it expire and the rest move to the slot of their new
+    deadline.
+    """
+
+    def __init__(self, ttl=SESSION_TTL, tick=WHEEL_TICK, max_sessions=MAX_SESSIONS, on_expire=None):
+        self.ttl = ttl
+        self.tick = tick
+        self.max_sessions = max_sessions
+        self.on_expire = on_expire
+        self._slots = [[] for _ in range(math.ceil(ttl / tick) + 1)]
+        self._cursor = 0
+        self._next_tick = time.monotonic() + tick
+        self._by_name = {}
+        self._by_address = {}
+        self._by_token = {}
+        self._lock = threading.Lock()
+        self._running = False
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def start(self):
+        """Turn the wheel on a background thread"""
+        self._running = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        self._running = False
+
+    def open(self, name, address):
+        """Start a session for name at address, replacing any earlier one; returns its token"""
+        token = secrets.token_hex(8)
+        self._add(Session(name, token, tuple(address)))
+        return token
+
+    def restore(self, name, token, address):
+        """Reinstate a saved session with a fresh TTL"""
+        self._add(Session(name, token, tuple(address)))
+
+    def _add(self, session):
+        evicted = None
+        with self._lock:
+            self._remove(session.name)
+            if len(self._by_name) >= self.max_sessions:
+                evicted = self._evict()
+            self._by_name[session.name] = session
+            self._by_address[session.address] = session
+            self._by_token[session.token] = session
+            self._schedule(session)
+        if evicted is not None:
+            log.warning("Session table full; dropped the session of %s", evicted.name)
+
+    def close(self, name):
+        with self._lock:
+            return self._remove(name)
+
+    def _remove(self, name):
+        session = self._by_name.pop(name, None)
+        if session is not None:
+            if self._by_address.get(session.address) is session:
+                del self._by_address[session.address]
+            self._by_token.pop(session.token, None)
+        return session
+
+    def get(self, name):
+        return self._by_name.get(name)
+
+    def online(self, name):
+        return name in self._by_name
+
+    def name_for(self, address):
+        """Name of the user with a session at address, or None; counts as activity"""
+        session = self._by_address.get(address)
+        if session is None:
+            return None
+        session.last_seen = time.monotonic()
+        return session.name
+
+    def heartbeat(self, token, address):
+        """Keep the session with token alive, moving it to address; None if it has expired"""
+        with self._lock:
+            session = self._by_token.get(token)
+            if session is None:
+                return None
+            session.last_seen = time.monotonic()
+            address = tuple(address)
+            if session.address != address:
+                if self._by_address.get(session.address) is session:
+                    del self._by_address[session.address]
+                session.address = address
+                self._by_address[address] = session
+        return session
+
+    def advance(self, now=None):
+        """Expire the sessions in every slot that has come due; returns the expired sessions"""
+        now = time.monotonic() if now is None else now
+        expired = []
+        with self._lock:
+            while self._next_tick <= now:
+                slot = self._slots[self._cursor]
+                self._slots[self._cursor] = []
+                self._cursor = (self._cursor + 1) % len(self._slots)
+                self._next_tick += self.tick
+                for session in slot:
+                    if self._by_name.get(session.name) is not session:
+                        # Closed or replaced since it was scheduled
+                        continue
+                    if now - session.last_seen >= self.ttl:
+                        self._remove(session.name)
+                        expired.append(session)
+                    else:
+                        self._schedule(session)
+        self.expired += len(expired)
+        return expired
+
+    def _schedule(self, session):
+        """Put session in the first slot due at or after its deadline; call with the lock held"""
+        # The slot at the cursor comes due at _next_tick, each later one a tick after that
+        ahead = math.ceil((session.last_seen + self.ttl - self._next_tick) / self.tick)
+        ahead = min(max(ahead, 0), len(self._slots) - 1)
+        self._slots[(self._cursor + ahead) % len(self._slots)].append(session)
+
+    def _evict(self):
+        """Drop the live session due to expire soonest; call with the lock held"""
+        for offset in range(len(self._slots)):
+            for session in self._slots[(self._cursor + offset) % len(self._slots)]:
+                if self._by_name.get(session.name) is session:
+                    self._remove(session.name)
+                    self.evicted += 1
+                    return session
+        return None
+
+    def _run(self):
+        while self._running:
+            time.sleep(max(0.0, self._next_tick - time.monotonic()))
+            expired = self.advance()
+            if expired:
+                log.info("Expired %d idle sessions (%d open)", len(expired), len(self._by_name))
+                if self.on_expire is not None:
+                    self.on_expire(expired)
+
+    def to_dict(self):
+        """Saved form: token and address by user name (idle times are not kept)"""
+        return {name: {'token': session.token, 'address': list(session.address)}
+                for name, session in list(self._by_name.items())}
+
+    def load(self, saved):
+        for name, entry in saved.items():
+            self.restore(name, entry['token'], entry['address'])
@@ -0,0 +1,129 @@
+import threading
+import time
+from contextlib import contextmanager
+from types import MappingProxyType
+from typing import NamedTuple, Optional
+
+# Items are spread over this many shards; a write copies only the shards it
+# touches, so republishing costs O(n / SHARDS + SHARDS) instead of O(n)
+SHARDS = 256
+# Optimistic read attempts before a reader falls back to the write lock
+READ_RETRIES = 8
+
+_EMPTY = MappingProxyType({})
+
+
+class ItemView(NamedTuple):
+    """Immutable copy of the fields read-only commands need from an item"""
+    item_id: int
+    name: str
+    description: str
+    current_price: float
+    end_time: object
+    seller_name: str
+    highest_bidder: Optional[str]
+    active: bool
+    bid_count: int
+
+    @classmethod
+    def from_item(cls, item_id, item):
+        return cls(item_id, item['name'], item['description'], item['current_price'], item.get('end_time'),
+                   item.get('seller_name', ''), item.get('highest_bidder'), item.get('active', True),
+                   len(item.get('bids', ())))
+
+
+class Snapshot:
+    """One published, never-modified version of every item view"""
+    __slots__ = ('version', '_shards', '_size')
+
+    def __init__(self, version, shards, size):
+        self.version = version
+        self._shards = shards
+        self._size = size
+
+    def __len__(self):
+        return self._size
+
+    def get(self, item_id):
+        return self._shards[hash(item_id) % SHARDS].get(item_id)
+
+    def __iter__(self):
+        for shard in self._shards:
+            yield from shard.values()
+
+
+class SnapshotStore:
+    """Copy-on-write item snapshots for readers that must not block writers.
+
+    Writers go through write(), which serializes them, records the ids of
+    the items they change and republishes a new Snapshot sharing every
+    untouched shard with the previous one. Readers go through read(): they
+    never take a lock on the fast path, and a read that overlapped a write
+    (the sequence number moved) is simply retried, so any index lookups it
+    made agree with the snapshot it formats from.
+    """
+
+    def __init__(self, items=None):
+        self._write_lock = threading.RLock()
+        self._sequence = 0
+        shards = [{} for _ in range(SHARDS)]
+        for item_id, item in (items or {}).items():
+            shards[hash(item_id) % SHARDS][item_id] = ItemView.from_item(item_id, item)
+        self._current = Snapshot(0, tuple(MappingProxyType(shard) if shard else _EMPTY for shard in shards),
+                                 sum(len(shard) for shard in shards))
+
+    def current(self):
+        return self._current
+
+    @contextmanager
+    def write(self, items):
+        """Serialize a write to items; yields a set to add the changed item ids to"""
+        with self._write_lock:
+            self._sequence += 1
+            changed = set()
+            try:
+                yield changed
+            finally:
+                if changed:
+                    self._publish(items, changed)
+                self._sequence += 1
+
+    def read(self, query):
+        """Run query(snapshot) against a state no writer changed while it ran"""
+        for _ in range(READ_RETRIES):
+            sequence = self._sequence
+            if sequence % 2 == 0:
+                snapshot = self._current
+                try:
+                    result = query(snapshot)
+                except (IndexError, KeyError, RuntimeError):
+                    # A writer reshaped an index mid-iteration; retry below
+                    result = None
+                    sequence = -1
+                if sequence == self._sequence:
+                    return result
+            time.sleep(0)
+        with self._write_lock:
+            return query(self._current)
+
+    def _publish(self, items, changed):
+        old = self._current
+        shards = list(old._shards)
+        size = old._size
+        touched = {}
+        for item_id in changed:
+            index = hash(item_id) % SHARDS
+            shard = touched.get(index)
+            if shard is None:
+                shard = touched[index] = dict(shards[index])
+            item = items.get(item_id)
+            had = item_id in shard
+            if item is None:
+                shard.pop(item_id, None)
+                size -= had
+            else:
+                shard[item_id] = ItemView.from_item(item_id, item)
+                size += not had
+        for index, shard in touched.items():
+            shards[index] = MappingProxyType(shard)
+        self._current = Snapshot(old.version + 1, tuple(shards), size)
@@ -0,0 +1,92 @@
+import heapq
+import math
+import re
+
+# Descriptions arrive underscore-joined ("red_kite_with_string"), so
+# underscores split words just like spaces and punctuation do
+_WORD = re.compile(r"[^\W_]+")
+STOP_WORDS = frozenset({"a", "an", "and", "the", "of", "for", "in", "on", "with", "to", "is", "it"})
+
+# BM25 ranking parameters
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text):
+    """Split text into lowercase search terms"""
+    return [word for word in _WORD.findall(text.lower()) if word not in STOP_WORDS]
+
+
+class TextIndex:
+    """Inverted index over item text with BM25 top-k ranking.
+
+    postings maps term -> {item_id: term frequency}; lengths holds each
+    indexed item's term count so removal and ranking need no re-tokenizing.
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.lengths = {}
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def add(self, item_id, text):
+        if item_id in self.lengths:
+            self.remove(item_id)
+        terms = tokenize(text)
+        counts = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, count in counts.items():
+            self.postings.setdefault(term, {})[item_id] = count
+        self.lengths[item_id] = len(terms)
+        self._total_length += len(terms)
+
+    def remove(self, item_id, text=None):
+        """Drop an item's postings; pass its text to avoid scanning every term"""
+        length = self.lengths.pop(item_id, None)
+        if length is None:
+            return
+        self._total_length -= length
+        terms = set(tokenize(text)) if text is not None else list(self.postings)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None and posting.pop(item_id, None) is not None and not posting:
+                del self.postings[term]
+
+    def search(self, query, limit):
+        """Return up to limit item ids ranked by BM25 score for the query terms"""
+        terms = set(tokenize(query))
+        if not terms or not self.lengths:
+            return []
+        count = len(self.lengths)
+        average = self._total_length / count or 1
+        scores = {}
+        for term in terms:
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for item_id, frequency in posting.items():
+                norm = frequency + K1 * (1 - B + B * self.lengths[item_id] / average)
+                scores[item_id] = scores.get(item_id, 0.0) + idf * frequency * (K1 + 1) / norm
+        best = heapq.nlargest(limit, scores.items(), key=lambda entry: (entry[1], -entry[0]))
+        return [item_id for item_id, _ in best]
+
+    def to_dict(self):
+        """Serializable form stored alongside the rest of the server state"""
+        return {
+            'postings': self.postings,
+            'lengths': self.lengths,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        index = cls()
+        index.postings = {term: {int(item_id): count for item_id, count in posting.items()}
+                          for term, posting in data.get('postings', {}).items()}
+        index.lengths = {int(item_id): length for item_id, length in data.get('lengths', {}).items()}
+        index._total_length = sum(index.lengths.values())
+        return index
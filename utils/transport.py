@@ -0,0 +1,135 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+# Payloads up to this size travel as one plain datagram (the fast path);
+# anything larger is split into FRAG datagrams no bigger than this
+MAX_DATAGRAM = 1024
+# Receive buffers are sized for the largest UDP payload so nothing is truncated
+RECV_BUFFER_SIZE = 65535
+
+FRAG_PREFIX = b"FRAG "
+# FRAG <msg_id> <index> <total>\n<chunk>; the header is at most this long
+_HEADER_RESERVE = 40
+# Bytes each buffered fragment is charged on top of its chunk, for the
+# dict entry and bytes object that hold it
+FRAGMENT_OVERHEAD = 128
+
+
+def is_fragment(data, size):
+    """Return True if the first size bytes of data are one fragment of a larger payload"""
+    return size > len(FRAG_PREFIX) and data.startswith(FRAG_PREFIX)
+
+
+def fragment_count(size, max_datagram=MAX_DATAGRAM):
+    """Datagrams a Fragmenter sends for a payload of size bytes"""
+    if size <= max_datagram:
+        return 1
+    return -(-size // (max_datagram - _HEADER_RESERVE))
+
+
+class Fragmenter:
+    """Split outgoing payloads that do not fit in one datagram"""
+
+    def __init__(self, max_datagram=MAX_DATAGRAM):
+        self.max_datagram = max_datagram
+        self.chunk_size = max_datagram - _HEADER_RESERVE
+        self._ids = itertools.count(1)
+
+    def split(self, payload):
+        """Return the datagrams that carry payload, in order"""
+        if len(payload) <= self.max_datagram:
+            return [payload]
+        msg_id = next(self._ids)
+        total = -(-len(payload) // self.chunk_size)
+        datagrams = []
+        for index in range(total):
+            header = f"FRAG {msg_id} {index} {total}\n".encode('ascii')
+            start = index * self.chunk_size
+            datagrams.append(header + payload[start:start + self.chunk_size])
+        return datagrams
+
+
+class Reassembler:
+    """Collect FRAG datagrams per sender until a payload is complete.
+
+    Buffered fragments are bounded by max_bytes across all senders, each
+    charged its chunk plus FRAGMENT_OVERHEAD; when a new fragment would
+    exceed it the oldest partial payloads are dropped. A payload may not
+    claim more fragments than max_message takes at chunk_size per fragment,
+    and empty fragments are refused. Partial payloads older than timeout
+    seconds are discarded as well.
+    """
+
+    def __init__(self, max_bytes=4 * 1024 * 1024, max_message=1024 * 1024, timeout=5.0,
+                 chunk_size=MAX_DATAGRAM - _HEADER_RESERVE):
+        self.max_bytes = max_bytes
+        self.max_message = max_message
+        self.max_fragments = -(-max_message // chunk_size)
+        self.timeout = timeout
+        self.buffered = 0
+        self.dropped = 0
+        self._partial = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, data, source):
+        """Add one FRAG datagram; return the whole payload once its last fragment arrives"""
+        header_end = data.find(b"\n")
+        try:
+            if header_end < 0:
+                raise ValueError
+            _, msg_id, index, total = bytes(data[:header_end]).split()
+            index = int(index)
+            total = int(total)
+            if not 0 <= index < total <= self.max_fragments or header_end + 1 >= len(data):
+                raise ValueError
+        except ValueError:
+            self.dropped += 1
+            return None
+        chunk = bytes(data[header_end + 1:])
+        charge = len(chunk) + FRAGMENT_OVERHEAD
+
+        key = (source, msg_id)
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._partial.get(key)
+            if entry is None:
+                # [first seen, total, chunks by index, bytes charged, payload bytes]
+                entry = self._partial[key] = [now, total, {}, 0, 0]
+            received = entry[2]
+            if index in received or entry[1] != total:
+                return None
+            if entry[4] + len(chunk) > self.max_message:
+                self._discard(key)
+                self.dropped += 1
+                return None
+
+            while self._partial and self.buffered + charge > self.max_bytes:
+                oldest = next(iter(self._partial))
+                self._discard(oldest)
+                self.dropped += 1
+                if oldest == key:
+                    return None
+
+            received[index] = chunk
+            entry[3] += charge
+            entry[4] += len(chunk)
+            self.buffered += charge
+            if len(received) < total:
+                return None
+            self._discard(key)
+        return b"".join(received[i] for i in range(total))
+
+    def _discard(self, key):
+        entry = self._partial.pop(key)
+        self.buffered -= entry[3]
+
+    def _expire(self, now):
+        while self._partial:
+            key, entry = next(iter(self._partial.items()))
+            if now - entry[0] < self.timeout:
+                break
+            self._discard(key)
+            self.dropped += 1
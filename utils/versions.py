@@ -0,0 +1,86 @@
+import threading
+from collections import deque
+
+# Changes remembered per item; a RESYNC from further back gets the full state
+RESYNC_HISTORY = 32
+
+
+class ChangeLog:
+    """Recent changes of each item, so a RESYNC can be answered with just the delta.
+
+    Every change bumps the item's version by one. The log keeps the last
+    RESYNC_HISTORY change lines per item, each starting with the version it
+    produced. It lives in memory only; after a restart every RESYNC gets the
+    full state until new changes accumulate. The server forgets an item's
+    log when its auction closes, so the log only ever holds active items.
+    """
+
+    def __init__(self, history=RESYNC_HISTORY):
+        self.history = history
+        self._changes = {}
+        self._lock = threading.Lock()
+
+    def record(self, item_id, version, line):
+        with self._lock:
+            changes = self._changes.get(item_id)
+            if changes is None:
+                changes = self._changes[item_id] = deque(maxlen=self.history)
+            changes.append((version, f"{version} {line}"))
+
+    def since(self, item_id, version, current):
+        """Change lines after version, oldest first; None if some of them are no longer kept"""
+        if version >= current:
+            return []
+        with self._lock:
+            changes = list(self._changes.get(item_id, ()))
+        lines = [line for changed, line in changes if changed > version]
+        # Complete only if the log reaches back to the change right after version
+        if len(lines) != current - version:
+            return None
+        return lines
+
+    def forget(self, item_id):
+        with self._lock:
+            self._changes.pop(item_id, None)
+
+
+class VersionTracker:
+    """Client side: the last version seen of each item, reporting jumps.
+
+    Pushes from any path (UDP, push channel, multicast) and the client's own
+    accepted bids go through accept(); a version more than one past the last
+    means updates were lost, and on_gap(item_name, last_version) is called so
+    the caller can RESYNC from there.
+    """
+
+    def __init__(self, on_gap):
+        self.on_gap = on_gap
+        self.versions = {}
+        self.gaps = 0
+        self._lock = threading.Lock()
+
+    def get(self, item_name):
+        return self.versions.get(item_name, 0)
+
+    def accept(self, item_name, version):
+        """True if version is new for the item; duplicates and stale updates are False"""
+        with self._lock:
+            last = self.versions.get(item_name)
+            if last is not None and version <= last:
+                return False
+            self.versions[item_name] = version
+        # The first version seen of an item only sets the baseline
+        if last is not None and version > last + 1:
+            self.gaps += 1
+            self.on_gap(item_name, last)
+        return True
+
+    def resynced(self, item_name, version):
+        """Record the version a RESYNC or announcement brought the item up to"""
+        with self._lock:
+            if version > self.versions.get(item_name, -1):
+                self.versions[item_name] = version
+
+    def forget(self, item_name):
+        with self._lock:
+            self.versions.pop(item_name, None)